@@ -0,0 +1,45 @@
+"""add_token_order_counts_table
+
+Revision ID: 1c6e9a4b2f07
+Revises: f8a3c5e2d914
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "1c6e9a4b2f07"
+down_revision = "f8a3c5e2d914"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "token_order_counts",
+        sa.Column("token_id", postgresql.UUID(), nullable=False),
+        sa.Column("orders_count", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["token_id"], ["user_tokens.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("token_id"),
+    )
+
+    # Начальные значения - текущее число заказов каждого токена
+    op.execute(
+        """
+        INSERT INTO token_order_counts (token_id, orders_count, updated_at)
+        SELECT token_id, count(*), now()
+        FROM orders
+        WHERE token_id IS NOT NULL
+        GROUP BY token_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("token_order_counts")
@@ -0,0 +1,67 @@
+"""add_sync_cursors_table
+
+Revision ID: 3b9e4c1d7a52
+Revises: 856a6434a35b
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "3b9e4c1d7a52"
+down_revision = "856a6434a35b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sync_cursors",
+        sa.Column("token_id", postgresql.UUID(), nullable=False),
+        sa.Column("last_event_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("last_occurred_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["token_id"], ["user_tokens.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("token_id"),
+    )
+
+    # Курсоры существующих токенов - последнее событие каждого токена
+    # (включая служебные события стартовой точки)
+    op.execute(
+        """
+        INSERT INTO sync_cursors (token_id, last_event_id, last_occurred_at, updated_at)
+        SELECT DISTINCT ON (token_id) token_id, event_id, occurred_at, now()
+        FROM order_events
+        WHERE event_id IS NOT NULL AND token_id IS NOT NULL
+        ORDER BY token_id, occurred_at DESC
+        """
+    )
+
+    # Служебные события стартовой точки больше не нужны
+    op.execute("DELETE FROM order_events WHERE order_id = 'SYNC_STARTING_POINT'")
+
+
+def downgrade() -> None:
+    # Восстанавливаем стартовые точки для прежнего поиска по order_events
+    op.execute(
+        """
+        INSERT INTO order_events (
+            id, created_at, updated_at, order_id, token_id, event_type,
+            occurred_at, event_data, event_id, is_duplicate
+        )
+        SELECT
+            md5(random()::text || clock_timestamp()::text)::uuid, now(), now(), 'SYNC_STARTING_POINT', token_id, 'SYNC_STARTING_POINT',
+            COALESCE(last_occurred_at, updated_at),
+            json_build_object('event_id', last_event_id, 'purpose', 'starting_point_for_incremental_sync',
+                              'source', 'sync_cursors_downgrade'),
+            last_event_id, false
+        FROM sync_cursors
+        ON CONFLICT DO NOTHING
+        """
+    )
+    op.drop_table("sync_cursors")
@@ -0,0 +1,45 @@
+"""add_order_revisions_table
+
+Revision ID: 5e2a9c7d1b38
+Revises: 9d2f6b8e4a15
+Create Date: 2026-10-16 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "5e2a9c7d1b38"
+down_revision = "9d2f6b8e4a15"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_revisions",
+        sa.Column("token_id", postgresql.UUID(), nullable=False),
+        sa.Column("allegro_order_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column("revision", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("is_keyframe", sa.Boolean(), nullable=False),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["token_id"], ["user_tokens.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("token_id", "allegro_order_id", "seq"),
+    )
+
+    # Существующие заказы начинают историю с полного снимка при следующем изменении
+    op.add_column(
+        "orders",
+        sa.Column("revision_seq", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("orders", "revision_seq")
+    op.drop_table("order_revisions")
@@ -0,0 +1,32 @@
+"""add_failed_order_claim_index
+
+Revision ID: 9d2f6b8e4a15
+Revises: 1c6e9a4b2f07
+Create Date: 2026-10-16 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "9d2f6b8e4a15"
+down_revision = "1c6e9a4b2f07"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_failed_order_processing_claim",
+        "failed_order_processing",
+        ["status", "priority", "next_retry_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_failed_order_processing_claim", table_name="failed_order_processing")
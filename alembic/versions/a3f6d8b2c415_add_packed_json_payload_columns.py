@@ -0,0 +1,92 @@
+"""add_packed_json_payload_columns
+
+Revision ID: a3f6d8b2c415
+Revises: 5e2a9c7d1b38
+Create Date: 2026-10-16 21:00:00.000000
+
+Первый (расширяющий) шаг перевода order_events.event_data и task_history.result
+в bytea для CompressedJSON без остановки приложения:
+- колонка <column>_packed bytea (без перезаписи таблицы);
+- триггер заполняет ее при каждой записи текущей версией приложения;
+- существующие строки переносятся пачками, каждая пачка - отдельная транзакция.
+Миграцию можно применить заранее (alembic upgrade a3f6d8b2c415), пока работает
+предыдущая версия приложения; замена колонок - в b8e1f4a7d293 вместе с выкладкой.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "a3f6d8b2c415"
+down_revision = "5e2a9c7d1b38"
+branch_labels = None
+depends_on = None
+
+# (таблица, колонка) с первичным ключом id
+PACKED_COLUMNS = (
+    ("order_events", "event_data"),
+    ("task_history", "result"),
+)
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def _backfill(table: str, column: str) -> None:
+    """Перенос существующих документов пачками по первичному ключу"""
+
+    connection = op.get_bind()
+    after_id = "CAST(:last_id AS uuid) IS NULL OR id > CAST(:last_id AS uuid)"
+    last_id = None
+    while True:
+        # Последний id пачки; None - оставшиеся строки помещаются в одну пачку
+        boundary = connection.execute(
+            sa.text(f"SELECT id FROM {table} WHERE {after_id} ORDER BY id OFFSET :offset LIMIT 1"),
+            {"last_id": last_id, "offset": BACKFILL_BATCH_SIZE - 1},
+        ).scalar()
+        boundary = str(boundary) if boundary is not None else None
+
+        connection.execute(
+            sa.text(
+                f"UPDATE {table} SET {column}_packed = convert_to({column}::text, 'UTF8') "
+                f"WHERE ({after_id}) AND (CAST(:boundary AS uuid) IS NULL OR id <= CAST(:boundary AS uuid)) "
+                f"AND {column}_packed IS NULL AND {column} IS NOT NULL"
+            ),
+            {"last_id": last_id, "boundary": boundary},
+        )
+        if boundary is None:
+            break
+        last_id = boundary
+
+
+def upgrade() -> None:
+    for table, column in PACKED_COLUMNS:
+        op.add_column(table, sa.Column(f"{column}_packed", sa.LargeBinary(), nullable=True))
+        op.execute(
+            f"""
+            CREATE FUNCTION {table}_{column}_pack() RETURNS trigger AS $$
+            BEGIN
+                NEW.{column}_packed := convert_to(NEW.{column}::text, 'UTF8');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_{column}_pack BEFORE INSERT OR UPDATE OF {column} ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {table}_{column}_pack()"
+        )
+
+    # Перенос вне транзакции миграции: блокировки строк держатся только на время пачки
+    with op.get_context().autocommit_block():
+        for table, column in PACKED_COLUMNS:
+            _backfill(table, column)
+
+
+def downgrade() -> None:
+    for table, column in PACKED_COLUMNS:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_{column}_pack ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS {table}_{column}_pack()")
+        op.drop_column(table, f"{column}_packed")
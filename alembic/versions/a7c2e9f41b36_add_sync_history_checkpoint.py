@@ -0,0 +1,29 @@
+"""add_sync_history_checkpoint
+
+Revision ID: a7c2e9f41b36
+Revises: 3b9e4c1d7a52
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "a7c2e9f41b36"
+down_revision = "3b9e4c1d7a52"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("sync_history", sa.Column("checkpoint", sa.JSON(), nullable=True))
+    op.add_column("sync_history", sa.Column("checkpointed_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("sync_history", "checkpointed_at")
+    op.drop_column("sync_history", "checkpoint")
@@ -0,0 +1,112 @@
+"""switch_json_payloads_to_compressed
+
+Revision ID: b8e1f4a7d293
+Revises: a3f6d8b2c415
+Create Date: 2026-10-16 21:10:00.000000
+
+Второй шаг перевода на CompressedJSON (применяется вместе с выкладкой версии
+приложения, использующей CompressedJSON): заполненные триггером колонки
+<column>_packed заменяют JSON-колонки, изменяются только метаданные.
+order_revisions появилась в этом же выпуске и переводится напрямую.
+Перенесенные документы остаются несжатым JSON в UTF-8 (CompressedJSON читает
+оба формата) - сжимает их задача compress_json_payloads.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "b8e1f4a7d293"
+down_revision = "a3f6d8b2c415"
+branch_labels = None
+depends_on = None
+
+PACKED_COLUMNS = (
+    ("order_events", "event_data"),
+    ("task_history", "result"),
+)
+
+RESTORE_BATCH_SIZE = 1000
+
+
+def _create_pack_trigger(table: str, column: str) -> None:
+    """Триггер заполнения <column>_packed из a3f6d8b2c415 (нужен этой ревизии после отката)"""
+
+    op.execute(
+        f"""
+        CREATE FUNCTION {table}_{column}_pack() RETURNS trigger AS $$
+        BEGIN
+            NEW.{column}_packed := convert_to(NEW.{column}::text, 'UTF8');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        f"CREATE TRIGGER {table}_{column}_pack BEFORE INSERT OR UPDATE OF {column} ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {table}_{column}_pack()"
+    )
+
+
+def upgrade() -> None:
+    for table, column in PACKED_COLUMNS:
+        op.execute(f"DROP TRIGGER {table}_{column}_pack ON {table}")
+        op.execute(f"DROP FUNCTION {table}_{column}_pack()")
+        op.drop_column(table, column)
+        op.alter_column(table, f"{column}_packed", new_column_name=column)
+
+    op.execute("ALTER TABLE order_revisions ALTER COLUMN data TYPE bytea USING convert_to(data::text, 'UTF8')")
+
+
+def _restore_json(table_name: str, source: str, target: str, primary_key: tuple) -> None:
+    """Распаковка документов source (в том числе сжатых zstd) в JSON-колонку target пачками"""
+
+    # Импорт приложения доступен после env.py (alembic history/heads загружают миграции без него)
+    from app.core.compressed_json import CompressedJSON
+
+    connection = op.get_bind()
+    table = sa.table(
+        table_name,
+        *[sa.column(key) for key in primary_key],
+        sa.column(source, CompressedJSON()),
+        sa.column(target, sa.JSON()),
+    )
+    key_columns = [table.c[key] for key in primary_key]
+    last_key = None
+    while True:
+        query = sa.select(*key_columns, table.c[source]).order_by(*key_columns).limit(RESTORE_BATCH_SIZE)
+        if last_key is not None:
+            query = query.where(sa.tuple_(*key_columns) > sa.tuple_(*[sa.literal(value) for value in last_key]))
+        rows = connection.execute(query).all()
+        if not rows:
+            break
+
+        connection.execute(
+            sa.update(table)
+            .where(*[column == sa.bindparam(f"pk_{column.name}") for column in key_columns])
+            .values({target: sa.bindparam("payload", type_=sa.JSON())}),
+            [
+                {**{f"pk_{key}": row[index] for index, key in enumerate(primary_key)}, "payload": row[-1]}
+                for row in rows
+            ],
+        )
+        last_key = tuple(rows[-1][:len(primary_key)])
+
+
+def downgrade() -> None:
+    op.alter_column("order_revisions", "data", new_column_name="data_packed")
+    op.add_column("order_revisions", sa.Column("data", sa.JSON(), nullable=True))
+    _restore_json("order_revisions", "data_packed", "data", ("token_id", "allegro_order_id", "seq"))
+    op.drop_column("order_revisions", "data_packed")
+    op.alter_column("order_revisions", "data", nullable=False)
+
+    for table, column in PACKED_COLUMNS:
+        op.alter_column(table, column, new_column_name=f"{column}_packed")
+        op.add_column(table, sa.Column(column, sa.JSON(), nullable=True))
+        _restore_json(table, f"{column}_packed", column, ("id",))
+        # Состояние a3f6d8b2c415: <column>_packed уже содержит документы (в том числе
+        # сжатые - CompressedJSON читает оба формата), новые записи заполняет триггер
+        _create_pack_trigger(table, column)
@@ -0,0 +1,27 @@
+"""add_task_history_progress_details
+
+Revision ID: c4f8d2a6e913
+Revises: a7c2e9f41b36
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "c4f8d2a6e913"
+down_revision = "a7c2e9f41b36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("task_history", sa.Column("progress_details", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("task_history", "progress_details")
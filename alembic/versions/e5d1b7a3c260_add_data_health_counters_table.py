@@ -0,0 +1,39 @@
+"""add_data_health_counters_table
+
+Revision ID: e5d1b7a3c260
+Revises: c4f8d2a6e913
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "e5d1b7a3c260"
+down_revision = "c4f8d2a6e913"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "data_health_counters",
+        sa.Column("token_id", postgresql.UUID(), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("total_events", sa.Integer(), nullable=False),
+        sa.Column("missing_data_count", sa.Integer(), nullable=False),
+        sa.Column("regression_count", sa.Integer(), nullable=False),
+        sa.Column("issues_count", sa.Integer(), nullable=False),
+        sa.Column("issue_mask", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["token_id"], ["user_tokens.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("token_id", "bucket_start"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("data_health_counters")
@@ -0,0 +1,96 @@
+"""add_data_quality_daily_table
+
+Revision ID: f8a3c5e2d914
+Revises: e5d1b7a3c260
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = "f8a3c5e2d914"
+down_revision = "e5d1b7a3c260"
+branch_labels = None
+depends_on = None
+
+
+
+def _is_truthy(value: str) -> str:
+    """SQL-условие "значение jsonb непустое" - аналог проверки `not value` в Python"""
+
+    return f"""CASE jsonb_typeof({value})
+                    WHEN 'object' THEN {value} <> '{{}}'::jsonb
+                    WHEN 'array' THEN jsonb_array_length({value}) > 0
+                    WHEN 'string' THEN {value} <> '""'::jsonb
+                    WHEN 'number' THEN {value} <> '0'::jsonb
+                    WHEN 'boolean' THEN {value} = 'true'::jsonb
+                    ELSE false
+                END"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "data_quality_daily",
+        sa.Column("token_id", postgresql.UUID(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("event_type", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("issue", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("events_count", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["token_id"], ["user_tokens.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("token_id", "day", "event_type", "issue"),
+    )
+
+    # Начальные значения - сводка по уже сохраненным событиям с теми же видами
+    # проблем, что считает DataMonitoringService.record_events
+    op.execute(
+        f"""
+        INSERT INTO data_quality_daily (token_id, day, event_type, issue, events_count, updated_at)
+        SELECT token_id, day, event_type, issue, count(*), now()
+        FROM (
+            SELECT
+                token_id,
+                occurred_at::date AS day,
+                event_type,
+                {_is_truthy("data -> 'id'")} AS has_id,
+                {_is_truthy("data -> 'status'")} AS has_status,
+                {_is_truthy("data -> 'buyer'")} AS has_buyer,
+                {_is_truthy("data -> 'lineItems'")} AS has_line_items,
+                {_is_truthy("data -> 'buyer' -> 'email'")} AS has_buyer_email,
+                {_is_truthy("data -> 'buyer' -> 'firstName'")} AS has_buyer_first_name
+            FROM (
+                SELECT token_id, occurred_at, event_type, coalesce(event_data::jsonb, '{{}}'::jsonb) AS data
+                FROM order_events
+                WHERE token_id IS NOT NULL
+            ) AS raw_events
+        ) AS events
+        CROSS JOIN LATERAL (
+            SELECT NOT (has_id AND has_status AND has_buyer AND has_line_items
+                        AND has_buyer_email AND has_buyer_first_name) AS has_missing_data
+        ) AS quality
+        CROSS JOIN LATERAL (
+            VALUES
+                ('all', true),
+                ('problematic', quality.has_missing_data),
+                ('missing_data', quality.has_missing_data),
+                ('regression', NOT has_line_items),
+                ('missing_field:id', NOT has_id),
+                ('missing_field:status', NOT has_status),
+                ('missing_field:buyer', NOT has_buyer),
+                ('missing_field:lineItems', NOT has_line_items),
+                ('empty_buyer_field:email', NOT has_buyer_email),
+                ('empty_buyer_field:firstName', NOT has_buyer_first_name)
+        ) AS issues (issue, matches)
+        WHERE issues.matches
+        GROUP BY token_id, day, event_type, issue
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("data_quality_daily")
@@ -323,6 +323,63 @@ async def get_order_by_id(
         raise HTTPException(status_code=500, detail=f"Ошибка получения заказа: {str(e)}")
 
 
+@router.get("/{order_id}/revisions",
+          response_model=Dict[str, Any],
+          summary="История версий заказа",
+          description="Список записанных версий данных заказа")
+async def get_order_revisions(
+    token_id: UUID = Query(..., description="ID токена для доступа к Allegro API"),
+    order_id: str = Path(..., description="ID заказа в Allegro"),
+    limit: int = Query(100, ge=1, le=1000, description="Максимальное количество версий"),
+    current_user: CurrentUser = CurrentUserDep
+):
+    """
+    Получить список версий данных заказа (последние - первыми).
+    
+    **Требует аутентификации через JWT токен.**
+    """
+    try:
+        with validate_token_and_get_service(token_id, current_user) as order_service:
+            revisions = order_service.get_order_revisions(order_id, limit=limit)
+            
+        return {"order_id": order_id, "revisions": revisions}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения истории заказа: {str(e)}")
+
+
+@router.get("/{order_id}/revisions/at",
+          response_model=Dict[str, Any],
+          summary="Заказ на момент времени",
+          description="Данные заказа, восстановленные из истории версий на указанный момент")
+async def get_order_at(
+    token_id: UUID = Query(..., description="ID токена для доступа к Allegro API"),
+    order_id: str = Path(..., description="ID заказа в Allegro"),
+    timestamp: Optional[datetime] = Query(None, description="Момент времени (по умолчанию - последняя версия)"),
+    current_user: CurrentUser = CurrentUserDep
+):
+    """
+    Получить данные заказа на момент времени из истории версий.
+    
+    **Требует аутентификации через JWT токен.**
+    """
+    try:
+        with validate_token_and_get_service(token_id, current_user) as order_service:
+            snapshot = order_service.get_order_at(order_id, at=timestamp)
+            
+        if not snapshot:
+            raise HTTPException(status_code=404, detail="История заказа на указанный момент не найдена")
+            
+        return snapshot
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка восстановления заказа: {str(e)}")
+
+
 @router.post("/{order_id}/sync",
            response_model=SyncResult,
            summary="Синхронизировать заказ",
@@ -107,6 +107,7 @@ class TaskHistoryRead(BaseModel):
     updated_at: datetime
     description: Optional[str]
     progress: Optional[float]
+    progress_details: Optional[Dict[str, Any]]
     parent_task_id: Optional[str]
 
     class Config:
@@ -160,6 +161,21 @@ async def start_sync(
                 detail=f"Токен {sync_params.token_id} не найден или не принадлежит пользователю"
             )
         
+        # Синхронизация токена уже выполняется - возвращаем ее задачу вместо параллельного запуска
+        from app.core.sync_lock import token_sync_lock
+        running_task_id = token_sync_lock.holder(str(sync_params.token_id))
+        if running_task_id:
+            logger.info(f"Синхронизация токена {sync_params.token_id} уже выполняется: task_id={running_task_id}")
+            return {
+                "success": True,
+                "message": "Синхронизация уже выполняется",
+                "task_id": running_task_id,
+                "user_id": current_user.user_id,
+                "token_id": str(sync_params.token_id),
+                "sync_type": "full" if sync_params.force_full_sync else "incremental",
+                "status": "RUNNING"
+            }
+        
         # Формируем параметры для Celery задачи
         celery_kwargs = {
             "user_id": str(current_user.user_id),
@@ -422,26 +438,17 @@ async def activate_sync(
     current_user: CurrentUser = CurrentUserDep
 ):
     """
-    Включить автосинхронизацию для токена (создать периодическую задачу в Celery Beat).
+    Включить автосинхронизацию для токена.
+    Синхронизацию по расписанию запускает задача dispatch_due_syncs.
     """
     db = get_sync_db_session_direct()
-    alchemy_db = get_alchemy_session()
     schedule_service = ActiveSyncScheduleService(db)
-    periodic_service = PeriodicTaskService(alchemy_db)
     # Проверка: не активирована ли уже
     if schedule_service.get_by_token(current_user.user_id, str(req.token_id)):
         db.close()
-        alchemy_db.close()
         raise HTTPException(status_code=400, detail="Автосинхронизация уже активна для этого токена")
     task_name = f"sync_{req.token_id}_periodic"
-    # Создать задачу в Beat
-    periodic_service.add_periodic_sync_task(
-        task_name=task_name,
-        user_id=str(current_user.user_id),
-        token_id=str(req.token_id),
-        interval_minutes=req.interval_minutes
-    )
-    # Сохранить в мониторинговой таблице
+    # Сохранить расписание - первый запуск при ближайшей проверке диспетчера
     schedule_service.create(
         user_id=current_user.user_id,
         token_id=str(req.token_id),
@@ -449,7 +456,6 @@ async def activate_sync(
         task_name=task_name
     )
     db.close()
-    alchemy_db.close()
     return {"message": "Автосинхронизация активирована", "token_id": str(req.token_id), "interval_minutes": req.interval_minutes}
 
 @router.post("/deactivate", summary="Отключить автосинхронизацию для токена")
@@ -458,7 +464,7 @@ async def deactivate_sync(
     current_user: CurrentUser = CurrentUserDep
 ):
     """
-    Отключить автосинхронизацию для токена (удалить периодическую задачу из Celery Beat).
+    Отключить автосинхронизацию для токена (и удалить задачу Beat, если она создана до диспетчера).
     """
     db = get_sync_db_session_direct()
     alchemy_db = get_alchemy_session()
@@ -4,12 +4,17 @@
 @dependencies: celery, redis
 """
 
+from datetime import timedelta
+
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_init, worker_process_shutdown
 import pytz
 
 from app.core.settings import settings
 from app.core.logging import setup_logging, get_logger, disable_technical_logging
+from app.core.allegro_client import allegro_client
+from app.core.compressed_json import get_codec
 
 # Сначала отключаем все технические логи
 disable_technical_logging()
@@ -71,13 +76,41 @@ celery_app.conf.update(
     },
 )
 
-# Расписание задач (только обновление токенов)
+# Расписание задач
 celery_app.conf.beat_schedule = {
     # Обновление токенов каждые 30 минут
     "refresh-tokens": {
         "task": "app.tasks.token_tasks.refresh_all_tokens",
         "schedule": crontab(minute="*/10"),
     },
+    # Запуск автосинхронизаций всех токенов по active_sync_schedules
+    "dispatch-order-syncs": {
+        "task": "dispatch_due_syncs",
+        "schedule": timedelta(seconds=settings.sync.dispatch_interval_seconds),
+    },
+    # Повторная обработка проблемных заказов несколькими воркерами
+    "retry-failed-orders": {
+        "task": "dispatch_failed_order_retries",
+        "schedule": timedelta(seconds=settings.sync.failed_retry_interval_seconds),
+    },
+    # Удаление устаревших счетчиков качества данных
+    "cleanup-data-health-counters": {
+        "task": "app.tasks.cleanup_tasks.cleanup_data_health_counters",
+        "schedule": crontab(minute=15),
+    },
 }
 
+
+@worker_init.connect
+def check_json_codec(**kwargs):
+    """Проверка кодека CompressedJSON при запуске воркера (без zstandard запуск прерывается)"""
+    get_codec()
+
+
+@worker_process_shutdown.connect
+def close_allegro_client(**kwargs):
+    """Закрытие пула соединений Allegro API при остановке процесса воркера"""
+    allegro_client.close()
+
+
 logger.info("Celery application configured successfully") 
\ No newline at end of file
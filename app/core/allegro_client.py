@@ -0,0 +1,185 @@
+"""
+@file: app/core/allegro_client.py
+@description: Общий HTTP клиент Allegro API с пулами соединений на процесс
+@dependencies: httpx, settings, rate_limiter, token_cache
+"""
+
+import asyncio
+import importlib.util
+import threading
+import weakref
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+import httpx
+
+from .settings import settings
+from .logging import get_logger
+from .rate_limiter import allegro_rate_limiter
+from .token_cache import access_token_cache
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+ALLEGRO_MEDIA_TYPE = "application/vnd.allegro.public.v1+json"
+
+
+class AllegroApiClient:
+    """
+    Пулы соединений к Allegro API, общие для всех сервисов процесса.
+
+    - sync_client: httpx.Client для синхронного кода (Celery задачи, сервисы на Session)
+    - async_client(): httpx.AsyncClient текущего event loop (FastAPI, асинхронные сервисы)
+    - run(): выполнение корутины на собственном event loop потока, чтобы пул
+      асинхронных соединений синхронного кода переживал отдельные пачки синхронизации
+
+    Каждый запрос обоих клиентов проходит через allegro_rate_limiter
+    (event hooks "request" и "response" - ответы 429 снижают скорость).
+    Ответ 401 сбрасывает access token из кеша процесса.
+
+    Клиенты создаются лениво - после fork воркера Celery каждый процесс
+    открывает собственные соединения.
+    """
+
+    def __init__(self):
+        self._sync_client: Optional[httpx.Client] = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _client_options(self) -> Dict[str, Any]:
+        """Общие таймауты и лимиты пула"""
+
+        allegro = settings.allegro
+
+        http2 = allegro.http2 and importlib.util.find_spec("h2") is not None
+        if allegro.http2 and not http2:
+            logger.warning("⚠️ ALLEGRO_HTTP2 включен, но пакет h2 не установлен - используется HTTP/1.1")
+
+        return {
+            "base_url": allegro.api_url,
+            "timeout": httpx.Timeout(allegro.http_timeout, connect=allegro.http_connect_timeout),
+            "limits": httpx.Limits(
+                max_connections=allegro.http_max_connections,
+                max_keepalive_connections=allegro.http_max_keepalive_connections,
+                keepalive_expiry=allegro.http_keepalive_expiry
+            ),
+            "http2": http2
+        }
+
+    @staticmethod
+    def _discard_rejected_token(response: httpx.Response) -> None:
+        """Отклоненный Allegro токен не должен переиспользоваться из кеша"""
+
+        if response.status_code == 401:
+            authorization = response.request.headers.get("Authorization", "")
+            if authorization.startswith("Bearer "):
+                access_token_cache.discard_access_token(authorization[len("Bearer "):])
+
+    @classmethod
+    async def _discard_rejected_token_async(cls, response: httpx.Response) -> None:
+        cls._discard_rejected_token(response)
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        """Синхронный клиент процесса"""
+
+        with self._lock:
+            if self._sync_client is None or self._sync_client.is_closed:
+                self._sync_client = httpx.Client(
+                    **self._client_options(),
+                    event_hooks={
+                        "request": [allegro_rate_limiter.before_request],
+                        "response": [allegro_rate_limiter.after_response, self._discard_rejected_token]
+                    }
+                )
+                logger.info("🌐 Создан пул соединений Allegro API (sync)")
+            return self._sync_client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """
+        Асинхронный клиент текущего event loop.
+
+        Соединения httpx.AsyncClient привязаны к event loop, поэтому
+        для каждого loop держится свой пул.
+        """
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                **self._client_options(),
+                event_hooks={
+                    "request": [allegro_rate_limiter.before_request_async],
+                    "response": [allegro_rate_limiter.after_response_async, self._discard_rejected_token_async]
+                }
+            )
+            self._async_clients[loop] = client
+            logger.info("🌐 Создан пул соединений Allegro API (async)")
+
+        return client
+
+    def run(self, awaitable: Awaitable[T]) -> T:
+        """
+        Выполняет корутину из синхронного кода на event loop текущего потока.
+
+        Поток воркера использует один loop все время жизни процесса;
+        вспомогательные потоки (предзагрузка страниц) получают собственный
+        loop и закрывают его через close_thread_loop().
+
+        Args:
+            awaitable: Корутина, использующая async_client()
+
+        Returns:
+            Результат корутины
+        """
+
+        loop = getattr(self._local, "loop", None)
+        if loop is None or loop.is_closed():
+            loop = self._local.loop = asyncio.new_event_loop()
+
+        return loop.run_until_complete(awaitable)
+
+    @staticmethod
+    def auth_headers(token: str) -> Dict[str, str]:
+        """Заголовки запроса к Allegro API с access token"""
+
+        return {
+            "Authorization": f"Bearer {token}",
+            "Accept": ALLEGRO_MEDIA_TYPE
+        }
+
+    async def aclose(self) -> None:
+        """Закрытие асинхронного клиента текущего event loop (остановка FastAPI)"""
+
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+            logger.info("🔌 Пул соединений Allegro API (async) закрыт")
+
+    def close_thread_loop(self) -> None:
+        """Закрытие event loop текущего потока и его асинхронного клиента"""
+
+        loop = getattr(self._local, "loop", None)
+        if loop is not None and not loop.is_closed():
+            client = self._async_clients.pop(loop, None)
+            if client is not None:
+                loop.run_until_complete(client.aclose())
+            loop.close()
+        self._local.loop = None
+
+    def close(self) -> None:
+        """Закрытие синхронного клиента и event loop процесса (остановка воркера)"""
+
+        with self._lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+                logger.info("🔌 Пул соединений Allegro API (sync) закрыт")
+
+        self.close_thread_loop()
+
+
+# Глобальный экземпляр клиента процесса
+allegro_client = AllegroApiClient()
@@ -0,0 +1,163 @@
+"""
+@file: app/core/compressed_json.py
+@description: Тип колонки SQLAlchemy для JSON-документов, сжатых zstd с общим словарем
+@dependencies: sqlalchemy, zstandard
+"""
+
+import importlib
+import importlib.util
+import json
+import threading
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+from .logging import get_logger
+from .settings import settings
+
+logger = get_logger(__name__)
+
+# Первые байты кадра zstd (RFC 8878); документы без них хранятся как JSON в UTF-8
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Размер словаря по умолчанию (рекомендация zstd - около 100 КБ)
+DEFAULT_DICTIONARY_SIZE = 112640
+
+
+class ZstdJsonCodec:
+    """
+    Сжатие и распаковка JSON-документов zstd.
+
+    Кадры содержат ID словаря, поэтому документы, сжатые без словаря,
+    читаются и после его настройки. Объекты zstandard не потокобезопасны -
+    у каждого потока свои компрессор и декомпрессор.
+    """
+
+    def __init__(self, zstd, level: int, dictionary: Optional[bytes] = None):
+        self._zstd = zstd
+        self._level = level
+        self._dictionary = zstd.ZstdCompressionDict(dictionary) if dictionary else None
+        self._dictionary_id = self._dictionary.dict_id() if self._dictionary else 0
+        self._local = threading.local()
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._zstd.ZstdCompressor(level=self._level, dict_data=self._dictionary)
+            self._local.compressor = compressor
+        return compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        dictionary_id = self._zstd.get_frame_parameters(data).dict_id
+        if dictionary_id and dictionary_id != self._dictionary_id:
+            raise ValueError(f"Документ сжат словарем {dictionary_id}, настроен словарь {self._dictionary_id or 'нет'}")
+
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dictionary_id)
+        if decompressor is None:
+            dictionary = self._dictionary if dictionary_id else None
+            decompressor = decompressors[dictionary_id] = self._zstd.ZstdDecompressor(dict_data=dictionary)
+        return decompressor.decompress(data)
+
+
+def _load_zstd():
+    if importlib.util.find_spec("zstandard") is None:
+        return None
+    return importlib.import_module("zstandard")
+
+
+@lru_cache(maxsize=1)
+def get_codec() -> Optional[ZstdJsonCodec]:
+    """
+    Кодек процесса по настройкам STORAGE_*.
+
+    Returns:
+        Optional[ZstdJsonCodec]: None, если пакет zstandard не установлен
+        и сжатие выключено
+
+    Raises:
+        RuntimeError: STORAGE_JSON_COMPRESSION включен, но пакет zstandard не установлен
+    """
+
+    zstd = _load_zstd()
+    if zstd is None:
+        if settings.storage.json_compression:
+            raise RuntimeError("STORAGE_JSON_COMPRESSION включен, но пакет zstandard не установлен")
+        return None
+
+    dictionary = None
+    if settings.storage.zstd_dictionary_path:
+        with open(settings.storage.zstd_dictionary_path, "rb") as dictionary_file:
+            dictionary = dictionary_file.read()
+
+    codec = ZstdJsonCodec(zstd, settings.storage.zstd_level, dictionary)
+    if settings.storage.json_compression:
+        logger.info(f"🗜️ Сжатие JSON: zstd уровня {settings.storage.zstd_level}, словарь {codec._dictionary_id or 'нет'}")
+    return codec
+
+
+def encode_json(value: Any) -> bytes:
+    """JSON-документ в байты колонки: кадр zstd или JSON в UTF-8, если сжатие выключено"""
+
+    data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    codec = get_codec() if settings.storage.json_compression else None
+    return codec.compress(data) if codec else data
+
+
+def decode_json(data: bytes) -> Any:
+    """Байты колонки в JSON-документ (сжатые и несжатые документы)"""
+
+    if data[:4] == ZSTD_MAGIC:
+        codec = get_codec()
+        if codec is None:
+            raise RuntimeError("Документ сжат zstd, но пакет zstandard не установлен")
+        data = codec.decompress(data)
+    return json.loads(data)
+
+
+def is_compressed(data: Optional[bytes]) -> bool:
+    return data is not None and bytes(data[:4]) == ZSTD_MAGIC
+
+
+def train_dictionary(documents: Iterable[Any], dict_size: int = DEFAULT_DICTIONARY_SIZE) -> bytes:
+    """
+    Обучение словаря zstd на JSON-документах (например, order_data заказов).
+
+    Raises:
+        RuntimeError: Пакет zstandard не установлен
+    """
+
+    zstd = _load_zstd()
+    if zstd is None:
+        raise RuntimeError("Для обучения словаря нужен пакет zstandard")
+
+    samples = [json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for document in documents]
+    return zstd.train_dictionary(dict_size, samples).as_bytes()
+
+
+class CompressedJSON(TypeDecorator):
+    """
+    JSON-документ в колонке bytea, сжатый zstd (см. STORAGE_JSON_COMPRESSION).
+
+    Для кода приложения колонка ведет себя как JSON: запись и чтение
+    словарей и списков. Несжатые документы (записанные до включения сжатия
+    или перенесенные миграцией) читаются так же, задача
+    compress_json_payloads пересжимает их пачками. JSON-операторы SQL
+    к такой колонке неприменимы.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return encode_json(value)
+
+    def process_result_value(self, value: Optional[bytes], dialect) -> Any:
+        if value is None:
+            return None
+        return decode_json(bytes(value))
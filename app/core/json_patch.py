@@ -0,0 +1,111 @@
+"""
+@file: app/core/json_patch.py
+@description: Построение и применение JSON Patch (RFC 6902) между версиями JSON-документа
+@dependencies: copy
+"""
+
+import copy
+from typing import Any, Dict, List
+
+JsonPatch = List[Dict[str, Any]]
+
+
+def _escape(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def make_patch(source: Any, target: Any) -> JsonPatch:
+    """
+    Операции add/remove/replace, превращающие source в target.
+
+    Словари сравниваются по ключам рекурсивно, списки одинаковой длины -
+    поэлементно; список другой длины заменяется целиком (позиции строк
+    заказа Allegro меняются редко, а точное выравнивание списков
+    увеличивает патч сильнее, чем экономит).
+
+    Args:
+        source: Предыдущая версия документа
+        target: Новая версия документа
+
+    Returns:
+        JsonPatch: Пустой список, если документы равны
+    """
+    patch: JsonPatch = []
+    _diff(source, target, "", patch)
+    return patch
+
+
+def _diff(source: Any, target: Any, path: str, patch: JsonPatch) -> None:
+    if isinstance(source, dict) and isinstance(target, dict):
+        for key, value in source.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in target:
+                patch.append({"op": "remove", "path": child})
+            else:
+                _diff(value, target[key], child, patch)
+        for key, value in target.items():
+            if key not in source:
+                patch.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+        return
+
+    if isinstance(source, list) and isinstance(target, list) and len(source) == len(target):
+        for index, (old_item, new_item) in enumerate(zip(source, target)):
+            _diff(old_item, new_item, f"{path}/{index}", patch)
+        return
+
+    # bool/int/float различаются в JSON, хотя True == 1 в Python
+    if type(source) is not type(target) or source != target:
+        patch.append({"op": "replace", "path": path, "value": target})
+
+
+def apply_patch(document: Any, patch: JsonPatch, in_place: bool = False) -> Any:
+    """
+    Применение патча make_patch к документу.
+
+    Args:
+        document: Исходная версия
+        patch: Операции add/remove/replace
+        in_place: Изменять document без копирования (цепочка патчей
+            применяется к одной копии)
+
+    Returns:
+        Any: Новая версия документа
+
+    Raises:
+        ValueError: Путь патча не существует в документе
+    """
+    result = document if in_place else copy.deepcopy(document)
+
+    for operation in patch:
+        path = operation["path"]
+        if path == "":
+            if operation["op"] == "remove":
+                raise ValueError("Нельзя удалить корень документа")
+            result = copy.deepcopy(operation["value"])
+            continue
+
+        *parents, last = [_unescape(token) for token in path[1:].split("/")]
+        container = result
+        try:
+            for token in parents:
+                container = container[int(token)] if isinstance(container, list) else container[token]
+            key = int(last) if isinstance(container, list) else last
+
+            if operation["op"] == "remove":
+                del container[key]
+            elif operation["op"] == "add" and isinstance(container, list):
+                container.insert(key, copy.deepcopy(operation["value"]))
+            elif operation["op"] in ("add", "replace"):
+                if operation["op"] == "replace" and not isinstance(container, list) and key not in container:
+                    raise KeyError(key)
+                container[key] = copy.deepcopy(operation["value"])
+            else:
+                raise ValueError(f"Неподдерживаемая операция патча: {operation['op']}")
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise ValueError(f"Не удалось применить операцию {operation['op']} {path}: {e}") from e
+
+    return result
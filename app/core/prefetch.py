@@ -0,0 +1,99 @@
+"""
+@file: app/core/prefetch.py
+@description: Предзагрузка элементов итератора в фоновом потоке через ограниченную очередь
+@dependencies: threading, queue
+"""
+
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# Пауза между попытками положить элемент в заполненную очередь (проверка остановки)
+PUT_POLL_INTERVAL_SECONDS = 0.1
+
+_ITEM, _DONE, _ERROR = "item", "done", "error"
+
+
+def prefetch(iterable: Iterable[T], depth: int,
+             on_thread_exit: Optional[Callable[[], None]] = None,
+             name: str = "prefetch") -> Iterator[T]:
+    """
+    Обход iterable в фоновом потоке с опережением не больше depth элементов.
+
+    Пока потребитель обрабатывает текущий элемент (запись в БД), поток
+    получает следующие (запросы к API). Очередь ограничена, поэтому память
+    не растет, если производитель быстрее потребителя. Исключение
+    производителя передается потребителю после уже полученных элементов.
+    Если потребитель прекращает обход, производитель останавливается
+    после текущего элемента, а iterable закрывается в его потоке.
+
+    Args:
+        iterable: Источник элементов (не должен использовать сессию БД потребителя)
+        depth: Размер очереди; 0 - обход в текущем потоке без предзагрузки
+        on_thread_exit: Вызывается в фоновом потоке после завершения обхода
+        name: Имя фонового потока
+
+    Yields:
+        Элементы iterable в исходном порядке
+    """
+
+    if depth <= 0:
+        yield from iterable
+        return
+
+    items: "queue.Queue" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(kind: str, value) -> bool:
+        while not stop.is_set():
+            try:
+                items.put((kind, value), timeout=PUT_POLL_INTERVAL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put(_ITEM, item):
+                    return
+            put(_DONE, None)
+        except BaseException as e:
+            put(_ERROR, e)
+        finally:
+            close = getattr(iterator, "close", None)
+            try:
+                if close is not None:
+                    close()
+                if on_thread_exit is not None:
+                    on_thread_exit()
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка при остановке предзагрузки {name}: {e}")
+
+    producer = threading.Thread(target=produce, name=name, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == _DONE:
+                return
+            if kind == _ERROR:
+                raise value
+            yield value
+    finally:
+        stop.set()
+        # Освобождаем место в очереди, чтобы производитель не ждал на put
+        while True:
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                break
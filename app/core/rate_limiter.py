@@ -0,0 +1,392 @@
+"""
+@file: app/core/rate_limiter.py
+@description: Распределенный token bucket лимитер запросов к Allegro API на Redis
+@dependencies: redis, settings, retry_policy
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import redis
+
+from .settings import settings
+from .logging import get_logger
+from .retry_policy import AllegroRetryLater, parse_retry_after
+
+logger = get_logger(__name__)
+
+# Классы эндпоинтов и соответствующие лимиты AllegroSettings
+ENDPOINT_CLASSES = ("general", "orders", "events", "auth")
+
+# Пауза перед повторной попыткой подключения к недоступному Redis
+REDIS_RETRY_INTERVAL_SECONDS = 30.0
+
+# Ожидание, начиная с которого оно попадает в лог
+WAIT_LOG_THRESHOLD_SECONDS = 1.0
+
+# Резервирование токена: бакет может уходить в минус, тогда вызывающий ждет,
+# пока долг погасится пополнением. Запросы выстраиваются в очередь с шагом
+# 1/rate вместо повторных опросов и всплесков после простоя. Если ждать
+# дольше max_wait, токен не списывается: запрос передается планировщику
+# и не оставляет долга, удлиняющего ожидание следующих запросов.
+# Множитель скорости factor (AIMD) снижается после 429 и линейно
+# восстанавливается со временем; ts в будущем - пауза по Retry-After.
+# KEYS[1] - ключ бакета; ARGV: емкость, пополнение в секунду, TTL ключа (мс),
+# восстановление множителя в секунду, максимальное ожидание с резервированием (мкс)
+# Возвращает ожидание в микросекундах
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local ttl_ms = tonumber(ARGV[3])
+local recovery = tonumber(ARGV[4])
+local max_wait_us = tonumber(ARGV[5])
+
+local now = redis.call('TIME')
+local now_us = tonumber(now[1]) * 1000000 + tonumber(now[2])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'factor', 'factor_ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+local factor = tonumber(bucket[3]) or 1
+local factor_ts = tonumber(bucket[4]) or now_us
+
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now_us
+end
+
+if factor < 1 and now_us > factor_ts then
+    factor = math.min(1, factor + (now_us - factor_ts) * recovery / 1000000)
+end
+factor_ts = math.max(factor_ts, now_us)
+
+local effective_rate = rate * factor
+
+if now_us > ts then
+    tokens = math.min(capacity, tokens + (now_us - ts) * effective_rate / 1000000)
+    ts = now_us
+end
+
+local wait_us = ts - now_us
+if tokens < 1 then
+    wait_us = wait_us + math.ceil((1 - tokens) * 1000000 / effective_rate)
+end
+
+if wait_us <= max_wait_us then
+    tokens = tokens - 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', string.format('%.0f', ts),
+    'factor', tostring(factor), 'factor_ts', string.format('%.0f', factor_ts))
+redis.call('PEXPIRE', KEYS[1], ttl_ms)
+
+return wait_us
+"""
+
+# Реакция на 429: мультипликативное снижение скорости и пауза бакета
+# на Retry-After для всех воркеров.
+# KEYS[1] - ключ бакета; ARGV: множитель снижения, минимальный factor,
+# пауза (мкс), TTL ключа (мс)
+# Возвращает новый factor строкой
+PENALTY_SCRIPT = """
+local multiplier = tonumber(ARGV[1])
+local min_factor = tonumber(ARGV[2])
+local pause_us = tonumber(ARGV[3])
+local ttl_ms = tonumber(ARGV[4])
+
+local now = redis.call('TIME')
+local now_us = tonumber(now[1]) * 1000000 + tonumber(now[2])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'factor')
+local tokens = math.min(tonumber(bucket[1]) or 0, 0)
+local ts = math.max(tonumber(bucket[2]) or now_us, now_us + pause_us)
+local factor = math.max(min_factor, (tonumber(bucket[3]) or 1) * multiplier)
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', string.format('%.0f', ts),
+    'factor', tostring(factor), 'factor_ts', string.format('%.0f', now_us))
+redis.call('PEXPIRE', KEYS[1], ttl_ms)
+
+return tostring(factor)
+"""
+
+
+@dataclass
+class RateLimitStats:
+    """Метрики ожидания лимитера для одного класса эндпоинтов"""
+
+    requests: int = 0
+    waited_requests: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    throttled_responses: int = 0
+    redis_errors: int = 0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "waited_requests": self.waited_requests,
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "avg_wait_seconds": round(self.total_wait_seconds / self.requests, 4) if self.requests else 0.0,
+            "throttled_responses": self.throttled_responses,
+            "redis_errors": self.redis_errors
+        }
+
+
+class AllegroRateLimiter:
+    """
+    Token bucket на Redis, общий для всех воркеров и процессов.
+
+    Бакет ведется на пару (токен, класс эндпоинта). Лимиты ALLEGRO_RATE_LIMIT_*
+    задаются в запросах в минуту, емкость бакета ограничена
+    ALLEGRO_RATE_LIMIT_BURST, чтобы после простоя не уходить пачкой запросов.
+
+    Ответ 429 снижает скорость бакета (AIMD): множитель умножается на
+    ALLEGRO_RATE_LIMIT_BACKOFF_FACTOR и восстанавливается на
+    ALLEGRO_RATE_LIMIT_RECOVERY_PER_MINUTE в минуту, а Retry-After
+    приостанавливает бакет для всех воркеров.
+
+    При недоступности Redis лимитер пропускает запросы (fail-open) и повторяет
+    подключение не чаще REDIS_RETRY_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self._redis_url = redis_url or settings.redis.url
+        self._redis: Optional[redis.Redis] = None
+        self._script = None
+        self._penalty_script = None
+        self._redis_unavailable_until = 0.0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, RateLimitStats] = {
+            endpoint_class: RateLimitStats() for endpoint_class in ENDPOINT_CLASSES
+        }
+
+    @staticmethod
+    def classify(url: httpx.URL) -> str:
+        """Класс эндпоинта по URL запроса"""
+
+        auth_host = urlsplit(settings.allegro.auth_url).hostname
+        path = url.path
+
+        if url.host == auth_host and path.startswith("/auth/"):
+            return "auth"
+        if path.startswith("/order/events") or path.startswith("/order/event-stats"):
+            return "events"
+        if path.startswith("/order/"):
+            return "orders"
+        return "general"
+
+    @staticmethod
+    def token_key(authorization: Optional[str]) -> str:
+        """
+        Идентификатор токена для ключа бакета.
+
+        Хеш заголовка Authorization: сам токен в Redis не попадает,
+        а запросы одного токена делят один бакет.
+        """
+
+        if not authorization:
+            return "anonymous"
+        return hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def limit_per_minute(endpoint_class: str) -> int:
+        return getattr(settings.allegro, f"rate_limit_{endpoint_class}")
+
+    def _get_script(self):
+        if self._script is None:
+            self._redis = redis.Redis.from_url(
+                self._redis_url,
+                socket_connect_timeout=1.0,
+                socket_timeout=1.0
+            )
+            self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+            self._penalty_script = self._redis.register_script(PENALTY_SCRIPT)
+        return self._script
+
+    @staticmethod
+    def _max_inline_wait_us() -> int:
+        return int(settings.allegro.retry_max_inline_wait * 1_000_000)
+
+    @staticmethod
+    def _bucket_key(endpoint_class: str, token_key: str) -> str:
+        return f"allegro:ratelimit:{token_key}:{endpoint_class}"
+
+    def _redis_failed(self, endpoint_class: str, error: Exception) -> None:
+        self._redis_unavailable_until = time.monotonic() + REDIS_RETRY_INTERVAL_SECONDS
+        self._stats[endpoint_class].redis_errors += 1
+        logger.warning(f"⚠️ Redis лимитера недоступен, запросы идут без ограничения: {error}")
+
+    def reserve(self, endpoint_class: str, token_key: str) -> float:
+        """
+        Резервирует один запрос в бакете.
+
+        Ожидание дольше ALLEGRO_RETRY_MAX_INLINE_WAIT только вычисляется:
+        токен не списывается, а запрос откладывается в _check_wait.
+
+        Returns:
+            float: Сколько секунд нужно подождать перед отправкой запроса
+        """
+
+        if not settings.allegro.rate_limit_enabled or time.monotonic() < self._redis_unavailable_until:
+            return 0.0
+
+        limit = self.limit_per_minute(endpoint_class)
+        if limit <= 0:
+            return 0.0
+
+        rate = limit / 60.0
+        capacity = max(1, min(limit, settings.allegro.rate_limit_burst))
+        ttl_ms = int(capacity / rate * 1000) + 60000
+
+        try:
+            with self._lock:
+                script = self._get_script()
+            wait_us = script(
+                keys=[self._bucket_key(endpoint_class, token_key)],
+                args=[
+                    capacity, rate, ttl_ms,
+                    settings.allegro.rate_limit_recovery_per_minute / 60.0,
+                    self._max_inline_wait_us()
+                ]
+            )
+            return int(wait_us) / 1_000_000
+        except redis.RedisError as e:
+            self._redis_failed(endpoint_class, e)
+            return 0.0
+
+    def penalize(self, endpoint_class: str, token_key: str, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Снижает скорость бакета после ответа 429.
+
+        Args:
+            endpoint_class: Класс эндпоинта
+            token_key: Идентификатор токена (token_key)
+            retry_after: Пауза из Retry-After в секундах
+
+        Returns:
+            Optional[float]: Новый множитель скорости или None, если Redis недоступен
+        """
+
+        self._stats[endpoint_class].throttled_responses += 1
+
+        if not settings.allegro.rate_limit_enabled or time.monotonic() < self._redis_unavailable_until:
+            return None
+
+        pause = retry_after or 0.0
+        ttl_ms = int(pause * 1000) + 120000
+
+        try:
+            with self._lock:
+                self._get_script()
+                script = self._penalty_script
+            factor = float(script(
+                keys=[self._bucket_key(endpoint_class, token_key)],
+                args=[
+                    settings.allegro.rate_limit_backoff_factor,
+                    settings.allegro.rate_limit_min_factor,
+                    int(pause * 1_000_000),
+                    ttl_ms
+                ]
+            ))
+        except redis.RedisError as e:
+            self._redis_failed(endpoint_class, e)
+            return None
+
+        logger.warning(
+            f"🐢 429 от Allegro ({endpoint_class}): скорость снижена до {factor:.0%}"
+            + (f", пауза {pause:.1f} сек" if pause else "")
+        )
+        return factor
+
+    def _record(self, endpoint_class: str, wait: float) -> None:
+        stats = self._stats[endpoint_class]
+        stats.requests += 1
+
+        if wait > 0:
+            stats.waited_requests += 1
+            stats.total_wait_seconds += wait
+            stats.max_wait_seconds = max(stats.max_wait_seconds, wait)
+
+            if wait >= WAIT_LOG_THRESHOLD_SECONDS:
+                logger.info(f"⏳ Rate limit {endpoint_class}: ожидание {wait:.2f} сек")
+
+    def _check_wait(self, endpoint_class: str, wait: float) -> None:
+        """Ожидание дольше ALLEGRO_RETRY_MAX_INLINE_WAIT (не зарезервированное) передается планировщику"""
+
+        # Сравнение в микросекундах - тот же порог, что в TOKEN_BUCKET_SCRIPT
+        if round(wait * 1_000_000) > self._max_inline_wait_us():
+            self._record(endpoint_class, 0.0)
+            raise AllegroRetryLater(wait, f"rate limit {endpoint_class}")
+
+    def acquire(self, endpoint_class: str, token_key: str) -> float:
+        """
+        Блокирующее получение разрешения на запрос.
+
+        Raises:
+            AllegroRetryLater: Если ждать дольше ALLEGRO_RETRY_MAX_INLINE_WAIT
+        """
+
+        wait = self.reserve(endpoint_class, token_key)
+        self._check_wait(endpoint_class, wait)
+        if wait > 0:
+            time.sleep(wait)
+        self._record(endpoint_class, wait)
+        return wait
+
+    async def acquire_async(self, endpoint_class: str, token_key: str) -> float:
+        """Асинхронное получение разрешения на запрос"""
+
+        wait = await asyncio.to_thread(self.reserve, endpoint_class, token_key)
+        self._check_wait(endpoint_class, wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._record(endpoint_class, wait)
+        return wait
+
+    def before_request(self, request: httpx.Request) -> None:
+        """Event hook httpx.Client"""
+
+        self.acquire(self.classify(request.url), self.token_key(request.headers.get("Authorization")))
+
+    async def before_request_async(self, request: httpx.Request) -> None:
+        """Event hook httpx.AsyncClient"""
+
+        await self.acquire_async(self.classify(request.url), self.token_key(request.headers.get("Authorization")))
+
+    def after_response(self, response: httpx.Response) -> None:
+        """Event hook httpx.Client для ответов"""
+
+        if response.status_code == 429:
+            request = response.request
+            self.penalize(
+                self.classify(request.url),
+                self.token_key(request.headers.get("Authorization")),
+                parse_retry_after(response)
+            )
+
+    async def after_response_async(self, response: httpx.Response) -> None:
+        """Event hook httpx.AsyncClient для ответов"""
+
+        if response.status_code == 429:
+            await asyncio.to_thread(self.after_response, response)
+
+    def total_wait_seconds(self) -> float:
+        """Суммарное ожидание процесса по всем классам эндпоинтов"""
+
+        return sum(stats.total_wait_seconds for stats in self._stats.values())
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Метрики ожидания по классам эндпоинтов (в пределах процесса)"""
+
+        return {endpoint_class: stats.to_dict() for endpoint_class, stats in self._stats.items()}
+
+
+# Глобальный экземпляр лимитера процесса
+allegro_rate_limiter = AllegroRateLimiter()
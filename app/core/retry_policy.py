@@ -0,0 +1,109 @@
+"""
+@file: app/core/retry_policy.py
+@description: Политика повторов запросов к Allegro API с учетом Retry-After
+@dependencies: httpx, settings
+"""
+
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+from .settings import settings
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Временные сетевые ошибки
+RETRYABLE_EXCEPTIONS = (httpx.ConnectError, httpx.TimeoutException, ConnectionError)
+
+# Заголовки с временем до сброса лимита (в секундах), если нет Retry-After
+RATE_LIMIT_RESET_HEADERS = ("X-RateLimit-Reset", "RateLimit-Reset")
+
+
+class AllegroRetryLater(Exception):
+    """
+    Повтор запроса нужен позже, чем допустимо ждать внутри воркера.
+
+    Вызывающий код передает ожидание планировщику (countdown задачи Celery,
+    next_retry_at проблемного заказа) вместо блокирующего sleep.
+    """
+
+    def __init__(self, retry_after: float, reason: str = ""):
+        self.retry_after = retry_after
+        self.reason = reason
+        super().__init__(f"Повтор через {retry_after:.1f} сек: {reason}" if reason else f"Повтор через {retry_after:.1f} сек")
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    Время ожидания из заголовков ответа.
+
+    Поддерживается Retry-After в секундах и в формате HTTP-date,
+    а для 429 без Retry-After - заголовки сброса лимита.
+
+    Returns:
+        Optional[float]: Секунды ожидания или None, если сервер его не указал
+    """
+
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        retry_after = retry_after.strip()
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            retry_at = None
+        if retry_at is not None:
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    if response.status_code == 429:
+        for header in RATE_LIMIT_RESET_HEADERS:
+            value = response.headers.get(header)
+            if value:
+                try:
+                    return max(0.0, float(value))
+                except ValueError:
+                    continue
+
+    return None
+
+
+def is_retryable_response(response: httpx.Response) -> bool:
+    return response.status_code in RETRYABLE_STATUS_CODES
+
+
+def retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """
+    Пауза перед повтором с номером attempt (с нуля).
+
+    Retry-After сервера имеет приоритет, иначе экспоненциальный backoff
+    ALLEGRO_RETRY_BASE_DELAY * 2^attempt с джиттером до 10%.
+    """
+
+    if response is not None:
+        retry_after = parse_retry_after(response)
+        if retry_after is not None:
+            return retry_after
+
+    delay = min(settings.allegro.retry_base_delay * 2 ** attempt, settings.allegro.retry_max_delay)
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def ensure_inline_wait(delay: float, reason: str = "") -> None:
+    """
+    Проверяет, что паузу можно выждать внутри воркера.
+
+    Raises:
+        AllegroRetryLater: Если пауза длиннее ALLEGRO_RETRY_MAX_INLINE_WAIT
+    """
+
+    if delay > settings.allegro.retry_max_inline_wait:
+        raise AllegroRetryLater(delay, reason)
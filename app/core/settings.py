@@ -39,9 +39,25 @@ def log_environment_variables() -> Dict[str, str]:
         'ALLEGRO_AUTH_URL', 'ALLEGRO_SANDBOX_MODE',
         'ALLEGRO_RATE_LIMIT_GENERAL', 'ALLEGRO_RATE_LIMIT_ORDERS',
         'ALLEGRO_RATE_LIMIT_EVENTS', 'ALLEGRO_RATE_LIMIT_AUTH',
+        'ALLEGRO_RATE_LIMIT_ENABLED', 'ALLEGRO_RATE_LIMIT_BURST',
+        'ALLEGRO_RATE_LIMIT_BACKOFF_FACTOR', 'ALLEGRO_RATE_LIMIT_MIN_FACTOR', 'ALLEGRO_RATE_LIMIT_RECOVERY_PER_MINUTE',
+        'ALLEGRO_RETRY_BASE_DELAY', 'ALLEGRO_RETRY_MAX_DELAY', 'ALLEGRO_RETRY_MAX_INLINE_WAIT',
+        'ALLEGRO_TOKEN_CACHE_TTL', 'ALLEGRO_TOKEN_CACHE_EXPIRY_MARGIN',
+        'ALLEGRO_HTTP2', 'ALLEGRO_HTTP_TIMEOUT', 'ALLEGRO_HTTP_CONNECT_TIMEOUT',
+        'ALLEGRO_HTTP_MAX_CONNECTIONS', 'ALLEGRO_HTTP_MAX_KEEPALIVE_CONNECTIONS', 'ALLEGRO_HTTP_KEEPALIVE_EXPIRY',
         'LOG_LEVEL', 'LOG_FILE_PATH', 'LOG_MAX_BYTES', 'LOG_BACKUP_COUNT', 'LOG_FORMAT',
         'DEFAULT_SYNC_INTERVAL_HOURS', 'ORDER_EVENTS_CHECK_INTERVAL_MINUTES',
-        'TOKEN_REFRESH_INTERVAL_MINUTES', 'CLEANUP_INTERVAL_DAYS'
+        'TOKEN_REFRESH_INTERVAL_MINUTES', 'CLEANUP_INTERVAL_DAYS',
+        'SYNC_EVENTS_PAGE_LIMIT', 'SYNC_MAX_EVENT_PAGES_PER_RUN',
+        'SYNC_DETAILS_FETCH_CONCURRENCY', 'SYNC_BACKFILL_WINDOW_DAYS', 'SYNC_BACKFILL_CONCURRENCY',
+        'SYNC_PREFETCH_PAGES', 'SYNC_TIME_LIMIT_MARGIN_SECONDS', 'SYNC_PROGRESS_INTERVAL_SECONDS',
+        'SYNC_LOCK_TTL_SECONDS', 'SYNC_DISPATCH_INTERVAL_SECONDS',
+        'SYNC_POLLER_MIN_INTERVAL_SECONDS', 'SYNC_POLLER_MAX_INTERVAL_SECONDS',
+        'SYNC_POLLER_TOKENS_REFRESH_SECONDS', 'SYNC_POLLER_CONCURRENCY', 'SYNC_DISPATCH_MAX_CONCURRENT', 'SYNC_DISPATCH_JITTER_SECONDS',
+        'SYNC_FAILED_RETRY_INTERVAL_SECONDS', 'SYNC_FAILED_RETRY_WORKERS', 'SYNC_FAILED_RETRY_BATCH_SIZE',
+        'SYNC_FAILED_RETRY_CLAIM_TIMEOUT_SECONDS', 'SYNC_REVISION_KEYFRAME_INTERVAL',
+        'STORAGE_JSON_COMPRESSION', 'STORAGE_ZSTD_LEVEL', 'STORAGE_ZSTD_DICTIONARY_PATH',
+        'STORAGE_COMPRESSION_BATCH_SIZE'
     ]
     
     for var in expected_vars:
@@ -147,6 +163,28 @@ class AllegroSettings(BaseSettings):
     rate_limit_orders: int = Field(default=100, alias="ALLEGRO_RATE_LIMIT_ORDERS")
     rate_limit_events: int = Field(default=60, alias="ALLEGRO_RATE_LIMIT_EVENTS")
     rate_limit_auth: int = Field(default=10, alias="ALLEGRO_RATE_LIMIT_AUTH")
+    rate_limit_enabled: bool = Field(default=True, alias="ALLEGRO_RATE_LIMIT_ENABLED")
+    rate_limit_burst: int = Field(default=10, alias="ALLEGRO_RATE_LIMIT_BURST")  # Емкость token bucket
+    rate_limit_backoff_factor: float = Field(default=0.5, alias="ALLEGRO_RATE_LIMIT_BACKOFF_FACTOR")  # Снижение скорости после 429
+    rate_limit_min_factor: float = Field(default=0.1, alias="ALLEGRO_RATE_LIMIT_MIN_FACTOR")
+    rate_limit_recovery_per_minute: float = Field(default=0.1, alias="ALLEGRO_RATE_LIMIT_RECOVERY_PER_MINUTE")
+    
+    # Повторы запросов
+    retry_base_delay: float = Field(default=1.0, alias="ALLEGRO_RETRY_BASE_DELAY")
+    retry_max_delay: float = Field(default=300.0, alias="ALLEGRO_RETRY_MAX_DELAY")
+    retry_max_inline_wait: float = Field(default=10.0, alias="ALLEGRO_RETRY_MAX_INLINE_WAIT")  # Дольше - через countdown Celery
+    
+    # Кеш access token в памяти процесса
+    token_cache_ttl: float = Field(default=300.0, alias="ALLEGRO_TOKEN_CACHE_TTL")
+    token_cache_expiry_margin: float = Field(default=60.0, alias="ALLEGRO_TOKEN_CACHE_EXPIRY_MARGIN")
+    
+    # HTTP клиент (пул соединений на процесс)
+    http2: bool = Field(default=False, alias="ALLEGRO_HTTP2")  # Требует пакет h2
+    http_timeout: float = Field(default=30.0, alias="ALLEGRO_HTTP_TIMEOUT")
+    http_connect_timeout: float = Field(default=10.0, alias="ALLEGRO_HTTP_CONNECT_TIMEOUT")
+    http_max_connections: int = Field(default=20, alias="ALLEGRO_HTTP_MAX_CONNECTIONS")
+    http_max_keepalive_connections: int = Field(default=10, alias="ALLEGRO_HTTP_MAX_KEEPALIVE_CONNECTIONS")
+    http_keepalive_expiry: float = Field(default=30.0, alias="ALLEGRO_HTTP_KEEPALIVE_EXPIRY")
 
     class Config:
         env_file = ".env"
@@ -180,6 +218,66 @@ class SyncSettings(BaseSettings):
         default=30, alias="TOKEN_REFRESH_INTERVAL_MINUTES"
     )
     cleanup_interval_days: int = Field(default=1, alias="CLEANUP_INTERVAL_DAYS")
+    
+    # Пагинация Events API
+    events_page_limit: int = Field(default=1000, alias="SYNC_EVENTS_PAGE_LIMIT")  # Максимум 1000 согласно API
+    max_event_pages_per_run: int = Field(default=50, alias="SYNC_MAX_EVENT_PAGES_PER_RUN")
+    
+    # Параллельное получение деталей заказов (Checkout Forms API)
+    details_fetch_concurrency: int = Field(default=10, alias="SYNC_DETAILS_FETCH_CONCURRENCY")
+    
+    # Выгрузка Checkout Forms API по временным окнам
+    backfill_window_days: int = Field(default=30, alias="SYNC_BACKFILL_WINDOW_DAYS")
+    backfill_concurrency: int = Field(default=4, alias="SYNC_BACKFILL_CONCURRENCY")
+    
+    # Страницы API, загружаемые заранее, пока текущая записывается в БД (0 - без предзагрузки)
+    prefetch_pages: int = Field(default=2, alias="SYNC_PREFETCH_PAGES")
+    
+    # Продолжение длинных синхронизаций в новой задаче до soft time limit Celery
+    time_limit_margin_seconds: int = Field(default=120, alias="SYNC_TIME_LIMIT_MARGIN_SECONDS")
+    
+    # Не чаще одной записи прогресса в TaskHistory за интервал
+    progress_interval_seconds: float = Field(default=5.0, alias="SYNC_PROGRESS_INTERVAL_SECONDS")
+    
+    # Блокировка синхронизации токена в Redis (продлевается каждые TTL/3)
+    lock_ttl_seconds: int = Field(default=120, alias="SYNC_LOCK_TTL_SECONDS")
+    
+    # Процесс постоянного опроса Events API (python -m app.event_poller)
+    poller_min_interval_seconds: float = Field(default=5.0, alias="SYNC_POLLER_MIN_INTERVAL_SECONDS")
+    poller_max_interval_seconds: float = Field(default=60.0, alias="SYNC_POLLER_MAX_INTERVAL_SECONDS")
+    poller_tokens_refresh_seconds: float = Field(default=60.0, alias="SYNC_POLLER_TOKENS_REFRESH_SECONDS")
+    poller_concurrency: int = Field(default=10, alias="SYNC_POLLER_CONCURRENCY")
+    
+    # Диспетчер автосинхронизаций (одна задача Beat вместо задачи на каждый токен)
+    dispatch_interval_seconds: int = Field(default=60, alias="SYNC_DISPATCH_INTERVAL_SECONDS")
+    dispatch_max_concurrent: int = Field(default=20, alias="SYNC_DISPATCH_MAX_CONCURRENT")
+    dispatch_jitter_seconds: int = Field(default=30, alias="SYNC_DISPATCH_JITTER_SECONDS")
+    
+    # Повторная обработка проблемных заказов (failed_order_processing) несколькими воркерами
+    failed_retry_interval_seconds: int = Field(default=60, alias="SYNC_FAILED_RETRY_INTERVAL_SECONDS")
+    failed_retry_workers: int = Field(default=4, alias="SYNC_FAILED_RETRY_WORKERS")
+    failed_retry_batch_size: int = Field(default=50, alias="SYNC_FAILED_RETRY_BATCH_SIZE")
+    failed_retry_claim_timeout_seconds: int = Field(default=900, alias="SYNC_FAILED_RETRY_CLAIM_TIMEOUT_SECONDS")
+    
+    # История версий заказов (order_revisions): полный снимок каждые N версий, между ними - JSON Patch
+    revision_keyframe_interval: int = Field(default=20, alias="SYNC_REVISION_KEYFRAME_INTERVAL")
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+class StorageSettings(BaseSettings):
+    """Настройки хранения JSON-документов (колонки CompressedJSON)"""
+    
+    # Сжатие zstd при записи (без пакета zstandard приложение и воркеры не запускаются)
+    json_compression: bool = Field(default=True, alias="STORAGE_JSON_COMPRESSION")
+    zstd_level: int = Field(default=3, alias="STORAGE_ZSTD_LEVEL")
+    # Словарь, обученный на checkout forms (scripts/train_zstd_dictionary.py); пусто - без словаря
+    zstd_dictionary_path: str = Field(default="", alias="STORAGE_ZSTD_DICTIONARY_PATH")
+    # Строк за одну транзакцию при пересжатии (задача compress_json_payloads)
+    compression_batch_size: int = Field(default=1000, alias="STORAGE_COMPRESSION_BATCH_SIZE")
 
     class Config:
         env_file = ".env"
@@ -198,6 +296,7 @@ class Settings(BaseSettings):
     allegro: AllegroSettings = AllegroSettings()
     logging: LoggingSettings = LoggingSettings()
     sync: SyncSettings = SyncSettings()
+    storage: StorageSettings = StorageSettings()
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,180 @@
+"""
+@file: app/core/sync_lock.py
+@description: Распределенная блокировка синхронизации токена (lease в Redis с продлением)
+@dependencies: redis, settings
+"""
+
+import threading
+from typing import Optional
+
+import redis
+
+from .settings import settings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Захват: свободная блокировка или повторный захват тем же владельцем (продолжение цепочки задач)
+ACQUIRE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner == false or owner == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Продление и освобождение только владельцем
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SyncLease:
+    """
+    Захваченная блокировка синхронизации токена.
+
+    Фоновый поток продлевает lease каждые SYNC_LOCK_TTL_SECONDS / 3.
+    Если продление показало, что блокировкой владеет другой процесс
+    (lease истек), устанавливается lost - синхронизация должна остановиться.
+    """
+
+    def __init__(self, lock: "TokenSyncLock", token_id: str, owner: str, enabled: bool = True):
+        self.token_id = str(token_id)
+        self.owner = owner
+        self._lock = lock
+        self._enabled = enabled
+        self._stopped = threading.Event()
+        self._lost = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+        if enabled:
+            self._heartbeat = threading.Thread(
+                target=self._renew_until_stopped,
+                name=f"sync-lease-{self.token_id}",
+                daemon=True
+            )
+            self._heartbeat.start()
+
+    @property
+    def lost(self) -> bool:
+        return self._lost.is_set()
+
+    def _renew_until_stopped(self) -> None:
+        interval = max(1.0, settings.sync.lock_ttl_seconds / 3)
+        while not self._stopped.wait(interval):
+            try:
+                renewed = self._lock.renew(self.token_id, self.owner)
+            except redis.RedisError as e:
+                # Lease еще действует до истечения TTL - повторим на следующем шаге
+                logger.warning(f"⚠️ Не удалось продлить блокировку синхронизации токена {self.token_id}: {e}")
+                continue
+            if not renewed:
+                self._lost.set()
+                logger.error(f"❌ Блокировка синхронизации токена {self.token_id} потеряна (lease истек)")
+                return
+
+    def stop_heartbeat(self) -> None:
+        """Остановка продления без освобождения (lease доживает TTL)"""
+
+        self._stopped.set()
+
+    def release(self) -> None:
+        self.stop_heartbeat()
+        if not self._enabled or self.lost:
+            return
+        try:
+            self._lock.release(self.token_id, self.owner)
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Не удалось освободить блокировку синхронизации токена {self.token_id}: {e}")
+
+    def __enter__(self) -> "SyncLease":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class TokenSyncLock:
+    """
+    Блокировка, не допускающая одновременных синхронизаций одного токена.
+
+    Владелец - ID первой задачи цепочки синхронизации: задача-продолжение
+    с тем же владельцем захватывает блокировку повторно. При недоступности
+    Redis синхронизация выполняется без блокировки (fail-open).
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self._redis_url = redis_url or settings.redis.url
+        self._redis: Optional[redis.Redis] = None
+        self._scripts = {}
+
+    def _get_redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(
+                self._redis_url,
+                socket_connect_timeout=1.0,
+                socket_timeout=1.0
+            )
+        return self._redis
+
+    def _script(self, source: str):
+        if source not in self._scripts:
+            self._scripts[source] = self._get_redis().register_script(source)
+        return self._scripts[source]
+
+    @staticmethod
+    def _key(token_id: str) -> str:
+        return f"allegro:sync-lock:{token_id}"
+
+    @staticmethod
+    def _ttl_ms() -> int:
+        return int(settings.sync.lock_ttl_seconds * 1000)
+
+    def acquire(self, token_id: str, owner: str) -> Optional[SyncLease]:
+        """
+        Захват блокировки токена.
+
+        Returns:
+            Optional[SyncLease]: Lease или None, если токен синхронизирует другой владелец
+        """
+
+        try:
+            acquired = self._script(ACQUIRE_SCRIPT)(keys=[self._key(token_id)], args=[owner, self._ttl_ms()])
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Redis недоступен, синхронизация токена {token_id} выполняется без блокировки: {e}")
+            return SyncLease(self, token_id, owner, enabled=False)
+
+        if not acquired:
+            return None
+        return SyncLease(self, token_id, owner)
+
+    def renew(self, token_id: str, owner: str) -> bool:
+        return bool(self._script(RENEW_SCRIPT)(keys=[self._key(token_id)], args=[owner, self._ttl_ms()]))
+
+    def release(self, token_id: str, owner: str) -> bool:
+        return bool(self._script(RELEASE_SCRIPT)(keys=[self._key(token_id)], args=[owner]))
+
+    def holder(self, token_id: str) -> Optional[str]:
+        """Владелец блокировки токена (ID задачи) или None"""
+
+        try:
+            owner = self._get_redis().get(self._key(token_id))
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Не удалось проверить блокировку синхронизации токена {token_id}: {e}")
+            return None
+        return owner.decode() if isinstance(owner, bytes) else owner
+
+
+# Глобальный экземпляр блокировки синхронизаций
+token_sync_lock = TokenSyncLock()
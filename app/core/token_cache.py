@@ -0,0 +1,209 @@
+"""
+@file: app/core/token_cache.py
+@description: Кеш access token Allegro в памяти процесса с инвалидацией через Redis pub/sub
+@dependencies: redis, settings
+"""
+
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import redis
+
+from .settings import settings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Канал Redis, в который публикуются ID измененных токенов
+INVALIDATION_CHANNEL = "allegro:token-invalidations"
+
+# Пауза перед повторным подключением подписчика к недоступному Redis
+LISTENER_RETRY_INTERVAL_SECONDS = 30.0
+
+
+@dataclass
+class CachedToken:
+    """Access token в кеше процесса"""
+
+    user_id: str
+    access_token: str
+    expires_at: datetime
+    cached_at: float
+
+
+class AccessTokenCache:
+    """
+    Кеш действительных access token по token_id.
+
+    Запись используется, пока токен не истекает (с запасом
+    ALLEGRO_TOKEN_CACHE_EXPIRY_MARGIN) и не старше ALLEGRO_TOKEN_CACHE_TTL.
+    Изменение токена в TokenService вызывает invalidate(): запись удаляется
+    локально, а ID токена публикуется в Redis, чтобы остальные процессы
+    тоже сбросили кеш. Если Redis недоступен, устаревание ограничено TTL.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self._redis_url = redis_url or settings.redis.url
+        self._tokens: Dict[str, CachedToken] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._redis: Optional[redis.Redis] = None
+        self._listener = None
+        self._listener_retry_at = 0.0
+
+    def _check_fork(self) -> None:
+        """После fork воркера кеш и подписка родителя не используются"""
+
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._tokens = {}
+            self._lock = threading.Lock()
+            self._redis = None
+            self._listener = None
+            self._listener_retry_at = 0.0
+
+    def _get_redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(
+                self._redis_url,
+                socket_connect_timeout=1.0,
+                socket_timeout=1.0
+            )
+        return self._redis
+
+    def _ensure_listener(self) -> None:
+        """Ленивая подписка на инвалидации (фоновый поток процесса)"""
+
+        if self._listener is not None or time.monotonic() < self._listener_retry_at:
+            return
+
+        try:
+            pubsub = self._get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+            self._listener = pubsub.run_in_thread(
+                sleep_time=1.0,
+                daemon=True,
+                exception_handler=self._on_listener_error
+            )
+            logger.info("🔔 Подписка на инвалидации токенов запущена")
+        except redis.RedisError as e:
+            self._listener_retry_at = time.monotonic() + LISTENER_RETRY_INTERVAL_SECONDS
+            logger.warning(f"⚠️ Подписка на инвалидации токенов недоступна, кеш ограничен TTL: {e}")
+
+    def _on_invalidation(self, message: Dict) -> None:
+        token_id = message.get("data")
+        if isinstance(token_id, bytes):
+            token_id = token_id.decode()
+        with self._lock:
+            self._tokens.pop(token_id, None)
+
+    def _on_listener_error(self, error: Exception, pubsub, thread) -> None:
+        logger.warning(f"⚠️ Подписка на инвалидации токенов прервана: {error}")
+        thread.stop()
+        pubsub.close()
+        # Пока подписки нет, инвалидации из других процессов могли потеряться
+        with self._lock:
+            self._tokens.clear()
+            self._listener = None
+            self._listener_retry_at = time.monotonic() + LISTENER_RETRY_INTERVAL_SECONDS
+
+    def _is_usable(self, entry: CachedToken) -> bool:
+        margin = timedelta(seconds=settings.allegro.token_cache_expiry_margin)
+        return (
+            entry.expires_at - margin > datetime.utcnow()
+            and time.monotonic() - entry.cached_at < settings.allegro.token_cache_ttl
+        )
+
+    def get(self, token_id: str, user_id: str) -> Optional[str]:
+        """Access token из кеша или None, если его нужно загрузить из БД"""
+
+        self._check_fork()
+        self._ensure_listener()
+
+        with self._lock:
+            entry = self._tokens.get(str(token_id))
+            if entry is None:
+                return None
+            if entry.user_id != user_id:
+                return None
+            if not self._is_usable(entry):
+                self._tokens.pop(str(token_id), None)
+                return None
+            return entry.access_token
+
+    def put(self, token_id: str, user_id: str, access_token: str, expires_at: datetime) -> None:
+        self._check_fork()
+
+        entry = CachedToken(
+            user_id=user_id,
+            access_token=access_token,
+            expires_at=expires_at,
+            cached_at=time.monotonic()
+        )
+        if self._is_usable(entry):
+            with self._lock:
+                self._tokens[str(token_id)] = entry
+
+    def get_or_load(self, token_id: str, user_id: str, loader: Callable[[], Optional[object]]) -> Optional[str]:
+        """
+        Access token из кеша, а при промахе - из loader.
+
+        Args:
+            token_id: ID токена
+            user_id: ID пользователя (владелец токена)
+            loader: Загрузка действительного UserToken из БД (или None)
+
+        Returns:
+            Optional[str]: Access token или None, если токен недействителен
+        """
+
+        access_token = self.get(token_id, user_id)
+        if access_token is not None:
+            return access_token
+
+        token = loader()
+        if token is None:
+            return None
+
+        self.put(token_id, user_id, token.allegro_token, token.expires_at)
+        return token.allegro_token
+
+    def invalidate(self, token_id) -> None:
+        """Сброс токена в этом и остальных процессах (после обновления или деактивации)"""
+
+        self._check_fork()
+        token_id = str(token_id)
+
+        with self._lock:
+            self._tokens.pop(token_id, None)
+
+        try:
+            self._get_redis().publish(INVALIDATION_CHANNEL, token_id)
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Не удалось опубликовать инвалидацию токена {token_id}: {e}")
+
+    async def invalidate_async(self, token_id) -> None:
+        """invalidate() для async кода: публикация в Redis не блокирует event loop"""
+
+        await asyncio.to_thread(self.invalidate, token_id)
+
+    def discard_access_token(self, access_token: str) -> None:
+        """Сброс записи по значению access token (например, после ответа 401)"""
+
+        with self._lock:
+            for token_id, entry in list(self._tokens.items()):
+                if entry.access_token == access_token:
+                    self._tokens.pop(token_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+
+
+# Глобальный кеш токенов процесса
+access_token_cache = AccessTokenCache()
@@ -0,0 +1,36 @@
+"""
+@file: app/event_poller.py
+@description: Точка входа процесса опроса Events API (python -m app.event_poller)
+@dependencies: asyncio, EventPollerService
+"""
+
+import asyncio
+import signal
+
+from app.core.logging import setup_logging, get_logger, disable_technical_logging
+from app.core.allegro_client import allegro_client
+
+# Сначала отключаем все технические логи
+disable_technical_logging()
+
+# Инициализация логирования
+setup_logging()
+logger = get_logger(__name__)
+
+
+async def main() -> None:
+    from app.services.event_poller_service import EventPollerService
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await EventPollerService().run(stop)
+    finally:
+        await allegro_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -12,6 +12,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.core.settings import settings
 from app.core.logging import setup_logging, get_logger, disable_technical_logging
 from app.core.database import db_manager
+from app.core.allegro_client import allegro_client
+from app.core.compressed_json import get_codec
 from app.core.auth import CurrentUser
 from app.api.dependencies import CurrentUserDep
 
@@ -51,6 +53,9 @@ async def lifespan(app: FastAPI):
         "logging": config_info["logging"]
     })
     
+    # Проверка кодека CompressedJSON до работы с базой (без zstandard запуск прерывается)
+    get_codec()
+    
     # Инициализация базы данных
     await db_manager.startup()
     
@@ -61,6 +66,8 @@ async def lifespan(app: FastAPI):
     # Остановка
     logger.info("Shutting down service...")
     await db_manager.shutdown()
+    await allegro_client.aclose()
+    allegro_client.close()
     logger.info("Service stopped")
 
 
@@ -165,9 +172,12 @@ async def health_check():
         from app.core.database import check_database_connection
         db_status = await check_database_connection()
         
+        from app.core.rate_limiter import allegro_rate_limiter
+        
         return {
             "status": "healthy" if db_status else "unhealthy",
             "database": "connected" if db_status else "disconnected",
+            "allegro_rate_limits": allegro_rate_limiter.get_stats(),
             "service": "Allegro Orders Backup",
             "version": "1.0.0",
             "timestamp": datetime.now().isoformat()
@@ -45,6 +45,11 @@ from .failed_order_processing import (
     FailedOrderProcessing,
     FailedOrderStatus
 )
+from .sync_cursor import SyncCursor
+from .data_health_counter import DataHealthCounter
+from .data_quality_daily import DataQualityDaily
+from .token_order_count import TokenOrderCount
+from .order_revision import OrderRevision
 
 __all__ = [
     "BaseModel",
@@ -76,4 +81,9 @@ __all__ = [
     "OrderWithTechnicalFlags",
     "FailedOrderProcessing",
     "FailedOrderStatus",
+    "SyncCursor",
+    "DataHealthCounter",
+    "DataQualityDaily",
+    "TokenOrderCount",
+    "OrderRevision",
 ] 
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+@file: app/models/data_health_counter.py
+@description: Модель счетчиков качества данных токена по интервалам времени
+@dependencies: sqlmodel
+"""
+
+from datetime import datetime
+from uuid import UUID
+
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import BigInteger, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+
+class DataHealthCounter(SQLModel, table=True):
+    """
+    Счетчики качества сохраненных событий токена за интервал времени.
+
+    Увеличиваются в одной транзакции с сохранением событий, поэтому
+    проверка состояния данных перед синхронизацией читает несколько строк
+    за последний час, а не анализирует order_events за весь период.
+    """
+
+    __tablename__ = "data_health_counters"
+
+    token_id: UUID = Field(
+        sa_column=Column(PG_UUID, ForeignKey("user_tokens.id", ondelete="CASCADE"), primary_key=True),
+        description="ID токена пользователя"
+    )
+
+    bucket_start: datetime = Field(
+        primary_key=True,
+        description="Начало интервала (время события, округленное вниз)"
+    )
+
+    total_events: int = Field(default=0, description="Сохранено событий")
+
+    missing_data_count: int = Field(default=0, description="Событий с отсутствующими полями")
+
+    regression_count: int = Field(default=0, description="Событий без товаров")
+
+    issues_count: int = Field(default=0, description="Событий с критическими проблемами")
+
+    issue_mask: int = Field(
+        default=0,
+        sa_column=Column(BigInteger, nullable=False, server_default="0"),
+        description="Битовая маска встреченных видов критических проблем"
+    )
+
+    updated_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        description="Время последнего обновления счетчиков"
+    )
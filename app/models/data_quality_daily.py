@@ -0,0 +1,43 @@
+"""
+@file: app/models/data_quality_daily.py
+@description: Модель дневной сводки качества данных по токену, типу события и виду проблемы
+@dependencies: sqlmodel
+"""
+
+from datetime import date, datetime
+from uuid import UUID
+
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+
+class DataQualityDaily(SQLModel, table=True):
+    """
+    Число событий за день по виду проблемы качества данных.
+
+    Строки с issue = "all" содержат общее число событий, остальные -
+    число событий с конкретной проблемой (см. DataMonitoringService).
+    Обновляется вместе с сохранением событий, поэтому отчет о качестве
+    данных - одна группировка по нескольким сотням строк.
+    """
+
+    __tablename__ = "data_quality_daily"
+
+    token_id: UUID = Field(
+        sa_column=Column(PG_UUID, ForeignKey("user_tokens.id", ondelete="CASCADE"), primary_key=True),
+        description="ID токена пользователя"
+    )
+
+    day: date = Field(primary_key=True, description="День события (UTC)")
+
+    event_type: str = Field(primary_key=True, description="Тип события")
+
+    issue: str = Field(primary_key=True, description="Вид проблемы или all")
+
+    events_count: int = Field(default=0, description="Число событий")
+
+    updated_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        description="Время последнего обновления строки"
+    )
@@ -4,11 +4,12 @@
 @dependencies: Base model, UUID, datetime
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from uuid import UUID, uuid4
 import json
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from app.models.base import BaseModel
 
 class FailedOrderStatus:
@@ -30,6 +31,11 @@ class FailedOrderProcessing(BaseModel, table=True):
     
     __tablename__ = "failed_order_processing"
     
+    # Выборка очереди повторной обработки: status, затем priority, next_retry_at
+    __table_args__ = (
+        Index("ix_failed_order_processing_claim", "status", "priority", "next_retry_at"),
+    )
+    
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     
     # Основные данные заказа
@@ -91,8 +97,9 @@ class FailedOrderProcessing(BaseModel, table=True):
         from datetime import timedelta
         return datetime.utcnow() + timedelta(minutes=minutes)
         
-    def mark_for_retry(self, error_message: str, error_type: str = "api_error") -> None:
-        """Помечает заказ для повторной обработки"""
+    def mark_for_retry(self, error_message: str, error_type: str = "api_error",
+                       retry_after: Optional[float] = None) -> None:
+        """Помечает заказ для повторной обработки (не раньше паузы retry_after в секундах)"""
         self.retry_count += 1
         self.error_message = error_message
         self.error_type = error_type
@@ -104,6 +111,8 @@ class FailedOrderProcessing(BaseModel, table=True):
         else:
             self.status = FailedOrderStatus.PENDING
             self.next_retry_at = self.calculate_next_retry()
+            if retry_after:
+                self.next_retry_at = max(self.next_retry_at, self.last_retry_at + timedelta(seconds=retry_after))
             
     def mark_resolved(self) -> None:
         """Помечает заказ как успешно обработанный"""
@@ -55,6 +55,9 @@ class Order(OrderBase, BaseModel, table=True):
         UniqueConstraint("token_id", "allegro_order_id", name="uq_orders_per_token"),
     )
     
+    # Номер последней версии order_data в order_revisions (0 - история не велась)
+    revision_seq: int = Field(default=0, description="Номер последней записанной версии заказа")
+    
     # Связи с другими таблицами (закомментировано для отладки)
     # user_token: "UserToken" = Relationship(back_populates="orders")
     
@@ -8,10 +8,11 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 from uuid import UUID
 
-from sqlmodel import SQLModel, Field, Relationship, Column, JSON, UniqueConstraint
+from sqlmodel import SQLModel, Field, Relationship, Column, UniqueConstraint
 from sqlalchemy import ForeignKey
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 
+from app.core.compressed_json import CompressedJSON
 from .base import BaseModel
 
 
@@ -39,8 +40,8 @@ class OrderEventBase(SQLModel):
     )
     
     event_data: Dict[str, Any] = Field(
-        sa_column=Column(JSON),
-        description="Полные данные события в формате JSON"
+        sa_column=Column(CompressedJSON),
+        description="Полные данные события в формате JSON (хранятся сжатыми)"
     )
     
     event_id: Optional[str] = Field(
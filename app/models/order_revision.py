@@ -0,0 +1,50 @@
+"""
+@file: app/models/order_revision.py
+@description: Модель истории версий данных заказа (JSON Patch между версиями и периодические полные снимки)
+@dependencies: sqlmodel, CompressedJSON
+"""
+
+from datetime import datetime
+from typing import Any, Optional
+from uuid import UUID
+
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+from app.core.compressed_json import CompressedJSON
+
+
+class OrderRevision(SQLModel, table=True):
+    """
+    Принятая версия order_data заказа.
+
+    seq совпадает с orders.revision_seq на момент записи версии. Строка
+    с is_keyframe содержит полный документ, остальные - JSON Patch
+    относительно предыдущей версии (см. OrderRevisionService).
+    """
+
+    __tablename__ = "order_revisions"
+
+    token_id: UUID = Field(
+        sa_column=Column(PG_UUID, ForeignKey("user_tokens.id", ondelete="CASCADE"), primary_key=True),
+        description="ID токена пользователя"
+    )
+
+    allegro_order_id: str = Field(primary_key=True, description="ID заказа в системе Allegro")
+
+    seq: int = Field(primary_key=True, description="Номер версии заказа (с 1)")
+
+    revision: Optional[str] = Field(default=None, description="revision заказа в Allegro")
+
+    is_keyframe: bool = Field(default=False, description="data - полный документ, а не патч")
+
+    data: Any = Field(
+        sa_column=Column(CompressedJSON, nullable=False),
+        description="Полный order_data или JSON Patch относительно версии seq - 1"
+    )
+
+    recorded_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        description="Время записи версии"
+    )
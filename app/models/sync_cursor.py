@@ -0,0 +1,42 @@
+"""
+@file: app/models/sync_cursor.py
+@description: Модель курсора инкрементальной синхронизации Events API по токену
+@dependencies: sqlmodel
+"""
+
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+
+class SyncCursor(SQLModel, table=True):
+    """
+    Точка продолжения ленты событий заказов для токена.
+
+    Обновляется в одной транзакции с сохранением страницы событий,
+    поэтому инкрементальная синхронизация находит стартовую точку
+    поиском по первичному ключу, а не сортировкой order_events.
+    """
+
+    __tablename__ = "sync_cursors"
+
+    token_id: UUID = Field(
+        sa_column=Column(PG_UUID, ForeignKey("user_tokens.id", ondelete="CASCADE"), primary_key=True),
+        description="ID токена пользователя"
+    )
+
+    last_event_id: str = Field(description="ID последнего сохраненного события (параметр from Events API)")
+
+    last_occurred_at: Optional[datetime] = Field(
+        default=None,
+        description="Время последнего сохраненного события в Allegro"
+    )
+
+    updated_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        description="Время последнего продвижения курсора"
+    )
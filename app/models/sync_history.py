@@ -5,11 +5,11 @@
 """
 
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, Any
 from uuid import UUID
 from enum import Enum
 
-from sqlmodel import SQLModel, Field, Relationship, Column
+from sqlmodel import SQLModel, Field, Relationship, Column, JSON
 from sqlalchemy import ForeignKey
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 
@@ -75,6 +75,17 @@ class SyncHistoryBase(SQLModel):
         default=None,
         description="Конечная дата для синхронизации"
     )
+    
+    checkpoint: Optional[Dict[str, Any]] = Field(
+        default=None,
+        sa_column=Column(JSON),
+        description="Состояние незавершенной синхронизации (окна/offset, курсор событий, счетчики)"
+    )
+    
+    checkpointed_at: Optional[datetime] = Field(
+        default=None,
+        description="Время последнего сохранения checkpoint"
+    )
 
 
 class SyncHistory(SyncHistoryBase, BaseModel, table=True):
@@ -114,6 +125,8 @@ class SyncHistoryRead(SQLModel):
     error_message: Optional[str] = None
     sync_from_date: Optional[datetime] = None
     sync_to_date: Optional[datetime] = None
+    checkpoint: Optional[Dict[str, Any]] = None
+    checkpointed_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
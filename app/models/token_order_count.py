@@ -0,0 +1,35 @@
+"""
+@file: app/models/token_order_count.py
+@description: Модель кешированного числа заказов токена
+@dependencies: sqlmodel
+"""
+
+from datetime import datetime
+from uuid import UUID
+
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+
+class TokenOrderCount(SQLModel, table=True):
+    """
+    Число заказов токена в таблице orders.
+
+    Увеличивается в одном запросе (или транзакции) с вставкой заказов,
+    поэтому проверка аномалий читает одну строку вместо count(*) по orders.
+    """
+
+    __tablename__ = "token_order_counts"
+
+    token_id: UUID = Field(
+        sa_column=Column(PG_UUID, ForeignKey("user_tokens.id", ondelete="CASCADE"), primary_key=True),
+        description="ID токена пользователя"
+    )
+
+    orders_count: int = Field(default=0, description="Число заказов токена")
+
+    updated_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        description="Время последнего изменения счетчика"
+    )
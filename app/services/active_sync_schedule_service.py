@@ -4,8 +4,9 @@
 @dependencies: ActiveSyncSchedule, sqlmodel
 """
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Iterable
 from uuid import UUID
+from sqlalchemy import func, or_, update
 from sqlmodel import Session, select
 from app.models.active_sync_schedule import ActiveSyncSchedule
 
@@ -53,6 +54,11 @@ class ActiveSyncScheduleService:
             ).order_by(ActiveSyncSchedule.created_at.desc())
         ).all()
 
+    def get_all_active(self) -> List[ActiveSyncSchedule]:
+        return self.db.exec(
+            select(ActiveSyncSchedule).where(ActiveSyncSchedule.status == "active")
+        ).all()
+
     def get_by_token(self, user_id: UUID, token_id: str) -> Optional[ActiveSyncSchedule]:
         return self.db.exec(
             select(ActiveSyncSchedule).where(
@@ -76,4 +82,41 @@ class ActiveSyncScheduleService:
             schedule.last_success_at = datetime.utcnow()
             schedule.updated_at = datetime.utcnow()
             self.db.add(schedule)
-            self.db.commit() 
\ No newline at end of file
+            self.db.commit()
+
+    def get_due(self, now: datetime, limit: int, exclude_token_ids: Iterable[str] = ()) -> List[ActiveSyncSchedule]:
+        """
+        Активные расписания, интервал которых истек к моменту now.
+        
+        Сначала возвращаются самые просроченные (никогда не запускавшиеся - первыми).
+        Строки блокируются FOR UPDATE SKIP LOCKED до commit, поэтому параллельный
+        диспетчер не получит те же расписания.
+        """
+        if limit <= 0:
+            return []
+        due_at = ActiveSyncSchedule.last_run_at + func.make_interval(0, 0, 0, 0, 0, ActiveSyncSchedule.interval_minutes)
+        statement = (
+            select(ActiveSyncSchedule)
+            .where(
+                ActiveSyncSchedule.status == "active",
+                or_(ActiveSyncSchedule.last_run_at.is_(None), due_at <= now)
+            )
+            .order_by(ActiveSyncSchedule.last_run_at.asc().nullsfirst())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        exclude_token_ids = list(exclude_token_ids)
+        if exclude_token_ids:
+            statement = statement.where(ActiveSyncSchedule.token_id.not_in(exclude_token_ids))
+        return self.db.exec(statement).all()
+
+    def mark_run(self, schedule_ids: List[UUID], run_at: datetime) -> None:
+        """Отметка запуска нескольких расписаний одним UPDATE"""
+        if not schedule_ids:
+            return
+        self.db.execute(
+            update(ActiveSyncSchedule)
+            .where(ActiveSyncSchedule.id.in_(schedule_ids))
+            .values(last_run_at=run_at, updated_at=run_at)
+        )
+        self.db.commit()
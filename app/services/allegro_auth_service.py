@@ -1,7 +1,7 @@
 """
 @file: app/services/allegro_auth_service.py
 @description: Сервис для работы с авторизацией Allegro API через Device Code Flow
-@dependencies: aiohttp, requests, base64
+@dependencies: httpx, base64
 """
 
 import base64
@@ -13,6 +13,8 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.settings import settings
 from app.core.logging import get_logger
+from app.core.allegro_client import allegro_client
+from app.core.token_cache import access_token_cache
 from app.models.user_token import UserToken, UserTokenCreate
 from app.services.token_service import TokenService
 from app.exceptions import ValidationError, InternalServerErrorHTTPException
@@ -70,36 +72,36 @@ class AllegroAuthService:
             logger.debug(f"[DEBUG] Sending POST request to {self.auth_url}")
             logger.debug(f"[DEBUG] Request data: {data}")
             
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                response = await client.post(
-                    self.auth_url,
-                    headers=headers,
-                    data=data
-                )
+            client = allegro_client.async_client()
+            response = await client.post(
+                self.auth_url,
+                headers=headers,
+                data=data
+            )
+            
+            logger.debug(f"[DEBUG] Response status: {response.status_code}")
+            
+            if response.status_code == 200:
+                auth_data = response.json()
+                logger.debug(f"[DEBUG] Response data: {auth_data}")
                 
-                logger.debug(f"[DEBUG] Response status: {response.status_code}")
+                # Добавляем дополнительные поля для удобства
+                auth_data["user_id"] = user_id
+                auth_data["account_name"] = account_name
                 
-                if response.status_code == 200:
-                    auth_data = response.json()
-                    logger.debug(f"[DEBUG] Response data: {auth_data}")
-                    
-                    # Добавляем дополнительные поля для удобства
-                    auth_data["user_id"] = user_id
-                    auth_data["account_name"] = account_name
-                    
-                    # Добавляем время истечения в ISO формате для Celery
-                    expires_at = datetime.utcnow() + timedelta(seconds=auth_data.get("expires_in", 600))
-                    auth_data["expires_at_iso"] = expires_at.isoformat()
+                # Добавляем время истечения в ISO формате для Celery
+                expires_at = datetime.utcnow() + timedelta(seconds=auth_data.get("expires_in", 600))
+                auth_data["expires_at_iso"] = expires_at.isoformat()
+                
+                logger.info(f"Device Code Flow initialized successfully for user: {user_id}")
+                logger.debug(f"[DEBUG] initialize_device_flow completed successfully")
+                return auth_data
+            else:
+                error_text = response.text
+                logger.error(f"Failed to initialize Device Code Flow: {response.status_code} - {error_text}")
+                logger.debug(f"[DEBUG] Error response text: {error_text}")
+                raise ValidationError(f"Failed to initialize authorization: {response.status_code}")
                     
-                    logger.info(f"Device Code Flow initialized successfully for user: {user_id}")
-                    logger.debug(f"[DEBUG] initialize_device_flow completed successfully")
-                    return auth_data
-                else:
-                    error_text = response.text
-                    logger.error(f"Failed to initialize Device Code Flow: {response.status_code} - {error_text}")
-                    logger.debug(f"[DEBUG] Error response text: {error_text}")
-                    raise ValidationError(f"Failed to initialize authorization: {response.status_code}")
-                        
         except httpx.RequestError as e:
             logger.error(f"Network error during Device Code Flow initialization: {str(e)}")
             logger.debug(f"[DEBUG] RequestError: {type(e)} - {str(e)}")
@@ -150,69 +152,69 @@ class AllegroAuthService:
             logger.debug(f"[DEBUG] Sending POST request to {self.token_url}")
             logger.debug(f"[DEBUG] Request data: {data}")
             
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                response = await client.post(
-                    self.token_url,
-                    headers=headers,
-                    data=data
-                )
+            client = allegro_client.async_client()
+            response = await client.post(
+                self.token_url,
+                headers=headers,
+                data=data
+            )
+            
+            logger.debug(f"[DEBUG] Response status: {response.status_code}")
+            
+            if response.status_code == 400:
+                error_data = response.json()
+                error = error_data.get("error")
+                logger.debug(f"[DEBUG] Error response: {error_data}")
                 
-                logger.debug(f"[DEBUG] Response status: {response.status_code}")
+                if error == "authorization_pending":
+                    logger.info(f"Authorization still pending for user: {user_id}")
+                    logger.debug(f"[DEBUG] check_auth_status completed: pending")
+                    return {"status": "pending"}
+                elif error == "slow_down":
+                    logger.info(f"Rate limited, slowing down for user: {user_id}")
+                    logger.debug(f"[DEBUG] check_auth_status completed: rate limited")
+                    return {"status": "pending", "message": "Rate limited, please wait"}
+                elif error == "access_denied":
+                    logger.warning(f"Authorization denied for user: {user_id}")
+                    logger.debug(f"[DEBUG] check_auth_status completed: access denied")
+                    return {"status": "failed", "message": "Authorization denied by user"}
+                elif error == "expired_token":
+                    logger.warning(f"Device code expired for user: {user_id}")
+                    logger.debug(f"[DEBUG] check_auth_status completed: expired token")
+                    return {"status": "failed", "message": "Device code expired"}
+                else:
+                    logger.error(f"Unknown authorization error for user {user_id}: {error}")
+                    logger.debug(f"[DEBUG] check_auth_status completed: unknown error")
+                    return {"status": "failed", "message": f"Authorization error: {error}"}
+            
+            elif response.status_code == 200:
+                token_data = response.json()
+                logger.debug(f"[DEBUG] Token response received, creating token in database")
                 
-                if response.status_code == 400:
-                    error_data = response.json()
-                    error = error_data.get("error")
-                    logger.debug(f"[DEBUG] Error response: {error_data}")
-                    
-                    if error == "authorization_pending":
-                        logger.info(f"Authorization still pending for user: {user_id}")
-                        logger.debug(f"[DEBUG] check_auth_status completed: pending")
-                        return {"status": "pending"}
-                    elif error == "slow_down":
-                        logger.info(f"Rate limited, slowing down for user: {user_id}")
-                        logger.debug(f"[DEBUG] check_auth_status completed: rate limited")
-                        return {"status": "pending", "message": "Rate limited, please wait"}
-                    elif error == "access_denied":
-                        logger.warning(f"Authorization denied for user: {user_id}")
-                        logger.debug(f"[DEBUG] check_auth_status completed: access denied")
-                        return {"status": "failed", "message": "Authorization denied by user"}
-                    elif error == "expired_token":
-                        logger.warning(f"Device code expired for user: {user_id}")
-                        logger.debug(f"[DEBUG] check_auth_status completed: expired token")
-                        return {"status": "failed", "message": "Device code expired"}
-                    else:
-                        logger.error(f"Unknown authorization error for user {user_id}: {error}")
-                        logger.debug(f"[DEBUG] check_auth_status completed: unknown error")
-                        return {"status": "failed", "message": f"Authorization error: {error}"}
+                # Создаем токен в базе данных
+                expires_in = token_data.get("expires_in", 3600)  # По умолчанию 1 час
+                expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
                 
-                elif response.status_code == 200:
-                    token_data = response.json()
-                    logger.debug(f"[DEBUG] Token response received, creating token in database")
-                    
-                    # Создаем токен в базе данных
-                    expires_in = token_data.get("expires_in", 3600)  # По умолчанию 1 час
-                    expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
-                    
-                    logger.debug(f"[DEBUG] Token expires_in: {expires_in}, expires_at: {expires_at}")
-                    
-                    await self.token_service.create_token(
-                        user_id=user_id,
-                        account_name=account_name,
-                        allegro_token=token_data["access_token"],
-                        refresh_token=token_data["refresh_token"],
-                        expires_at=expires_at
-                    )
-                    
-                    logger.info(f"Authorization completed and token saved for user: {user_id}")
-                    logger.debug(f"[DEBUG] check_auth_status completed: authorization successful")
-                    return {"status": "completed"}
+                logger.debug(f"[DEBUG] Token expires_in: {expires_in}, expires_at: {expires_at}")
                 
-                else:
-                    error_text = response.text
-                    logger.error(f"Unexpected response during auth check: {response.status_code} - {error_text}")
-                    logger.debug(f"[DEBUG] Unexpected response: {error_text}")
-                    return {"status": "failed", "message": f"Unexpected error: {response.status_code}"}
-                        
+                await self.token_service.create_token(
+                    user_id=user_id,
+                    account_name=account_name,
+                    allegro_token=token_data["access_token"],
+                    refresh_token=token_data["refresh_token"],
+                    expires_at=expires_at
+                )
+                
+                logger.info(f"Authorization completed and token saved for user: {user_id}")
+                logger.debug(f"[DEBUG] check_auth_status completed: authorization successful")
+                return {"status": "completed"}
+            
+            else:
+                error_text = response.text
+                logger.error(f"Unexpected response during auth check: {response.status_code} - {error_text}")
+                logger.debug(f"[DEBUG] Unexpected response: {error_text}")
+                return {"status": "failed", "message": f"Unexpected error: {response.status_code}"}
+                    
         except httpx.RequestError as e:
             logger.error(f"Network error during auth status check: {str(e)}")
             logger.debug(f"[DEBUG] RequestError: {type(e)} - {str(e)}")
@@ -251,35 +253,35 @@ class AllegroAuthService:
                 'refresh_token': token.refresh_token
             }
             
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                response = await client.post(
-                    self.token_url,
-                    headers=headers,
-                    data=data
-                )
+            client = allegro_client.async_client()
+            response = await client.post(
+                self.token_url,
+                headers=headers,
+                data=data
+            )
+            
+            if response.status_code == 200:
+                token_data = response.json()
                 
-                if response.status_code == 200:
-                    token_data = response.json()
-                    
-                    # Обновляем токен в базе данных
-                    expires_in = token_data.get("expires_in", 3600)
-                    expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
-                    
-                    update_data = {
-                        "allegro_token": token_data["access_token"],
-                        "refresh_token": token_data["refresh_token"],
-                        "expires_at": expires_at
-                    }
-                    
-                    updated_token = await self.token_service.update_token(token.id, update_data)
-                    logger.info(f"Token refreshed successfully for user: {token.user_id}")
-                    return updated_token
+                # Обновляем токен в базе данных
+                expires_in = token_data.get("expires_in", 3600)
+                expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
                 
-                else:
-                    error_text = response.text
-                    logger.error(f"Failed to refresh token: {response.status_code} - {error_text}")
-                    raise ValidationError(f"Failed to refresh token: {response.status_code}")
-                        
+                update_data = {
+                    "allegro_token": token_data["access_token"],
+                    "refresh_token": token_data["refresh_token"],
+                    "expires_at": expires_at
+                }
+                
+                updated_token = await self.token_service.update_token(token.id, update_data)
+                logger.info(f"Token refreshed successfully for user: {token.user_id}")
+                return updated_token
+            
+            else:
+                error_text = response.text
+                logger.error(f"Failed to refresh token: {response.status_code} - {error_text}")
+                raise ValidationError(f"Failed to refresh token: {response.status_code}")
+                    
         except httpx.RequestError as e:
             logger.error(f"Network error during token refresh: {str(e)}")
             raise ValidationError(f"Network error: {str(e)}")
@@ -303,22 +305,22 @@ class AllegroAuthService:
                 'Accept': 'application/vnd.allegro.public.v1+json'
             }
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    f'{self.api_url}/me',
-                    headers=headers
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"Token is valid for user: {token.user_id}")
-                    return True
-                elif response.status_code == 401:
-                    logger.info(f"Token is expired for user: {token.user_id}")
-                    return False
-                else:
-                    logger.warning(f"Unexpected response during token validation: {response.status_code}")
-                    return False
-                        
+            client = allegro_client.async_client()
+            response = await client.get(
+                f'{self.api_url}/me',
+                headers=headers
+            )
+            
+            if response.status_code == 200:
+                logger.info(f"Token is valid for user: {token.user_id}")
+                return True
+            elif response.status_code == 401:
+                logger.info(f"Token is expired for user: {token.user_id}")
+                return False
+            else:
+                logger.warning(f"Unexpected response during token validation: {response.status_code}")
+                return False
+                    
         except Exception as e:
             logger.error(f"Error during token validation: {str(e)}")
             return False
@@ -405,7 +407,6 @@ class AllegroAuthService:
         Raises:
             ValidationError: Если не удалось инициализировать авторизацию
         """
-        import requests
         try:
             logger.info(f"[SYNC] Initializing Device Code Flow for user: {user_id}")
             auth_str = f'{self.allegro_settings.client_id}:{self.allegro_settings.client_secret}'
@@ -417,11 +418,11 @@ class AllegroAuthService:
             data = {
                 'client_id': self.allegro_settings.client_id
             }
-            response = requests.post(
+            client = allegro_client.sync_client
+            response = client.post(
                 self.auth_url,
                 headers=headers,
-                data=data,
-                timeout=20.0
+                data=data
             )
             if response.status_code == 200:
                 auth_data = response.json()
@@ -434,9 +435,11 @@ class AllegroAuthService:
                 error_text = response.text
                 logger.error(f"[SYNC] Failed to initialize Device Code Flow: {response.status_code} - {error_text}")
                 raise ValidationError(f"Failed to initialize authorization: {response.status_code}")
-        except requests.RequestException as e:
+        except httpx.RequestError as e:
             logger.error(f"[SYNC] Network error during Device Code Flow initialization: {str(e)}")
             raise ValidationError(f"Network error: {str(e)}")
+        except ValidationError:
+            raise
         except Exception as e:
             logger.error(f"[SYNC] Unexpected error during Device Code Flow initialization: {str(e)}")
             raise InternalServerErrorHTTPException("Failed to initialize authorization")
@@ -453,7 +456,6 @@ class AllegroAuthService:
         Raises:
             ValidationError: Если произошла ошибка при проверке
         """
-        import requests
         try:
             logger.info(f"[SYNC] Checking auth status for user: {user_id}")
             auth_str = f'{self.allegro_settings.client_id}:{self.allegro_settings.client_secret}'
@@ -466,11 +468,11 @@ class AllegroAuthService:
                 'grant_type': 'urn:ietf:params:oauth:grant-type:device_code',
                 'device_code': device_code
             }
-            response = requests.post(
+            client = allegro_client.sync_client
+            response = client.post(
                 self.token_url,
                 headers=headers,
-                data=data,
-                timeout=20.0
+                data=data
             )
             if response.status_code == 400:
                 error_data = response.json()
@@ -508,7 +510,7 @@ class AllegroAuthService:
                 error_text = response.text
                 logger.error(f"[SYNC] Unexpected response during auth check: {response.status_code} - {error_text}")
                 return {"status": "failed", "message": f"Unexpected error: {response.status_code}"}
-        except requests.RequestException as e:
+        except httpx.RequestError as e:
             logger.error(f"[SYNC] Network error during auth status check: {str(e)}")
             raise ValidationError(f"Network error: {str(e)}")
         except Exception as e:
@@ -525,7 +527,6 @@ class AllegroAuthService:
         Raises:
             ValidationError: Если не удалось обновить токен
         """
-        import requests
         try:
             logger.info(f"[SYNC] Refreshing token for user: {token.user_id}")
             auth_str = f'{self.allegro_settings.client_id}:{self.allegro_settings.client_secret}'
@@ -538,11 +539,11 @@ class AllegroAuthService:
                 'grant_type': 'refresh_token',
                 'refresh_token': token.refresh_token
             }
-            response = requests.post(
+            client = allegro_client.sync_client
+            response = client.post(
                 self.token_url,
                 headers=headers,
-                data=data,
-                timeout=20.0
+                data=data
             )
             if response.status_code == 200:
                 token_data = response.json()
@@ -560,9 +561,11 @@ class AllegroAuthService:
                 error_text = response.text
                 logger.error(f"[SYNC] Failed to refresh token: {response.status_code} - {error_text}")
                 raise ValidationError(f"Failed to refresh token: {response.status_code}")
-        except requests.RequestException as e:
+        except httpx.RequestError as e:
             logger.error(f"[SYNC] Network error during token refresh: {str(e)}")
             raise ValidationError(f"Network error: {str(e)}")
+        except ValidationError:
+            raise
         except Exception as e:
             logger.error(f"[SYNC] Unexpected error during token refresh: {str(e)}")
             raise InternalServerErrorHTTPException("Failed to refresh token")
@@ -575,16 +578,15 @@ class AllegroAuthService:
         Returns:
             bool: True если токен действителен, False в противном случае
         """
-        import requests
         try:
             headers = {
                 'Authorization': f'Bearer {token.allegro_token}',
                 'Accept': 'application/vnd.allegro.public.v1+json'
             }
-            response = requests.get(
+            client = allegro_client.sync_client
+            response = client.get(
                 f'{self.api_url}/me',
-                headers=headers,
-                timeout=10.0
+                headers=headers
             )
             if response.status_code == 200:
                 logger.info(f"[SYNC] Token is valid for user: {token.user_id}")
@@ -617,6 +619,11 @@ class AllegroAuthService:
             from datetime import datetime
             from uuid import UUID
             
+            # Повторные вызовы обслуживаются кешем процесса без обращения к БД
+            access_token = access_token_cache.get(token_id, user_id)
+            if access_token is not None:
+                return access_token
+            
             # Создаем синхронную сессию БД
             from app.core.database import get_sync_db_session_direct
             sync_session = get_sync_db_session_direct()
@@ -638,6 +645,7 @@ class AllegroAuthService:
                     return None
                     
                 logger.info(f"✅ Токен {token_id} действителен для пользователя: {user_id}")
+                access_token_cache.put(token_id, user_id, token.allegro_token, token.expires_at)
                 return token.allegro_token
                 
             except ValueError:
@@ -1,15 +1,20 @@
 """
 @file: data_monitoring_service.py  
 @description: Сервис мониторинга качества данных и раннего выявления проблем
-@dependencies: OrderProtectionService, logging, metrics
+@dependencies: OrderProtectionService, DataHealthCounter, logging, metrics
 """
 
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Any, Iterable, Optional, Tuple
 from dataclasses import dataclass
+from uuid import UUID
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
 from sqlmodel import Session, select, func
 
+from app.models.data_health_counter import DataHealthCounter
+from app.models.data_quality_daily import DataQualityDaily
 from app.models.order import Order
 from app.models.order_event import OrderEvent
 
@@ -43,6 +48,30 @@ class DataMonitoringService:
     CRITICAL_REGRESSION_RATIO = 0.15    # 15% заказов с деградацией
     MAX_SYNC_GAP_HOURS = 2             # Максимальный перерыв в синхронизации
     
+    # Обязательные поля данных события
+    REQUIRED_EVENT_FIELDS = ["id", "status", "buyer", "lineItems"]
+    REQUIRED_BUYER_FIELDS = ["email", "firstName"]
+    
+    # Счетчики качества данных (data_health_counters)
+    HEALTH_BUCKET_MINUTES = 5           # Размер интервала счетчиков
+    HEALTH_COUNTERS_RETENTION_HOURS = 25  # Срок хранения интервалов (окно отчета 24 часа + запас)
+    
+    # Биты issue_mask: набор отсутствующих полей события, набор пустых полей
+    # покупателя, отсутствие товаров (каждый вид проблемы - отдельный бит)
+    BUYER_ISSUE_BIT_OFFSET = 2 ** len(REQUIRED_EVENT_FIELDS) - 1
+    NO_LINE_ITEMS_ISSUE_BIT = BUYER_ISSUE_BIT_OFFSET + 2 ** len(REQUIRED_BUYER_FIELDS) - 1
+    
+    # Виды проблем дневной сводки data_quality_daily
+    DAILY_ALL = "all"
+    DAILY_PROBLEMATIC = "problematic"
+    DAILY_MISSING_DATA = "missing_data"
+    DAILY_REGRESSION = "regression"
+    DAILY_MISSING_FIELD = "missing_field:"
+    DAILY_EMPTY_BUYER_FIELD = "empty_buyer_field:"
+    
+    # Тип событий, по которым строится отчет о качестве данных
+    REPORT_EVENT_TYPE = "ORDER_SYNC"
+    
     def __init__(self, db: Session):
         self.db = db
         
@@ -82,6 +111,50 @@ class DataMonitoringService:
                 orders_with_issues += 1
                 critical_issues.extend(issues["critical_issues"])
                 
+        return self._build_health_metrics(
+            total_orders, orders_with_issues, regression_count, missing_data_count, critical_issues
+        )
+        
+    def check_token_health(self, token_id: Optional[str] = None, time_window_hours: int = 1) -> DataHealthMetrics:
+        """
+        Проверка здоровья данных по счетчикам data_health_counters.
+        
+        Те же метрики, что и check_data_health, но без чтения событий:
+        суммируются счетчики интервалов за период (окно округляется вниз
+        до HEALTH_BUCKET_MINUTES).
+        
+        Args:
+            token_id: ID токена (None - все токены)
+            time_window_hours: Период для анализа в часах
+            
+        Returns:
+            DataHealthMetrics: Метрики состояния данных
+        """
+        
+        cutoff_time = self._bucket_start(datetime.utcnow() - timedelta(hours=time_window_hours))
+        
+        query = select(
+            func.coalesce(func.sum(DataHealthCounter.total_events), 0),
+            func.coalesce(func.sum(DataHealthCounter.issues_count), 0),
+            func.coalesce(func.sum(DataHealthCounter.regression_count), 0),
+            func.coalesce(func.sum(DataHealthCounter.missing_data_count), 0),
+            func.coalesce(func.bit_or(DataHealthCounter.issue_mask), 0)
+        ).where(DataHealthCounter.bucket_start >= cutoff_time)
+        
+        if token_id:
+            query = query.where(DataHealthCounter.token_id == UUID(str(token_id)))
+            
+        total, with_issues, regressions, missing, issue_mask = self.db.exec(query).one()
+        
+        return self._build_health_metrics(
+            int(total), int(with_issues), int(regressions), int(missing),
+            self._issues_from_mask(int(issue_mask))
+        )
+        
+    def _build_health_metrics(self, total_orders: int, orders_with_issues: int, regression_count: int,
+                              missing_data_count: int, critical_issues: List[str]) -> DataHealthMetrics:
+        """Расчет метрик по счетчикам, логирование и алерты"""
+        
         # Расчет метрик
         missing_data_ratio = missing_data_count / total_orders if total_orders > 0 else 0
         regression_ratio = regression_count / total_orders if total_orders > 0 else 0
@@ -115,16 +188,18 @@ class DataMonitoringService:
     def _analyze_event_data_quality(self, event: OrderEvent) -> Dict[str, Any]:
         """Анализ качества данных в конкретном событии"""
         
-        event_data = event.event_data or {}
+        return self._analyze_data_quality(event.event_data or {})
+        
+    def _analyze_data_quality(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Анализ качества данных события (event_data записи order_events)"""
         
         # Проверка на отсутствующие данные
-        required_fields = ["id", "status", "buyer", "lineItems"]
-        missing_fields = [field for field in required_fields if not event_data.get(field)]
+        missing_fields = [field for field in self.REQUIRED_EVENT_FIELDS if not event_data.get(field)]
         
         # Проверка на пустые критические поля
         buyer_data = event_data.get("buyer", {})
         empty_buyer_fields = []
-        for field in ["email", "firstName"]:
+        for field in self.REQUIRED_BUYER_FIELDS:
             if not buyer_data.get(field):
                 empty_buyer_fields.append(field)
                 
@@ -150,6 +225,155 @@ class DataMonitoringService:
             "empty_buyer_fields": empty_buyer_fields
         }
         
+    def record_events(self, token_id: str, events: Iterable[Tuple[datetime, str, Dict[str, Any]]]) -> None:
+        """
+        Учет сохраненных событий в счетчиках качества данных токена.
+        
+        Обновляются интервалы data_health_counters (проверка перед синхронизацией)
+        и дневная сводка data_quality_daily (отчет о качестве). Выполняется
+        в транзакции вызывающего кода (без commit), чтобы счетчики фиксировались
+        вместе с самими событиями.
+        
+        Args:
+            token_id: ID токена
+            events: Тройки (время события, тип события, event_data) только что сохраненных событий
+        """
+        
+        buckets: Dict[datetime, Dict[str, int]] = {}
+        daily: Dict[Tuple[date, str, str], int] = {}
+        
+        for occurred_at, event_type, event_data in events:
+            issues = self._analyze_data_quality(event_data or {})
+            bucket_start = self._bucket_start(occurred_at)
+            bucket = buckets.setdefault(bucket_start, {
+                "total_events": 0,
+                "missing_data_count": 0,
+                "regression_count": 0,
+                "issues_count": 0,
+                "issue_mask": 0
+            })
+            bucket["total_events"] += 1
+            bucket["missing_data_count"] += int(issues["has_missing_data"])
+            bucket["regression_count"] += int(issues["has_regression"])
+            bucket["issues_count"] += int(bool(issues["critical_issues"]))
+            bucket["issue_mask"] |= self._issue_mask(issues)
+            
+            for issue in self._daily_issues(issues):
+                key = (bucket_start.date(), event_type, issue)
+                daily[key] = daily.get(key, 0) + 1
+            
+        if not buckets:
+            return
+            
+        now = datetime.utcnow()
+        token_uuid = UUID(str(token_id))
+        
+        table = DataHealthCounter.__table__
+        stmt = insert(table).values([
+            {"token_id": token_uuid, "bucket_start": bucket_start, "updated_at": now, **counters}
+            for bucket_start, counters in buckets.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.token_id, table.c.bucket_start],
+            set_={
+                "total_events": table.c.total_events + stmt.excluded.total_events,
+                "missing_data_count": table.c.missing_data_count + stmt.excluded.missing_data_count,
+                "regression_count": table.c.regression_count + stmt.excluded.regression_count,
+                "issues_count": table.c.issues_count + stmt.excluded.issues_count,
+                "issue_mask": table.c.issue_mask.op("|")(stmt.excluded.issue_mask),
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        self.db.exec(stmt)
+        
+        table = DataQualityDaily.__table__
+        stmt = insert(table).values([
+            {
+                "token_id": token_uuid,
+                "day": day,
+                "event_type": event_type,
+                "issue": issue,
+                "events_count": events_count,
+                "updated_at": now
+            }
+            for (day, event_type, issue), events_count in daily.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.token_id, table.c.day, table.c.event_type, table.c.issue],
+            set_={
+                "events_count": table.c.events_count + stmt.excluded.events_count,
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        self.db.exec(stmt)
+        
+    def _daily_issues(self, issues: Dict[str, Any]) -> List[str]:
+        """Виды проблем события для дневной сводки (включая общий счетчик all)"""
+        
+        daily_issues = [self.DAILY_ALL]
+        if issues["critical_issues"]:
+            daily_issues.append(self.DAILY_PROBLEMATIC)
+        if issues["has_missing_data"]:
+            daily_issues.append(self.DAILY_MISSING_DATA)
+        if issues["has_regression"]:
+            daily_issues.append(self.DAILY_REGRESSION)
+        daily_issues.extend(self.DAILY_MISSING_FIELD + field for field in issues["missing_fields"])
+        daily_issues.extend(self.DAILY_EMPTY_BUYER_FIELD + field for field in issues["empty_buyer_fields"])
+        return daily_issues
+        
+    def purge_health_counters(self) -> int:
+        """Удаление интервалов счетчиков старше HEALTH_COUNTERS_RETENTION_HOURS"""
+        
+        cutoff_time = datetime.utcnow() - timedelta(hours=self.HEALTH_COUNTERS_RETENTION_HOURS)
+        result = self.db.exec(delete(DataHealthCounter).where(DataHealthCounter.bucket_start < cutoff_time))
+        self.db.commit()
+        return result.rowcount or 0
+        
+    def _bucket_start(self, moment: datetime) -> datetime:
+        """Начало интервала счетчиков (UTC без часового пояса)"""
+        
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        return moment.replace(
+            minute=moment.minute - moment.minute % self.HEALTH_BUCKET_MINUTES,
+            second=0,
+            microsecond=0
+        )
+        
+    @staticmethod
+    def _fields_mask(fields: List[str], all_fields: List[str]) -> int:
+        return sum(1 << all_fields.index(field) for field in fields)
+        
+    def _issue_mask(self, issues: Dict[str, Any]) -> int:
+        """Битовая маска видов критических проблем события (см. _issues_from_mask)"""
+        
+        mask = 0
+        if issues["missing_fields"]:
+            mask |= 1 << (self._fields_mask(issues["missing_fields"], self.REQUIRED_EVENT_FIELDS) - 1)
+        if issues["empty_buyer_fields"]:
+            buyer_mask = self._fields_mask(issues["empty_buyer_fields"], self.REQUIRED_BUYER_FIELDS)
+            mask |= 1 << (self.BUYER_ISSUE_BIT_OFFSET + buyer_mask - 1)
+        if issues["has_regression"]:
+            mask |= 1 << self.NO_LINE_ITEMS_ISSUE_BIT
+        return mask
+        
+    def _issues_from_mask(self, mask: int) -> List[str]:
+        """Тексты критических проблем по маске (как в _analyze_data_quality)"""
+        
+        def fields_for(fields_mask: int, all_fields: List[str]) -> List[str]:
+            return [field for index, field in enumerate(all_fields) if fields_mask >> index & 1]
+            
+        critical_issues = []
+        for fields_mask in range(1, self.BUYER_ISSUE_BIT_OFFSET + 1):
+            if mask >> (fields_mask - 1) & 1:
+                critical_issues.append(f"Отсутствуют поля: {fields_for(fields_mask, self.REQUIRED_EVENT_FIELDS)}")
+        for fields_mask in range(1, self.NO_LINE_ITEMS_ISSUE_BIT - self.BUYER_ISSUE_BIT_OFFSET + 1):
+            if mask >> (self.BUYER_ISSUE_BIT_OFFSET + fields_mask - 1) & 1:
+                critical_issues.append(f"Пустые поля покупателя: {fields_for(fields_mask, self.REQUIRED_BUYER_FIELDS)}")
+        if mask >> self.NO_LINE_ITEMS_ISSUE_BIT & 1:
+            critical_issues.append("Отсутствуют товары в заказе")
+        return critical_issues
+        
     def _calculate_anomaly_score(self, missing_ratio: float, 
                                 regression_ratio: float, total_orders: int) -> float:
         """
@@ -257,17 +481,21 @@ class DataMonitoringService:
             logger.critical(alert)
             # Здесь можно добавить отправку в Slack, email, SMS и т.д.
             
-    def should_pause_sync(self) -> bool:
+    def should_pause_sync(self, token_id: Optional[str] = None) -> bool:
         """
         Определяет, нужно ли приостановить синхронизацию из-за проблем с данными.
         
         Circuit Breaker Pattern для защиты от массовой порчи данных.
+        Метрики читаются из счетчиков data_health_counters (check_token_health).
+        
+        Args:
+            token_id: ID синхронизируемого токена (None - все токены)
         
         Returns:
             bool: True если синхронизацию нужно остановить
         """
         
-        metrics = self.check_data_health(time_window_hours=1)  # Проверяем последний час
+        metrics = self.check_token_health(token_id, time_window_hours=1)  # Проверяем последний час
         
         # Критерии для остановки синхронизации
         should_pause = (
@@ -278,7 +506,7 @@ class DataMonitoringService:
         
         if should_pause:
             logger.critical(
-                f"🛑 ОСТАНОВКА СИНХРОНИЗАЦИИ! "
+                f"🛑 ОСТАНОВКА СИНХРОНИЗАЦИИ{f' токена {token_id}' if token_id else ''}! "
                 f"Критические проблемы с данными: "
                 f"anomaly_score={metrics.anomaly_score:.2f}, "
                 f"missing_data_ratio={metrics.missing_data_ratio:.1%}"
@@ -286,87 +514,103 @@ class DataMonitoringService:
             
         return should_pause
         
-    def generate_data_quality_report(self, days: int = 7) -> Dict[str, Any]:
+    def generate_data_quality_report(self, days: int = 7, token_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Генерация подробного отчета о качестве данных за период.
         
+        Строится одной группировкой дневной сводки data_quality_daily
+        по дню и виду проблемы, без чтения событий.
+        
         Args:
-            days: Количество дней для анализа
+            days: Количество дней для анализа (включая текущий)
+            token_id: ID токена (None - все токены)
             
         Returns:
             Dict: Подробный отчет с метриками и рекомендациями
         """
         
-        cutoff_time = datetime.utcnow() - timedelta(days=days)
+        today = datetime.utcnow().date()
+        start_day = today - timedelta(days=days - 1)
+        
+        query = (
+            select(DataQualityDaily.day, DataQualityDaily.issue, func.sum(DataQualityDaily.events_count))
+            .where(DataQualityDaily.day >= start_day)
+            .where(DataQualityDaily.event_type == self.REPORT_EVENT_TYPE)
+            .group_by(DataQualityDaily.day, DataQualityDaily.issue)
+        )
+        if token_id:
+            query = query.where(DataQualityDaily.token_id == UUID(str(token_id)))
+            
+        # Счетчики по дням: {день: {вид проблемы: число событий}}
+        counts_by_day: Dict[date, Dict[str, int]] = {}
+        for day, issue, events_count in self.db.exec(query).all():
+            counts_by_day.setdefault(day, {})[issue] = int(events_count)
+            
+        # Статистика по дням
+        daily_metrics = [
+            self._analyze_daily_metrics(day_counts, day)
+            for day, day_counts in sorted(counts_by_day.items())
+            if day_counts.get(self.DAILY_ALL)
+        ]
         
-        # Собираем статистику по дням
-        daily_metrics = []
-        for day in range(days):
-            day_start = cutoff_time + timedelta(days=day)
-            day_end = day_start + timedelta(days=1)
-            
-            day_events = self.db.exec(
-                select(OrderEvent)
-                .where(OrderEvent.occurred_at >= day_start)
-                .where(OrderEvent.occurred_at < day_end)
-                .where(OrderEvent.event_type == "ORDER_SYNC")
-            ).all()
-            
-            if day_events:
-                day_metrics = self._analyze_daily_metrics(day_events, day_start.date())
-                daily_metrics.append(day_metrics)
-                
         # Общая статистика
-        total_events = self.db.exec(
-            select(func.count(OrderEvent.id))
-            .where(OrderEvent.occurred_at >= cutoff_time)
-            .where(OrderEvent.event_type == "ORDER_SYNC")
-        ).one()
+        total_events = sum(metrics["total_orders"] for metrics in daily_metrics)
         
         # Топ проблем
-        top_issues = self._get_top_data_issues(cutoff_time)
+        top_issues = self._get_top_data_issues(counts_by_day)
         
         return {
             "period": f"{days} days",
-            "start_date": cutoff_time.date().isoformat(),
-            "end_date": datetime.utcnow().date().isoformat(),
+            "start_date": start_day.isoformat(),
+            "end_date": today.isoformat(),
             "total_sync_events": total_events,
             "daily_metrics": daily_metrics,
             "top_issues": top_issues,
             "recommendations": self._generate_recommendations(daily_metrics, top_issues)
         }
         
-    def _analyze_daily_metrics(self, events: List[OrderEvent], date) -> Dict[str, Any]:
-        """Анализ метрик за один день"""
+    def _analyze_daily_metrics(self, counts: Dict[str, int], day: date) -> Dict[str, Any]:
+        """Метрики за один день по счетчикам дневной сводки"""
         
-        total_orders = len(events)
-        problematic_orders = 0
-        missing_data_orders = 0
+        total_orders = counts.get(self.DAILY_ALL, 0)
+        problematic_orders = counts.get(self.DAILY_PROBLEMATIC, 0)
+        missing_data_orders = counts.get(self.DAILY_MISSING_DATA, 0)
         
-        for event in events:
-            analysis = self._analyze_event_data_quality(event)
-            if analysis["critical_issues"]:
-                problematic_orders += 1
-            if analysis["has_missing_data"]:
-                missing_data_orders += 1
-                
         return {
-            "date": date.isoformat(),
+            "date": day.isoformat(),
             "total_orders": total_orders,
             "problematic_orders": problematic_orders,
             "missing_data_orders": missing_data_orders,
             "health_score": 1.0 - (problematic_orders / total_orders) if total_orders > 0 else 1.0
         }
         
-    def _get_top_data_issues(self, since: datetime) -> List[Dict[str, Any]]:
-        """Получение топа самых частых проблем с данными"""
+    def _get_top_data_issues(self, counts_by_day: Dict[date, Dict[str, int]], limit: int = 5) -> List[Dict[str, Any]]:
+        """Топ самых частых проблем с данными за период"""
         
-        # Заглушка - здесь можно добавить более сложную аналитику
-        return [
-            {"issue": "Missing buyer email", "count": 45, "severity": "medium"},
-            {"issue": "Empty line items", "count": 12, "severity": "high"}, 
-            {"issue": "Missing delivery data", "count": 23, "severity": "low"}
-        ]
+        totals: Dict[str, int] = {}
+        for day_counts in counts_by_day.values():
+            for issue, events_count in day_counts.items():
+                totals[issue] = totals.get(issue, 0) + events_count
+                
+        top_issues = []
+        for issue, events_count in totals.items():
+            if issue.startswith(self.DAILY_MISSING_FIELD):
+                top_issues.append({
+                    "issue": f"Missing field {issue[len(self.DAILY_MISSING_FIELD):]}",
+                    "count": events_count,
+                    "severity": "high"
+                })
+            elif issue.startswith(self.DAILY_EMPTY_BUYER_FIELD):
+                top_issues.append({
+                    "issue": f"Missing buyer {issue[len(self.DAILY_EMPTY_BUYER_FIELD):]}",
+                    "count": events_count,
+                    "severity": "medium"
+                })
+            elif issue == self.DAILY_REGRESSION:
+                top_issues.append({"issue": "Empty line items", "count": events_count, "severity": "high"})
+                
+        top_issues.sort(key=lambda item: item["count"], reverse=True)
+        return top_issues[:limit]
         
     def _generate_recommendations(self, daily_metrics: List[Dict], 
                                  top_issues: List[Dict]) -> List[str]:
@@ -50,6 +50,22 @@ class DeduplicationService:
             Dict: Результат проверки с причиной
         """
         
+        return self.should_process_token_orders(token_id)
+        
+    def should_process_token_orders(self, token_id: UUID) -> Dict[str, Any]:
+        """
+        Проверка, нужно ли обрабатывать заказы токена.
+        
+        Решение не зависит от заказа (см. should_process_order), поэтому
+        для пачки заказов одного токена достаточно одной проверки.
+        
+        Args:
+            token_id: ID токена, который хочет обработать заказы
+            
+        Returns:
+            Dict: Результат проверки с причиной
+        """
+        
         try:
             # Получаем информацию о токене
             token = self.db.exec(
@@ -70,7 +86,7 @@ class DeduplicationService:
             }
                 
         except Exception as e:
-            logger.error(f"❌ Ошибка при проверке заказа {allegro_order_id}: {e}")
+            logger.error(f"❌ Ошибка при проверке заказов токена {token_id}: {e}")
             return {
                 "should_process": False,
                 "reason": f"Ошибка проверки: {str(e)}"
@@ -0,0 +1,253 @@
+"""
+@file: app/services/event_poller_service.py
+@description: Постоянный опрос Events API всех токенов с автосинхронизацией в одном процессе
+@dependencies: asyncio, httpx, allegro_client, OrderSyncService, ActiveSyncScheduleService, token_sync_lock
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+from app.core.allegro_client import allegro_client
+from app.core.database import get_sync_db_session_direct
+from app.core.logging import get_logger
+from app.core.retry_policy import AllegroRetryLater, parse_retry_after
+from app.core.settings import settings
+from app.core.sync_lock import token_sync_lock
+from app.services.active_sync_schedule_service import ActiveSyncScheduleService
+from app.services.data_monitoring_service import DataMonitoringService
+from app.services.order_sync_service import OrderSyncService, SyncPausedException
+
+logger = get_logger(__name__)
+
+EVENTS_URL = "https://api.allegro.pl/order/events"
+
+
+@dataclass
+class TokenPollState:
+    """Состояние опроса ленты событий одного токена"""
+
+    user_id: str
+    token_id: str
+    headers: Optional[Dict[str, str]] = None
+    cursor: Optional[str] = None
+    interval: float = 0.0
+    next_poll_at: float = 0.0
+    in_flight: bool = False
+    paused: bool = False
+
+
+class EventPollerService:
+    """
+    Опрос /order/events всех токенов из active_sync_schedules.
+
+    Один event loop и один пул соединений на все токены. Интервал опроса
+    каждого токена адаптивный: полная страница - следующий опрос сразу,
+    новые события - SYNC_POLLER_MIN_INTERVAL_SECONDS, пустая лента -
+    интервал удваивается до SYNC_POLLER_MAX_INTERVAL_SECONDS.
+
+    Полученные события записываются через OrderSyncService.ingest_events
+    (в потоке, с собственной сессией БД) под блокировкой токена: пока
+    токен синхронизирует задача Celery, опрос его ленты откладывается.
+    Токен с аномалиями в данных (should_pause_sync) не опрашивается до
+    следующего обновления списка токенов, остальные токены работают.
+    """
+
+    def __init__(self):
+        self._states: Dict[str, TokenPollState] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(max(1, settings.sync.poller_concurrency))
+        self._refresh_at = 0.0
+        self._lock_owner = f"event-poller:{os.getpid()}"
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """Цикл опроса до установки stop"""
+
+        logger.info("📡 Опрос Events API запущен")
+
+        while not stop.is_set():
+            now = time.monotonic()
+            if now >= self._refresh_at:
+                await self._refresh_tokens()
+                self._refresh_at = now + settings.sync.poller_tokens_refresh_seconds
+
+            for state in self._due_states(time.monotonic()):
+                state.in_flight = True
+                task = asyncio.create_task(self._poll_token(state))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self._sleep_seconds())
+            except asyncio.TimeoutError:
+                pass
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info("📡 Опрос Events API остановлен")
+
+    def _due_states(self, now: float) -> List[TokenPollState]:
+        return [
+            state for state in self._states.values()
+            if not state.in_flight and not state.paused and state.next_poll_at <= now
+        ]
+
+    def _sleep_seconds(self) -> float:
+        """Пауза до ближайшего опроса или обновления списка токенов (не больше секунды)"""
+
+        wake_at = [self._refresh_at] + [
+            state.next_poll_at for state in self._states.values() if not state.in_flight and not state.paused
+        ]
+        return min(1.0, max(0.05, min(wake_at) - time.monotonic()))
+
+    async def _refresh_tokens(self) -> None:
+        """Обновление списка токенов и проверка состояния данных каждого токена"""
+
+        try:
+            tokens = await asyncio.to_thread(self._load_active_tokens)
+        except Exception as e:
+            logger.error(f"❌ Не удалось обновить список токенов для опроса: {e}")
+            return
+
+        for user_id, token_id, paused in tokens:
+            state = self._states.get(token_id)
+            if state is None:
+                state = self._states[token_id] = TokenPollState(user_id=user_id, token_id=token_id)
+            elif not state.in_flight:
+                # Заголовки и курсор перечитываются вместе со списком: токен мог быть
+                # обновлен, а курсор - сдвинут синхронизацией Celery
+                state.headers = None
+
+            if paused != state.paused:
+                logger.warning(
+                    f"🛑 Опрос событий токена {token_id} приостановлен из-за аномалий в данных" if paused
+                    else f"▶️ Опрос событий токена {token_id} возобновлен"
+                )
+            state.paused = paused
+
+        active_ids = {token_id for _, token_id, _ in tokens}
+        for token_id in list(self._states):
+            if token_id not in active_ids and not self._states[token_id].in_flight:
+                del self._states[token_id]
+
+    @staticmethod
+    def _load_active_tokens() -> List[Tuple[str, str, bool]]:
+        """
+        Returns:
+            List[Tuple]: (user_id, token_id, нужно ли приостановить опрос токена)
+        """
+
+        db = get_sync_db_session_direct()
+        try:
+            schedules = ActiveSyncScheduleService(db).get_all_active()
+            monitoring_service = DataMonitoringService(db)
+            return [
+                (str(schedule.user_id), str(schedule.token_id), monitoring_service.should_pause_sync(str(schedule.token_id)))
+                for schedule in schedules
+            ]
+        finally:
+            db.close()
+
+    async def _poll_token(self, state: TokenPollState) -> None:
+        """Один опрос ленты токена и запись новых событий"""
+
+        try:
+            async with self._semaphore:
+                state.interval = await self._poll_once(state)
+        except AllegroRetryLater as e:
+            logger.warning(f"⏸️ Опрос токена {state.token_id} отложен: {e}")
+            state.interval = max(e.retry_after, settings.sync.poller_min_interval_seconds)
+        except SyncPausedException as e:
+            logger.warning(f"🛑 Токен {state.token_id}: {e}")
+            state.paused = True
+            state.interval = settings.sync.poller_max_interval_seconds
+        except Exception as e:
+            logger.error(f"❌ Ошибка опроса событий токена {state.token_id}: {e}")
+            state.interval = settings.sync.poller_max_interval_seconds
+        finally:
+            state.next_poll_at = time.monotonic() + state.interval
+            state.in_flight = False
+
+    async def _poll_once(self, state: TokenPollState) -> float:
+        """
+        Returns:
+            float: Пауза до следующего опроса токена
+        """
+
+        if state.headers is None or state.cursor is None:
+            # Курсор в БД (sync_cursors) - источник истины: его сдвигают и опрос, и синхронизация Celery
+            start = await asyncio.to_thread(self._load_poll_start, state.user_id, state.token_id)
+            if start is None:
+                return settings.sync.poller_max_interval_seconds
+            state.headers = start["headers"]
+            state.cursor = start["cursor"]
+
+        limit = settings.sync.events_page_limit
+        params = {"limit": limit}
+        if state.cursor:
+            params["from"] = state.cursor
+
+        client = allegro_client.async_client()
+        response = await client.get(EVENTS_URL, headers=state.headers, params=params)
+
+        if response.status_code == 401:
+            state.headers = None
+            return settings.sync.poller_min_interval_seconds
+        if response.status_code == 429:
+            retry_after = parse_retry_after(response)
+            raise AllegroRetryLater(retry_after or settings.sync.poller_max_interval_seconds, "429 Events API")
+        response.raise_for_status()
+
+        events = response.json().get("events", [])
+        if not events:
+            return self._backoff(state.interval)
+
+        ingested = await asyncio.to_thread(self._ingest, state.user_id, state.token_id, events)
+        if not ingested:
+            # Токен синхронизирует задача Celery - она же выгрузит эти события и сдвинет
+            # курсор, поэтому следующий опрос начинается с курсора из БД
+            state.cursor = None
+            return settings.sync.poller_max_interval_seconds
+
+        state.cursor = events[-1].get("id") or state.cursor
+        return 0.0 if len(events) >= limit else settings.sync.poller_min_interval_seconds
+
+    @staticmethod
+    def _backoff(interval: float) -> float:
+        minimum = settings.sync.poller_min_interval_seconds
+        return min(settings.sync.poller_max_interval_seconds, max(minimum, interval * 2))
+
+    @staticmethod
+    def _load_poll_start(user_id: str, token_id: str) -> Optional[Dict[str, Any]]:
+        db = get_sync_db_session_direct()
+        try:
+            return OrderSyncService(db, user_id, token_id).get_event_poll_start()
+        finally:
+            db.close()
+
+    def _ingest(self, user_id: str, token_id: str, events: List[Dict[str, Any]]) -> bool:
+        """
+        Запись страницы событий под блокировкой токена.
+
+        Returns:
+            bool: False, если токен сейчас синхронизирует другой процесс
+        """
+
+        lease = token_sync_lock.acquire(token_id, owner=self._lock_owner)
+        if lease is None:
+            return False
+
+        db = get_sync_db_session_direct()
+        try:
+            result = OrderSyncService(db, user_id, token_id).ingest_events(events)
+            logger.info(
+                f"📡 Токен {token_id}: {len(events)} событий, создано {result['orders_created']}, "
+                f"обновлено {result['orders_updated']}"
+            )
+            return True
+        finally:
+            db.close()
+            lease.release()
@@ -0,0 +1,78 @@
+"""
+@file: failed_order_service.py
+@description: Очередь повторной обработки проблемных заказов (FailedOrderProcessing)
+@dependencies: FailedOrderProcessing, UserToken, sqlmodel
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+from sqlalchemy import and_, func, or_
+from sqlmodel import Session, select
+from app.core.settings import settings
+from app.models.failed_order_processing import FailedOrderProcessing, FailedOrderStatus
+from app.models.user_token import UserToken
+
+class FailedOrderService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _due_condition(now: datetime):
+        """
+        Заказы, готовые к повторной обработке: ожидающие, срок которых наступил,
+        и захваченные воркером, который не завершил обработку за
+        SYNC_FAILED_RETRY_CLAIM_TIMEOUT_SECONDS (воркер остановлен).
+        """
+        stale_before = now - timedelta(seconds=settings.sync.failed_retry_claim_timeout_seconds)
+        return or_(
+            and_(
+                FailedOrderProcessing.status == FailedOrderStatus.PENDING,
+                or_(FailedOrderProcessing.next_retry_at.is_(None), FailedOrderProcessing.next_retry_at <= now)
+            ),
+            and_(
+                FailedOrderProcessing.status == FailedOrderStatus.RETRYING,
+                FailedOrderProcessing.last_retry_at < stale_before
+            )
+        )
+
+    def claim_due(self, limit: int, token_id: Optional[str] = None) -> List[FailedOrderProcessing]:
+        """
+        Захват пачки заказов для повторной обработки.
+        
+        Строки выбираются по priority, next_retry_at с FOR UPDATE SKIP LOCKED
+        и сразу переводятся в RETRYING с commit: параллельные воркеры получают
+        разные пачки, а захваченные строки не выбираются повторно до истечения
+        таймаута захвата.
+        """
+        if limit <= 0:
+            return []
+        now = datetime.utcnow()
+        statement = (
+            select(FailedOrderProcessing)
+            .where(self._due_condition(now))
+            .order_by(FailedOrderProcessing.priority, FailedOrderProcessing.next_retry_at.asc().nullsfirst())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if token_id:
+            statement = statement.where(FailedOrderProcessing.token_id == UUID(str(token_id)))
+        claimed = self.db.exec(statement).all()
+        for failed_order in claimed:
+            failed_order.status = FailedOrderStatus.RETRYING
+            failed_order.last_retry_at = now
+            self.db.add(failed_order)
+        self.db.commit()
+        return claimed
+
+    def count_due(self, limit: int) -> int:
+        """Количество готовых к обработке заказов (не больше limit)"""
+        due = select(FailedOrderProcessing.id).where(self._due_condition(datetime.utcnow())).limit(limit).subquery()
+        return self.db.exec(select(func.count()).select_from(due)).one()
+
+    def get_token_owners(self, token_ids: Iterable[UUID]) -> Dict[str, str]:
+        """Владельцы токенов {token_id: user_id} для получения заголовков Allegro API"""
+        token_ids = list(token_ids)
+        if not token_ids:
+            return {}
+        rows = self.db.exec(select(UserToken.id, UserToken.user_id).where(UserToken.id.in_(token_ids))).all()
+        return {str(token_id): user_id for token_id, user_id in rows}
@@ -1,14 +1,14 @@
 """
 @file: app/services/offer_service.py
 @description: Сервис для работы с офферами Allegro API
-@dependencies: httpx
+@dependencies: allegro_client
 """
 
-import httpx
 from typing import List, Dict, Any
 
 from app.core.settings import settings
 from app.core.logging import get_logger
+from app.core.allegro_client import allegro_client
 
 logger = get_logger(__name__)
 
@@ -39,19 +39,16 @@ class OfferService:
             Список офферов в виде словарей
         """
         logger.info(f"Пользователь {user_id}: запрос офферов по external_id={external_id}")
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/vnd.allegro.public.v1+json"
-        }
+        headers = allegro_client.auth_headers(token)
         params = {"external.id": external_id}
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                f"{cls.API_URL}{cls.SEARCH_OFFERS_PATH}",
-                headers=headers,
-                params=params
-            )
-            response.raise_for_status()
-            data = response.json()
+        client = allegro_client.async_client()
+        response = await client.get(
+            f"{cls.API_URL}{cls.SEARCH_OFFERS_PATH}",
+            headers=headers,
+            params=params
+        )
+        response.raise_for_status()
+        data = response.json()
         offers = data.get("offers", [])
         logger.info(f"Найдено {len(offers)} офферов для external_id={external_id}")
         return offers
@@ -78,8 +75,7 @@ class OfferService:
         """
         logger.info(f"Пользователь {user_id}: обновление запаса оффера {offer_id} -> {new_stock}")
         headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/vnd.allegro.public.v1+json",
+            **allegro_client.auth_headers(token),
             "Content-Type": "application/vnd.allegro.public.v1+json"
         }
         body = {
@@ -87,13 +83,13 @@ class OfferService:
                 {"id": offer_id, "stock": new_stock}
             ]
         }
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.put(
-                f"{cls.API_URL}{cls.EDIT_OFFERS_PATH}",
-                headers=headers,
-                json=body
-            )
-            response.raise_for_status()
-            result = response.json()
+        client = allegro_client.async_client()
+        response = await client.put(
+            f"{cls.API_URL}{cls.EDIT_OFFERS_PATH}",
+            headers=headers,
+            json=body
+        )
+        response.raise_for_status()
+        result = response.json()
         logger.info(f"Оффер {offer_id} обновлен: {result}")
         return result
\ No newline at end of file
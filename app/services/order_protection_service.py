@@ -8,10 +8,15 @@ import logging
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from uuid import UUID
+from sqlalchemy import Boolean, String, cast, column, literal, literal_column, select as sa_select, values
 from sqlmodel import Session, select, func
 
 from app.models.order import Order
 from app.models.order_event import OrderEvent
+from app.models.order_revision import OrderRevision
+from app.models.token_order_count import TokenOrderCount
+from app.services.data_monitoring_service import DataMonitoringService
+from app.services.order_revision_service import OrderRevisionService
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +38,7 @@ class OrderProtectionService:
     def __init__(self, db: Session, token_id: UUID):
         self.db = db
         self.token_id = token_id
+        self.revision_service = OrderRevisionService(db, token_id)
         
     def validate_order_data_quality(self, new_data: Dict[str, Any], 
                                    existing_order: Optional[Order] = None) -> bool:
@@ -242,8 +248,10 @@ class OrderProtectionService:
             return result
         
         try:
-            # 1. Получаем существующий заказ
-            existing_order = self.db.exec(select(Order).where(Order.allegro_order_id == order_id)).first()
+            # 1. Получаем существующий заказ (блокировка до commit - см. _upsert_orders_chunk)
+            existing_order = self.db.exec(
+                select(Order).where(Order.allegro_order_id == order_id).with_for_update()
+            ).first()
             
             # 2. Валидация данных
             if not self.validate_order_data_quality(new_data, existing_order):
@@ -294,6 +302,288 @@ class OrderProtectionService:
             
         return result
         
+    def safe_order_upsert_many(self, orders: List[Dict[str, Any]], chunk_size: int = 500) -> List[Dict[str, Any]]:
+        """
+        Пакетный аналог safe_order_update для больших объемов заказов.
+        
+        Валидация, проверка revision и merge выполняются в памяти с теми же правилами,
+        запись - одним INSERT ... ON CONFLICT (token_id, allegro_order_id) DO UPDATE
+        ... WHERE revision IS DISTINCT FROM excluded.revision и одним commit на чанк.
+        
+        Args:
+            orders: Список словарей с ключами order_id, new_data, allegro_revision, order_date
+                (аргументы safe_order_update)
+            chunk_size: Количество заказов в одном INSERT
+            
+        Returns:
+            List[Dict]: Результаты в формате safe_order_update, по одному на заказ
+        """
+        
+        results = []
+        
+        for start in range(0, len(orders), chunk_size):
+            results.extend(self._upsert_orders_chunk(orders[start:start + chunk_size]))
+            
+        return results
+        
+    def _upsert_orders_chunk(self, orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Валидация, merge и запись одного чанка заказов (см. safe_order_upsert_many)"""
+        
+        from uuid import uuid4
+        from sqlalchemy.dialects.postgresql import insert
+        
+        results = [
+            {"success": False, "action": "none", "message": "", "order_id": order.get("order_id")}
+            for order in orders
+        ]
+        
+        # 1. Получаем существующие заказы чанка одним запросом.
+        # Строки блокируются до commit: revision_seq и базовый документ патча версии
+        # не меняются параллельной записью (повторная обработка, вторая синхронизация).
+        # Порядок блокировки по allegro_order_id исключает взаимоблокировки между чанками.
+        order_ids = {order["order_id"] for order in orders if order.get("order_id")}
+        existing_orders = {}
+        if order_ids:
+            existing_orders = {
+                existing_order.allegro_order_id: existing_order
+                for existing_order in self.db.exec(
+                    select(Order).where(
+                        Order.token_id == self.token_id,
+                        Order.allegro_order_id.in_(order_ids)
+                    )
+                    .order_by(Order.allegro_order_id)
+                    .with_for_update()
+                ).all()
+            }
+            
+        # 2. Валидация, проверка версии и merge в памяти
+        now = datetime.utcnow()
+        rows = {}
+        revisions = {}
+        row_results = {}
+        
+        for order, result in zip(orders, results):
+            order_id = order.get("order_id")
+            new_data = order.get("new_data")
+            allegro_revision = order.get("allegro_revision")
+            
+            if not order_id:
+                result["message"] = f"order_id пустой или None: {order_id}"
+                logger.error(f"❌ {result['message']}")
+                continue
+                
+            existing_order = existing_orders.get(order_id)
+            
+            try:
+                if not self.validate_order_data_quality(new_data, existing_order):
+                    result["message"] = "Данные не прошли валидацию качества"
+                    continue
+            except DataIntegrityError as e:
+                result["action"] = "failed"
+                result["message"] = str(e)
+                continue
+                
+            if existing_order and allegro_revision:
+                existing_revision = existing_order.order_data.get("revision") if existing_order.order_data else None
+                
+                if existing_revision and allegro_revision == existing_revision:
+                    result["action"] = "skipped"
+                    result["message"] = f"Версия {allegro_revision} уже существует в базе"
+                    result["success"] = True
+                    continue
+                    
+            final_data = self._merge_order_data(existing_order, new_data) if existing_order else dict(new_data)
+            if allegro_revision:
+                final_data["revision"] = allegro_revision
+                
+            result["action"] = "updated" if existing_order else "created"
+            
+            # Повтор заказа в чанке: ON CONFLICT не может изменить строку дважды - берем последний
+            if order_id in row_results:
+                superseded = row_results[order_id]
+                superseded["action"] = "skipped"
+                superseded["success"] = True
+                superseded["message"] = "Заменено более поздней версией в той же пачке"
+                
+            revision_seq = (existing_order.revision_seq if existing_order else 0) + 1
+            row_results[order_id] = result
+            revisions[order_id] = self.revision_service.revision_row(
+                order_id, revision_seq, existing_order.order_data if existing_order else None, final_data, now
+            )
+            rows[order_id] = {
+                "id": uuid4(),
+                "created_at": now,
+                "updated_at": now,
+                "token_id": self.token_id,
+                "allegro_order_id": order_id,
+                "order_data": final_data,
+                "order_date": order.get("order_date") or now,
+                "is_deleted": False,
+                "revision_seq": revision_seq
+            }
+            
+        if not rows:
+            return results
+            
+        # 3. Одна запись на чанк (вместе со счетчиком заказов токена и историей версий)
+        try:
+            table = Order.__table__
+            stmt = insert(table).values(list(rows.values()))
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_orders_per_token",
+                set_={
+                    "order_data": stmt.excluded.order_data,
+                    "order_date": stmt.excluded.order_date,
+                    "updated_at": stmt.excluded.updated_at,
+                    # Номер версии от текущей строки: заказ, вставленный параллельно после
+                    # чтения чанка, тоже получает следующий номер (его версия - полный снимок)
+                    "revision_seq": table.c.revision_seq + 1
+                },
+                where=table.c.order_data["revision"].as_string().is_distinct_from(
+                    stmt.excluded.order_data["revision"].as_string()
+                )
+            ).returning(
+                table.c.allegro_order_id,
+                table.c.revision_seq,
+                # xmax = 0 - строка вставлена, а не обновлена через ON CONFLICT
+                literal_column("xmax = 0").label("inserted")
+            )
+            
+            written_orders = stmt.cte("written_orders")
+            stmt = (
+                sa_select(written_orders.c.allegro_order_id)
+                .add_cte(self._order_count_increment(written_orders, now))
+                .add_cte(self._order_revisions_insert(written_orders, list(revisions.values())))
+            )
+            
+            written_order_ids = set(self.db.exec(stmt).scalars().all())
+            self.db.commit()
+            
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"❌ Ошибка пакетной записи {len(rows)} заказов: {e}")
+            for result in row_results.values():
+                result["action"] = "failed"
+                result["message"] = f"Ошибка: {str(e)}"
+            raise
+            
+        for order_id, result in row_results.items():
+            if order_id in written_order_ids:
+                result["success"] = True
+                result["message"] = f"Заказ {result['action']} успешно"
+            else:
+                # Параллельная синхронизация уже записала эту revision
+                result["action"] = "skipped"
+                result["success"] = True
+                result["message"] = "Версия уже существует в базе"
+                
+        logger.info(f"✅ Пакетно записано {len(written_order_ids)} из {len(rows)} заказов")
+        return results
+        
+    def _order_count_increment(self, written_orders, now: datetime):
+        """
+        CTE увеличения token_order_counts на число вставленных строк written_orders.
+        
+        Выполняется в том же запросе, что и запись заказов, поэтому счетчик
+        совпадает с числом строк orders токена без отдельного count(*).
+        """
+        
+        from sqlalchemy.dialects.postgresql import insert
+        
+        table = TokenOrderCount.__table__
+        inserted_count = (
+            sa_select(
+                literal(self.token_id, table.c.token_id.type),
+                func.count(),
+                literal(now, table.c.updated_at.type)
+            )
+            .select_from(written_orders)
+            .where(written_orders.c.inserted)
+            .having(func.count() > 0)
+        )
+        stmt = insert(table).from_select(["token_id", "orders_count", "updated_at"], inserted_count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.token_id],
+            set_={
+                "orders_count": table.c.orders_count + stmt.excluded.orders_count,
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        return stmt.cte("counted_orders")
+        
+    def _order_revisions_insert(self, written_orders, revisions: List[Dict[str, Any]]):
+        """
+        CTE записи версий в order_revisions только для заказов, реально записанных в written_orders.
+        
+        Заказы, пропущенные условием revision IS DISTINCT FROM, версию не получают.
+        Номер версии берется из записанной строки orders (RETURNING revision_seq).
+        """
+        
+        from sqlalchemy.dialects.postgresql import insert
+        
+        table = OrderRevision.__table__
+        candidates = values(
+            column("allegro_order_id", String),
+            column("revision", String),
+            column("is_keyframe", Boolean),
+            column("data", table.c.data.type),
+            name="candidate_revisions"
+        ).data([
+            (revision["allegro_order_id"], revision["revision"], revision["is_keyframe"], revision["data"])
+            for revision in revisions
+        ])
+        recorded_at = revisions[0]["recorded_at"]
+        written_revisions = (
+            sa_select(
+                literal(self.token_id, table.c.token_id.type),
+                candidates.c.allegro_order_id,
+                written_orders.c.revision_seq,
+                candidates.c.revision,
+                candidates.c.is_keyframe,
+                cast(candidates.c.data, table.c.data.type),
+                literal(recorded_at, table.c.recorded_at.type)
+            )
+            .select_from(candidates)
+            .join(written_orders, written_orders.c.allegro_order_id == candidates.c.allegro_order_id)
+        )
+        stmt = insert(table).from_select(
+            ["token_id", "allegro_order_id", "seq", "revision", "is_keyframe", "data", "recorded_at"],
+            written_revisions
+        ).on_conflict_do_nothing(index_elements=[table.c.token_id, table.c.allegro_order_id, table.c.seq])
+        return stmt.cte("recorded_revisions")
+        
+    def _record_revision(self, order_id: str, seq: int, previous_data: Optional[Dict[str, Any]],
+                         data: Dict[str, Any], revision: Optional[str] = None):
+        """Запись версии заказа в текущей транзакции (без commit)"""
+        
+        self.db.add(OrderRevision(**self.revision_service.revision_row(
+            order_id, seq, previous_data, data, datetime.utcnow(), revision
+        )))
+        
+    def _increment_order_count(self, created: int = 1):
+        """Увеличение счетчика заказов токена в текущей транзакции (без commit)"""
+        
+        from sqlalchemy.dialects.postgresql import insert
+        
+        table = TokenOrderCount.__table__
+        stmt = insert(table).values(token_id=self.token_id, orders_count=created, updated_at=datetime.utcnow())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.token_id],
+            set_={
+                "orders_count": table.c.orders_count + stmt.excluded.orders_count,
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        self.db.exec(stmt)
+        
+    def get_cached_order_count(self) -> int:
+        """Число заказов токена из token_order_counts (0, если заказов еще нет)"""
+        
+        orders_count = self.db.exec(
+            select(TokenOrderCount.orders_count).where(TokenOrderCount.token_id == self.token_id)
+        ).first()
+        return orders_count or 0
+        
     def _merge_order_data(self, existing_order: Order, new_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Умное слияние существующих и новых данных заказа.
@@ -307,8 +597,10 @@ class OrderProtectionService:
         # Начинаем с новых данных
         merged_data = new_data.copy()
         
+        existing_order_data = existing_order.order_data or {}
+        
         # Восстанавливаем потерянные данные покупателя
-        existing_buyer = existing_order.buyer_data or {}
+        existing_buyer = existing_order_data.get("buyer") or {}
         new_buyer = new_data.get("buyer", {})
         
         for field in ["email", "firstName", "lastName", "phoneNumber"]:
@@ -317,7 +609,7 @@ class OrderProtectionService:
                 logger.info(f"🔄 Восстановлено поле покупателя: {field}")
                 
         # Проверяем сохранность товаров
-        existing_items = existing_order.line_items or []
+        existing_items = existing_order_data.get("lineItems") or []
         new_items = new_data.get("lineItems", [])
         
         if len(existing_items) > len(new_items):
@@ -339,6 +631,7 @@ class OrderProtectionService:
         )
         
         self.db.add(order_event)
+        DataMonitoringService(self.db).record_events(self.token_id, [(order_event.occurred_at, event_type, data)])
         logger.info(f"📝 Сохранено событие {event_type} для заказа {order_id}")
         
     def _get_required_fields_for_structure(self, data: Dict[str, Any]) -> List[str]:
@@ -409,6 +702,10 @@ class OrderProtectionService:
         if allegro_revision:
             data["revision"] = allegro_revision
         
+        # Версия в истории - патч относительно текущих данных заказа
+        order.revision_seq = (order.revision_seq or 0) + 1
+        self._record_revision(order.allegro_order_id, order.revision_seq, order.order_data, data, allegro_revision)
+        
         # Обновляем данные заказа
         order.order_data = data
         order.updated_at = datetime.utcnow()
@@ -433,10 +730,13 @@ class OrderProtectionService:
             allegro_order_id=order_id,
             order_data=data,
             order_date=order_date if order_date else datetime.utcnow(),
-            is_deleted=False
+            is_deleted=False,
+            revision_seq=1
         )
         
         self.db.add(new_order)
+        self._record_revision(order_id, 1, None, data, revision)
+        self._increment_order_count()
         
     def create_data_snapshot(self, order_id: str, snapshot_type: str = "manual"):
         """
@@ -471,6 +771,11 @@ class OrderProtectionService:
         - Массовое исчезновение заказов
         - Неожиданные изменения в структуре данных
         
+        orders_data должен быть полным списком заказов токена: размер сравнивается
+        с числом заказов токена. Синхронизация проверяет страницы через
+        DataMonitoringService.detect_data_anomalies - страница в 100 заказов
+        всегда меньше половины заказов крупного токена.
+        
         Returns:
             List[str]: Список обнаруженных аномалий
         """
@@ -493,8 +798,8 @@ class OrderProtectionService:
         if missing_data_ratio > 0.1:  # Более 10% заказов с проблемами
             anomalies.append(f"⚠️ {missing_data_ratio:.1%} заказов имеют неполные данные")
             
-        # Проверяем количество заказов
-        existing_orders_count = self.db.exec(select(func.count(Order.id))).one()
+        # Проверяем количество заказов токена (кешированный счетчик вместо count(*) по orders)
+        existing_orders_count = self.get_cached_order_count()
         if total_orders < existing_orders_count * 0.5:  # Заказов стало в 2 раза меньше
             anomalies.append(f"🚨 Критическое уменьшение количества заказов: {total_orders} vs {existing_orders_count}")
             
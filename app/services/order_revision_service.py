@@ -0,0 +1,194 @@
+"""
+@file: order_revision_service.py
+@description: История версий данных заказов (order_revisions) и восстановление заказа на момент времени
+@dependencies: OrderRevision, json_patch, sqlmodel
+"""
+
+import copy
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+from sqlmodel import Session, select, func
+
+from app.core.json_patch import apply_patch, make_patch
+from app.core.settings import settings
+from app.models.order_revision import OrderRevision
+
+logger = logging.getLogger(__name__)
+
+
+class OrderRevisionService:
+    """
+    История принятых версий order_data заказов токена.
+
+    Каждая записанная версия хранится как JSON Patch относительно предыдущей;
+    первая версия и каждая SYNC_REVISION_KEYFRAME_INTERVAL-я - полный документ,
+    поэтому восстановление читает не больше интервала строк.
+    """
+
+    def __init__(self, db: Session, token_id: UUID):
+        self.db = db
+        self.token_id = token_id
+
+    @staticmethod
+    def build_revision(previous_data: Optional[Dict[str, Any]], data: Dict[str, Any], seq: int) -> Tuple[bool, Any]:
+        """
+        Содержимое версии seq: полный документ или патч относительно previous_data.
+
+        Returns:
+            Tuple[bool, Any]: (is_keyframe, data)
+        """
+
+        interval = max(1, settings.sync.revision_keyframe_interval)
+        if previous_data is None or seq <= 1 or (seq - 1) % interval == 0:
+            return True, data
+        return False, make_patch(previous_data, data)
+
+    def revision_row(self, order_id: str, seq: int, previous_data: Optional[Dict[str, Any]],
+                     data: Dict[str, Any], recorded_at: datetime,
+                     revision: Optional[str] = None) -> Dict[str, Any]:
+        """Значения строки order_revisions для новой версии заказа (без записи в БД)"""
+
+        is_keyframe, payload = self.build_revision(previous_data, data, seq)
+        return {
+            "token_id": self.token_id,
+            "allegro_order_id": order_id,
+            "seq": seq,
+            "revision": revision or data.get("revision"),
+            "is_keyframe": is_keyframe,
+            "data": payload,
+            "recorded_at": recorded_at
+        }
+
+    def get_order_at(self, order_id: str, at: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Восстановление order_data заказа на момент времени.
+
+        Одним запросом читаются последний полный снимок до at и патчи после него.
+
+        Args:
+            order_id: ID заказа в Allegro
+            at: Момент времени (UTC); None - последняя записанная версия
+
+        Returns:
+            Optional[Dict]: seq, revision, recorded_at и order_data версии
+                или None, если история заказа до at не записана
+        """
+
+        conditions = self._conditions(order_id, at)
+        keyframe_seq = (
+            select(func.max(OrderRevision.seq))
+            .where(*conditions, OrderRevision.is_keyframe)
+            .scalar_subquery()
+        )
+        revisions = self.db.exec(
+            select(OrderRevision)
+            .where(*conditions, OrderRevision.seq >= keyframe_seq)
+            .order_by(OrderRevision.seq)
+        ).all()
+
+        if not revisions:
+            return None
+
+        order_data = copy.deepcopy(revisions[0].data)
+        previous_seq = revisions[0].seq
+        for order_revision in revisions[1:]:
+            if order_revision.seq != previous_seq + 1:
+                logger.error(
+                    f"❌ Пропущена версия {previous_seq + 1} заказа {order_id}: восстановление невозможно"
+                )
+                return None
+            order_data = apply_patch(order_data, order_revision.data, in_place=True)
+            previous_seq = order_revision.seq
+
+        return self._version(order_id, revisions[-1], order_data)
+
+    def iter_versions(self, order_id: str, at: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Версии order_data заказа до момента at от последней к первой.
+
+        Используется для поиска последней пригодной версии (экстренное
+        восстановление), когда последняя записанная версия сама повреждена.
+        Версии восстанавливаются отрезками от полного снимка, начиная
+        с последнего; следующий отрезок читается, только если перебор
+        дошел до него. Версии после пропуска в цепочке не возвращаются.
+
+        Args:
+            order_id: ID заказа в Allegro
+            at: Момент времени (UTC); None - вся история
+
+        Yields:
+            Dict: seq, revision, recorded_at и order_data версии (как get_order_at)
+        """
+
+        conditions = self._conditions(order_id, at)
+        keyframe_seqs = self.db.exec(
+            select(OrderRevision.seq)
+            .where(*conditions, OrderRevision.is_keyframe)
+            .order_by(OrderRevision.seq.desc())
+        ).all()
+
+        next_keyframe_seq = None
+        for keyframe_seq in keyframe_seqs:
+            segment_conditions = [*conditions, OrderRevision.seq >= keyframe_seq]
+            if next_keyframe_seq is not None:
+                segment_conditions.append(OrderRevision.seq < next_keyframe_seq)
+            revisions = self.db.exec(
+                select(OrderRevision).where(*segment_conditions).order_by(OrderRevision.seq)
+            ).all()
+
+            versions = []
+            order_data = None
+            for order_revision in revisions:
+                if order_data is None:
+                    order_data = copy.deepcopy(order_revision.data)
+                elif order_revision.seq != versions[-1]["seq"] + 1:
+                    logger.error(
+                        f"❌ Пропущена версия {versions[-1]['seq'] + 1} заказа {order_id}: "
+                        f"версии до {order_revision.seq} недоступны"
+                    )
+                    break
+                else:
+                    order_data = apply_patch(order_data, order_revision.data)
+                versions.append(self._version(order_id, order_revision, order_data))
+
+            yield from reversed(versions)
+            next_keyframe_seq = keyframe_seq
+
+    def _conditions(self, order_id: str, at: Optional[datetime]) -> List[Any]:
+        conditions = [
+            OrderRevision.token_id == self.token_id,
+            OrderRevision.allegro_order_id == order_id
+        ]
+        if at is not None:
+            conditions.append(OrderRevision.recorded_at <= at)
+        return conditions
+
+    @staticmethod
+    def _version(order_id: str, order_revision: OrderRevision, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "order_id": order_id,
+            "seq": order_revision.seq,
+            "revision": order_revision.revision,
+            "recorded_at": order_revision.recorded_at,
+            "order_data": order_data
+        }
+
+    def get_revision_history(self, order_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Список версий заказа (без данных), последние - первыми"""
+
+        rows = self.db.exec(
+            select(OrderRevision.seq, OrderRevision.revision, OrderRevision.is_keyframe, OrderRevision.recorded_at)
+            .where(
+                OrderRevision.token_id == self.token_id,
+                OrderRevision.allegro_order_id == order_id
+            )
+            .order_by(OrderRevision.seq.desc())
+            .limit(limit)
+        ).all()
+
+        return [
+            {"seq": seq, "revision": revision, "is_keyframe": is_keyframe, "recorded_at": recorded_at}
+            for seq, revision, is_keyframe, recorded_at in rows
+        ]
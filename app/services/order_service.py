@@ -5,7 +5,7 @@
 """
 
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
 from sqlmodel import Session, select, func
 import httpx
@@ -19,6 +19,7 @@ from app.services.data_monitoring_service import DataMonitoringService
 from app.services.allegro_auth_service import AllegroAuthService
 from app.services.order_technical_flags_service import OrderTechnicalFlagsService
 from app.core.database import get_sync_db_session_direct
+from app.core.allegro_client import allegro_client
 
 logger = logging.getLogger(__name__)
 
@@ -99,10 +100,7 @@ class OrderService:
                 result["error"] = f"Токен {self.token_id} недействителен или не принадлежит пользователю"
                 return result
                 
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Accept": "application/vnd.allegro.public.v1+json"
-            }
+            headers = allegro_client.auth_headers(token)
             
             # Параметры запроса
             params = {"limit": min(limit, 1000)}  # Максимум 1000 согласно API
@@ -113,22 +111,22 @@ class OrderService:
             logger.info(f"📥 Запрос событий заказов: limit={limit}, from={from_timestamp}")
             
             # Выполняем запрос к Allegro API
-            with httpx.Client() as client:
-                response = client.get(self.EVENTS_URL, headers=headers, params=params, timeout=30.0)
-                response.raise_for_status()
-                
-                data = response.json()
-                events = data.get("events", [])
-                
-                result.update({
-                    "success": True,
-                    "events": events,
-                    "total_count": len(events),
-                    "has_more": len(events) == limit  # Если получили максимум, возможно есть еще
-                })
-                
-                logger.info(f"✅ Получено {len(events)} событий заказов")
-                
+            client = allegro_client.sync_client
+            response = client.get(self.EVENTS_URL, headers=headers, params=params)
+            response.raise_for_status()
+            
+            data = response.json()
+            events = data.get("events", [])
+            
+            result.update({
+                "success": True,
+                "events": events,
+                "total_count": len(events),
+                "has_more": len(events) == limit  # Если получили максимум, возможно есть еще
+            })
+            
+            logger.info(f"✅ Получено {len(events)} событий заказов")
+            
         except httpx.HTTPStatusError as e:
             error_msg = f"HTTP ошибка при получении событий: {e.response.status_code}"
             logger.error(error_msg)
@@ -170,50 +168,47 @@ class OrderService:
                 result["error"] = f"Токен {self.token_id} недействителен или не принадлежит пользователю"
                 return result
                 
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Accept": "application/vnd.allegro.public.v1+json"
-            }
+            headers = allegro_client.auth_headers(token)
             
             url = f"{self.CHECKOUT_FORMS_URL}/{order_id}"
             
             logger.info(f"📋 Запрос деталей заказа: {order_id}")
             
-            with httpx.Client() as client:
-                response = client.get(url, headers=headers, timeout=15.0)
-                
-                if response.status_code == 404:
-                    result["error"] = f"Заказ {order_id} не найден"
-                    return result
-                    
-                response.raise_for_status()
-                order_data = response.json()
-                
-                # Получаем технические флаги для заказа
-                technical_data = None
-                try:
-                    with OrderTechnicalFlagsService(self.user_id, self.token_id) as flags_service:
-                        flags = flags_service.get_or_create_flags(order_id)
-                        technical_data = {
-                            "is_stock_updated": flags.is_stock_updated,
-                            "has_invoice_created": flags.has_invoice_created,
-                            "invoice_id": flags.invoice_id,
-                            "created_at": flags.created_at.isoformat(),
-                            "updated_at": flags.updated_at.isoformat()
-                        }
-                except Exception as e:
-                    logger.warning(f"Не удалось получить технические флаги для заказа {order_id}: {e}")
-                
-                # Добавляем технические флаги к данным заказа
-                order_data["technical_flags"] = technical_data
-                
-                result.update({
-                    "success": True,
-                    "order": order_data
-                })
-                
-                logger.info(f"✅ Получены детали заказа {order_id}")
+            client = allegro_client.sync_client
+            response = client.get(url, headers=headers)
+            
+            if response.status_code == 404:
+                result["error"] = f"Заказ {order_id} не найден"
+                return result
                 
+            response.raise_for_status()
+            order_data = response.json()
+            
+            # Получаем технические флаги для заказа
+            technical_data = None
+            try:
+                with OrderTechnicalFlagsService(self.user_id, self.token_id) as flags_service:
+                    flags = flags_service.get_or_create_flags(order_id)
+                    technical_data = {
+                        "is_stock_updated": flags.is_stock_updated,
+                        "has_invoice_created": flags.has_invoice_created,
+                        "invoice_id": flags.invoice_id,
+                        "created_at": flags.created_at.isoformat(),
+                        "updated_at": flags.updated_at.isoformat()
+                    }
+            except Exception as e:
+                logger.warning(f"Не удалось получить технические флаги для заказа {order_id}: {e}")
+            
+            # Добавляем технические флаги к данным заказа
+            order_data["technical_flags"] = technical_data
+            
+            result.update({
+                "success": True,
+                "order": order_data
+            })
+            
+            logger.info(f"✅ Получены детали заказа {order_id}")
+            
         except httpx.HTTPStatusError as e:
             error_msg = f"HTTP ошибка при получении заказа {order_id}: {e.response.status_code}"
             logger.error(error_msg)
@@ -788,6 +783,45 @@ class OrderService:
             
         return relevance
         
+    def get_order_revisions(self, order_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        История версий заказа (order_revisions) без данных, последние - первыми.
+        
+        Args:
+            order_id: ID заказа в Allegro
+            limit: Максимальное количество версий
+            
+        Returns:
+            List[Dict]: seq, revision, is_keyframe, recorded_at
+        """
+        
+        revisions = self.protection_service.revision_service.get_revision_history(order_id, limit)
+        return [
+            {**revision, "recorded_at": revision["recorded_at"].isoformat()}
+            for revision in revisions
+        ]
+        
+    def get_order_at(self, order_id: str, at: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Данные заказа на момент времени, восстановленные из истории версий.
+        
+        Args:
+            order_id: ID заказа в Allegro
+            at: Момент времени; None - последняя записанная версия
+            
+        Returns:
+            Optional[Dict]: seq, revision, recorded_at и order_data или None, если история не записана
+        """
+        
+        if at is not None and at.tzinfo is not None:
+            # recorded_at хранится в UTC без часового пояса
+            at = at.astimezone(timezone.utc).replace(tzinfo=None)
+            
+        snapshot = self.protection_service.revision_service.get_order_at(order_id, at)
+        if snapshot:
+            snapshot["recorded_at"] = snapshot["recorded_at"].isoformat()
+        return snapshot
+        
     def get_data_quality_report(self) -> Dict[str, Any]:
         """
         Получение отчета о качестве данных заказов.
@@ -797,9 +831,9 @@ class OrderService:
         """
         
         try:
-            # Используем наш monitoring service
-            health_metrics = self.monitoring_service.check_data_health(time_window_hours=24)
-            quality_report = self.monitoring_service.generate_data_quality_report(days=7)
+            # Используем наш monitoring service (счетчики токена, без чтения событий)
+            health_metrics = self.monitoring_service.check_token_health(self.token_id, time_window_hours=24)
+            quality_report = self.monitoring_service.generate_data_quality_report(days=7, token_id=self.token_id)
             
             return {
                 "success": True,
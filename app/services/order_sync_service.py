@@ -4,23 +4,48 @@
 @dependencies: OrderProtectionService, DataMonitoringService, AllegroAuthService, DeduplicationService
 """
 
+import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple, Iterator, AsyncIterator
 from uuid import UUID
+from celery.exceptions import SoftTimeLimitExceeded
 from sqlmodel import Session
 
 from app.services.order_protection_service import OrderProtectionService, DataIntegrityError
 from app.services.data_monitoring_service import DataMonitoringService
 from app.services.allegro_auth_service import AllegroAuthService
 from app.services.deduplication_service import DeduplicationService
+from app.core.settings import settings
+from app.core.allegro_client import allegro_client
+from app.core.prefetch import prefetch
+from app.core.rate_limiter import allegro_rate_limiter
+from app.core.token_cache import access_token_cache
+from app.core.retry_policy import (
+    AllegroRetryLater, RETRYABLE_EXCEPTIONS, ensure_inline_wait, is_retryable_response, retry_delay
+)
 from app.models.sync_history import SyncHistory, SyncStatus
 from app.models.order_event import OrderEvent
 from app.models.failed_order_processing import FailedOrderProcessing, FailedOrderStatus
+from app.services.failed_order_service import FailedOrderService
 import httpx
 
 logger = logging.getLogger(__name__)
 
+# Ограничения Checkout Forms API
+CHECKOUT_FORMS_PAGE_LIMIT = 100  # Максимум 100 заказов за запрос
+CHECKOUT_FORMS_MAX_OFFSET = 10000  # Записи дальше offset 10K не отдаются
+CHECKOUT_FORMS_MIN_WINDOW = timedelta(minutes=1)  # Минимальный размер окна при делении
+BACKFILL_WINDOW_MAX_ATTEMPTS = 3  # Попыток выгрузить окно, прежде чем синхронизация завершится ошибкой
+
+# Счетчики sync_result, переносимые между задачами через checkpoint
+CHECKPOINT_COUNTERS = (
+    "orders_processed", "orders_created", "orders_updated", "orders_skipped",
+    "orders_failed", "orders_deduplicated", "orders_coalesced",
+    "events_saved", "events_deduplicated", "events_invalid", "event_pages_fetched", "orders_expected"
+)
+
 class SyncPausedException(Exception):
     """Исключение при принудительной остановке синхронизации"""
     pass
@@ -56,8 +81,14 @@ class OrderSyncService:
             self.protection_service = None
         self.monitoring_service = DataMonitoringService(db)
         self.deduplication_service = DeduplicationService(db)
+        self._sync_history: Optional[SyncHistory] = None
+        self._deadline: Optional[float] = None
+        self._progress_reporter = None
+        self._lease = None
         
-    def sync_orders_safe(self, full_sync: bool = False, sync_from_date: Optional[datetime] = None, sync_to_date: Optional[datetime] = None) -> Dict[str, Any]:
+    def sync_orders_safe(self, full_sync: bool = False, sync_from_date: Optional[datetime] = None, sync_to_date: Optional[datetime] = None,
+                         resume_sync_id: Optional[str] = None, deadline: Optional[float] = None,
+                         progress_reporter=None, lease=None) -> Dict[str, Any]:
         """
         Безопасная синхронизация заказов с полной защитой данных.
         
@@ -65,6 +96,12 @@ class OrderSyncService:
             full_sync: Полная синхронизация или инкрементальная
             sync_from_date: Синхронизация с даты
             sync_to_date: Синхронизация по дату
+            resume_sync_id: ID записи SyncHistory, с checkpoint которой продолжить
+            deadline: Момент time.monotonic(), после которого прогресс сохраняется
+                и синхронизация передается следующей задаче (continuation_required)
+            progress_reporter: TaskProgressReporter для публикации прогресса в TaskHistory
+            lease: SyncLease блокировки токена - при потере lease синхронизация
+                останавливается так же, как по deadline
             
         Returns:
             Dict: Результат синхронизации с детальной статистикой
@@ -85,36 +122,76 @@ class OrderSyncService:
             "orders_skipped": 0,
             "orders_failed": 0,
             "orders_deduplicated": 0,
+            "orders_coalesced": 0,
             "events_saved": 0,
             "events_deduplicated": 0,
+            "events_invalid": 0,
+            "event_pages_fetched": 0,
+            "orders_expected": 0,
+            "events_backlog_remaining": False,
+            "last_event_id": None,
+            "rate_limit_wait_seconds": 0.0,
+            "retry_after_seconds": None,
+            "continuation_required": False,
+            "sync_history_id": None,
             "data_quality_score": 0.0,
             "critical_issues": [],
             "warnings": [],
             "paused_due_to_anomalies": False
         }
+        rate_limit_wait_before = allegro_rate_limiter.total_wait_seconds()
+        self._deadline = deadline
+        self._progress_reporter = progress_reporter
+        self._lease = lease
         
         try:
+            # ⏯️ Продолжение синхронизации, прерванной по лимиту времени задачи
+            checkpoint_position = self._resume_from_checkpoint(resume_sync_id, sync_result) if resume_sync_id else None
+            
             # 🔍 1. Предварительная проверка состояния данных
             logger.info("🔍 Проверка состояния данных перед синхронизацией...")
             
-            should_pause = self.monitoring_service.should_pause_sync()
+            should_pause = self.monitoring_service.should_pause_sync(self.token_id)
             if should_pause:
                 sync_result["paused_due_to_anomalies"] = True
                 raise SyncPausedException("Синхронизация остановлена из-за аномалий в данных")
                 
-            # 📥 2. Получение данных от Allegro
+            # 📥 2. Получение и обработка данных от Allegro
             logger.info(f"📥 Получение данных заказов от Allegro (с {sync_from_date} по {sync_to_date})...")
             
             # ЛОГИКА ВЫБОРА API:
             # - Если указана sync_from_date → используем Checkout Forms API (эффективнее для периода)
             # - Если нет sync_from_date → используем Events API (инкрементальная синхронизация)
             
-            orders_data = []
-            
             if sync_from_date:
                 # Используем Checkout Forms API для получения заказов по датам
                 logger.info(f"🗓️ Использование Checkout Forms API для периода {sync_from_date} - {sync_to_date or 'сейчас'}")
-                orders_data = self._fetch_orders_by_date(sync_from_date, sync_to_date)
+                orders_count = 0
+                
+                # Каждая страница обрабатывается сразу после получения, позиция сохраняется в checkpoint
+                backfill_progress = {}
+                orders_pages = self._iter_orders_by_date(
+                    sync_from_date, sync_to_date, sync_result,
+                    resume=checkpoint_position, progress=backfill_progress
+                )
+                for orders_page in orders_pages:
+                    orders_count += len(orders_page)
+                    logger.info(f"📥 Получено {len(orders_page)} заказов для обработки (всего {orders_count})")
+                    self._process_data_items(orders_page, sync_result)
+                    self._check_batch_anomalies(orders_page, sync_result)
+                    self._save_checkpoint(sync_result, {"mode": "checkout_forms", **backfill_progress})
+                    self._report_progress(sync_result)
+                    
+                    if self._deadline_reached():
+                        self._suspend_sync(sync_result)
+                        break
+                        
+                if sync_result["continuation_required"]:
+                    return sync_result
+                    
+                if not orders_count and self._sync_history is None:
+                    logger.warning("⚠️ Не получено данных для обработки")
+                    return sync_result
                 
             else:
                 # Используем Events API для инкрементальной синхронизации
@@ -123,7 +200,11 @@ class OrderSyncService:
                 # Определяем event ID для начала синхронизации
                 from_event_id = None
                 
-                if not full_sync:
+                if checkpoint_position and checkpoint_position.get("event_cursor"):
+                    # Продолжение прерванной выгрузки (в том числе полной) с сохраненного курсора
+                    from_event_id = checkpoint_position["event_cursor"]
+                    logger.info(f"⏯️ Продолжение выгрузки событий с event_id: {from_event_id}")
+                elif not full_sync:
                     # Получаем последний event_id из базы данных
                     from_event_id = self._get_last_event_id_from_db()
                     if from_event_id:
@@ -133,197 +214,32 @@ class OrderSyncService:
                 else:
                     logger.info("🔄 Полная синхронизация всех событий")
                 
-                # Получаем события заказов
-                orders_data = self._fetch_order_events_safe(from_event_id=from_event_id, sync_to_date=sync_to_date)
-            
-            if not orders_data:
-                logger.warning("⚠️ Не получено данных для обработки")
-                return sync_result
+                # Постранично выгружаем ленту событий, обрабатывая каждую страницу сразу
+                events_count = self._drain_order_events(sync_result, from_event_id=from_event_id, sync_to_date=sync_to_date)
                 
-            # 📥 3. Обработка событий заказов
-            logger.info(f"📥 Получено {len(orders_data)} событий для обработки")
-            
-            # Обрабатываем полученные данные (события или заказы)
-            for data_item in orders_data:
-                try:
-                    source = data_item.get("source", "events_api")
+                if sync_result["continuation_required"]:
+                    return sync_result
                     
-                    if source == "checkout_forms_api":
-                        # Данные получены напрямую через Checkout Forms API - НЕ создаем события
-                        logger.info("📋 Обработка заказа из Checkout Forms API")
-                        
-                        # Проверяем дедупликацию заказа
-                        order_id = data_item.get("order_id")
-                        if order_id:
-                            order_decision = self.deduplication_service.should_process_order(
-                                order_id, UUID(self.token_id)
-                            )
-                            
-                            if not order_decision["should_process"]:
-                                logger.info(f"🔄 Заказ {order_id} пропущен: {order_decision['reason']}")
-                                sync_result["orders_deduplicated"] += 1
-                                continue
-                        
-                        # Обрабатываем заказ напрямую (без события)
-                        result = self._process_single_order_safe(data_item)
-                        
-                        # Обновляем статистику
-                        sync_result["orders_processed"] += 1
-                        if result["action"] == "created":
-                            sync_result["orders_created"] += 1
-                        elif result["action"] == "updated":
-                            sync_result["orders_updated"] += 1
-                        elif result["action"] == "skipped":
-                            sync_result["orders_skipped"] += 1
-                            
-                    else:
-                        # Данные получены через Events API - НОВАЯ ЛОГИКА
-                        logger.info("📡 Обработка события из Events API")
-                        
-                        # Извлекаем ID события для дедупликации
-                        event_info = data_item.get("event", {})
-                        allegro_event_id = event_info.get("id")
-                        order_id = data_item.get("order_id")
-                        
-                        # Проверяем, нужно ли обрабатывать это событие
-                        if allegro_event_id:
-                            event_decision = self.deduplication_service.should_process_event(
-                                allegro_event_id, UUID(self.token_id)
-                            )
-                            
-                            if not event_decision["should_process"]:
-                                logger.info(f"🔄 Событие {allegro_event_id} пропущено: {event_decision['reason']}")
-                                sync_result["events_deduplicated"] += 1
-                                continue
-                        
-                        # ✅ ШАГ 1: Сохраняем событие в базу данных (независимо от типа)
-                        self._save_all_events_to_db(data_item)
-                        sync_result["events_saved"] += 1
-                        
-                        # ✅ ШАГ 2: Проверяем нужно ли создавать/обновлять заказ
-                        if order_id:
-                            # Проверяем дедупликацию заказа
-                            order_decision = self.deduplication_service.should_process_order(
-                                order_id, UUID(self.token_id)
-                            )
-                            
-                            if not order_decision["should_process"]:
-                                logger.info(f"🔄 Заказ {order_id} пропущен: {order_decision['reason']}")
-                                sync_result["orders_deduplicated"] += 1
-                                continue
-                            
-                            # Извлекаем revision из checkoutForm
-                            checkout_form = data_item.get("order", {}).get("checkoutForm", {})
-                            new_revision = checkout_form.get("revision")
-                            
-                            if not new_revision:
-                                logger.warning(f"⚠️ Revision не найдена в событии для заказа {order_id}")
-                                # Используем fallback revision на основе времени события
-                                event_occurred_at = event_info.get("occurredAt")
-                                if event_occurred_at:
-                                    try:
-                                        occurred_dt = datetime.fromisoformat(event_occurred_at.replace("Z", "+00:00"))
-                                        new_revision = str(int(occurred_dt.timestamp()))
-                                    except:
-                                        new_revision = str(int(datetime.utcnow().timestamp()))
-                                else:
-                                    new_revision = str(int(datetime.utcnow().timestamp()))
-                                logger.info(f"🔧 Используется fallback revision: {new_revision}")
-                            
-                            # Проверяем нужно ли создавать/обновлять заказ
-                            update_check = self._check_order_needs_update(order_id, new_revision)
-                            
-                            if update_check["action"] == "skip":
-                                logger.info(f"⏭️ Заказ {order_id} пропущен - revision не изменилась")
-                                sync_result["orders_skipped"] += 1
-                                continue
-                            
-                            # ✅ ШАГ 3: Получаем полные детали заказа и создаем/обновляем
-                            logger.info(f"🔍 Получение полных деталей заказа {order_id} (действие: {update_check['action']})")
-                            
-                            order_details = self._get_order_details_from_api(order_id)
-                            
-                            if order_details:
-                                logger.info(f"💾 {update_check['action'].title()} заказа {order_id} на основе полных деталей")
-                                
-                                # Создаем структуру данных для обработки заказа
-                                order_data_item = {
-                                    "order": order_details,
-                                    "order_id": order_id,
-                                    "source": "full_api_details"
-                                }
-                                
-                                # Обрабатываем заказ с полными деталями
-                                result = self._process_single_order_safe(order_data_item)
-                                
-                                # Обновляем статистику
-                                sync_result["orders_processed"] += 1
-                                if result["action"] == "created":
-                                    sync_result["orders_created"] += 1
-                                elif result["action"] == "updated":
-                                    sync_result["orders_updated"] += 1
-                                elif result["action"] == "skipped":
-                                    sync_result["orders_skipped"] += 1
-                                    
-                                logger.info(f"✅ Заказ {order_id} обработан: {result['action']}")
-                                
-                            else:
-                                # ❌ Не удалось получить детали заказа - сохраняем для повторной обработки
-                                logger.warning(f"⚠️ Не удалось получить детали заказа {order_id}, сохраняем для повторной обработки")
-                                
-                                error_message = f"Не удалось получить детали заказа через API после retry"
-                                saved = self._save_failed_order(
-                                    order_id=order_id,
-                                    action_required=update_check['action'],
-                                    error_message=error_message,
-                                    error_type="api_fetch_failed",
-                                    event_data=data_item,
-                                    expected_revision=new_revision
-                                )
-                                
-                                if saved:
-                                    logger.info(f"💾 Заказ {order_id} сохранен для повторной обработки")
-                                else:
-                                    logger.error(f"❌ Не удалось сохранить проблемный заказ {order_id}")
-                                    
-                                sync_result["orders_failed"] += 1
-                        else:
-                            logger.info("📝 Событие сохранено, но order_id отсутствует - заказ не обработан")
-                        
-                except DataIntegrityError as e:
-                    logger.error(f"❌ Ошибка целостности данных для события {data_item.get('event', {}).get('id', 'unknown')}: {e}")
-                    sync_result["orders_failed"] += 1
-                    sync_result["critical_issues"].append(str(e))
+                if not events_count and self._sync_history is None:
+                    logger.warning("⚠️ Не получено данных для обработки")
+                    return sync_result
                     
-                except Exception as e:
-                    logger.error(f"❌ Неожиданная ошибка при обработке события {data_item.get('event', {}).get('id', 'unknown')}: {e}")
-                    sync_result["orders_failed"] += 1
-            
-            # 📝 4. Создание записи о начале синхронизации
-            sync_history = self._create_sync_history_record(sync_result["sync_type"])
-            
-            # 🔍 4. Анализ качества полученных данных
-            logger.info(f"🔍 Анализ качества {len(orders_data)} событий...")
-            anomalies = self.monitoring_service.detect_data_anomalies(orders_data)
-            if anomalies:
-                sync_result["warnings"].extend(anomalies)
-                logger.warning(f"⚠️ Обнаружены аномалии: {anomalies}")
-                
-                # Критические аномалии - останавливаем синхронизацию
-                critical_anomalies = [a for a in anomalies if "🚨" in a]
-                if critical_anomalies:
-                    sync_result["critical_issues"] = critical_anomalies
-                    raise SyncPausedException(f"Критические аномалии в данных: {critical_anomalies}")
+            # 📝 3. Запись о синхронизации (создается при первом checkpoint или сейчас)
+            sync_history = self._sync_history or self._create_sync_history_record(
+                sync_result["sync_type"], sync_from_date, sync_to_date
+            )
+            sync_result["sync_history_id"] = str(sync_history.id)
                     
-            # 📊 6. Финальная оценка качества данных
-            health_metrics = self.monitoring_service.check_data_health(time_window_hours=1)
+            # 📊 4. Финальная оценка качества данных
+            health_metrics = self.monitoring_service.check_token_health(self.token_id, time_window_hours=1)
             sync_result["data_quality_score"] = 1.0 - health_metrics.anomaly_score
             
-            # ✅ 7. Обновление записи синхронизации
+            # ✅ 5. Обновление записи синхронизации
             self._update_sync_history_record(sync_history, sync_result, success=True)
             
             sync_result["success"] = True
             sync_result["completed_at"] = datetime.utcnow()
+            sync_result["rate_limit_wait_seconds"] = round(allegro_rate_limiter.total_wait_seconds() - rate_limit_wait_before, 3)
             
             logger.info(
                 f"✅ Синхронизация завершена успешно: "
@@ -332,9 +248,12 @@ class OrderSyncService:
                 f"обновлено {sync_result['orders_updated']}, "
                 f"пропущено {sync_result['orders_skipped']}, "
                 f"дедуплицировано заказов {sync_result['orders_deduplicated']}, "
+                f"схлопнуто событий заказов {sync_result['orders_coalesced']}, "
                 f"событий сохранено {sync_result['events_saved']}, "
                 f"событий дедуплицировано {sync_result['events_deduplicated']}, "
-                f"ошибок {sync_result['orders_failed']}"
+                f"некорректных событий {sync_result['events_invalid']}, "
+                f"ошибок {sync_result['orders_failed']}, "
+                f"ожидание rate limit {sync_result['rate_limit_wait_seconds']} сек"
             )
             
             return sync_result
@@ -344,167 +263,797 @@ class OrderSyncService:
             sync_result["critical_issues"].append(str(e))
             return sync_result
             
+        except AllegroRetryLater as e:
+            # Долгая пауза Allegro - продолжение передается планировщику задач
+            logger.warning(f"⏸️ Синхронизация отложена: {e}")
+            sync_result["retry_after_seconds"] = e.retry_after
+            sync_result["warnings"].append(str(e))
+            if self._sync_history is not None:
+                sync_result["sync_history_id"] = str(self._sync_history.id)
+            return sync_result
+            
+        except SoftTimeLimitExceeded:
+            # Прогресс до последней обработанной страницы уже сохранен в checkpoint
+            self.db.rollback()
+            self._suspend_sync(sync_result)
+            return sync_result
+            
         except Exception as e:
             logger.error(f"❌ Критическая ошибка синхронизации: {e}")
             sync_result["critical_issues"].append(str(e))
+            if self._sync_history is not None:
+                self._mark_sync_failed(sync_result, str(e))
             return sync_result
+            
+    def _process_data_items(self, data_items: List[Dict[str, Any]], sync_result: Dict[str, Any]):
+        """
+        Обработка пачки полученных данных (событий или заказов) с обновлением статистики.
+        
+        Обработка идет в три этапа: события сохраняются и проверяются последовательно,
+        детали изменившихся заказов запрашиваются конкурентно одной пачкой,
+        затем заказы создаются/обновляются последовательно.
         
-    def _fetch_orders_by_date(self, sync_from_date: datetime, sync_to_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        Args:
+            data_items: События из Events API или заказы из Checkout Forms API
+            sync_result: Статистика синхронизации (обновляется на месте)
         """
-        Получение заказов по датам через Checkout Forms API.
         
-        Используется когда задана дата sync_from_date - более эффективный способ
-        получения заказов за определенный период.
+        pending_orders = []
+        
+        # Все события пачки сохраняются одним INSERT ... ON CONFLICT DO NOTHING
+        events = [item for item in data_items if item.get("source", "events_api") == "events_api"]
+        saved_events = self._save_events_batch(events) if events else None
+        inserted_event_ids = None
+        
+        if saved_events is not None:
+            inserted_event_ids, invalid_events = saved_events
+            if invalid_events:
+                # Некорректные события не сохранены - это не дубликаты, дальше они не обрабатываются
+                sync_result["events_invalid"] += len(invalid_events)
+                invalid_items = {id(item) for item in invalid_events}
+                events = [item for item in events if id(item) not in invalid_items]
+                data_items = [item for item in data_items if id(item) not in invalid_items]
+        
+        # Текущие revision всех заказов пачки одним запросом
+        event_order_ids = [item["order_id"] for item in events if item.get("order_id")]
+        current_revisions = self._get_current_revisions(event_order_ids) if event_order_ids else None
+        
+        # Дедупликация заказов зависит только от токена - одна проверка на пачку
+        order_decision = None
+        if any(item.get("order_id") for item in data_items):
+            order_decision = self.deduplication_service.should_process_token_orders(UUID(self.token_id))
+        
+        for data_item in data_items:
+            try:
+                pending = self._process_data_item(
+                    data_item, sync_result, inserted_event_ids, current_revisions, order_decision
+                )
+                if pending:
+                    pending_orders.append(pending)
+                
+            except DataIntegrityError as e:
+                logger.error(f"❌ Ошибка целостности данных для события {data_item.get('event', {}).get('id', 'unknown')}: {e}")
+                sync_result["orders_failed"] += 1
+                sync_result["critical_issues"].append(str(e))
+                
+            except Exception as e:
+                logger.error(f"❌ Неожиданная ошибка при обработке события {data_item.get('event', {}).get('id', 'unknown')}: {e}")
+                sync_result["orders_failed"] += 1
+                
+        last_event = events[-1].get("event", {}) if events else {}
+        if inserted_event_ids is None and last_event.get("id"):
+            # Пакетная запись не удалась, события сохранены поштучно - курсор продвигается отдельно
+            self._save_sync_cursor(last_event["id"], self._parse_event_occurred_at(last_event))
+                
+        if not pending_orders:
+            return
+            
+        # Несколько событий одного заказа (BOUGHT → FILLED_IN → READY_FOR_PROCESSING) -
+        # одно получение деталей и одна запись на заказ
+        coalesced_orders = self._coalesce_pending_orders(pending_orders)
+        sync_result["orders_coalesced"] += len(pending_orders) - len(coalesced_orders)
+        pending_orders = coalesced_orders
+        
+        # Детали запрашиваются только для событий - заказы Checkout Forms API уже полные
+        orders_to_fetch = [pending["order_id"] for pending in pending_orders if "order_data_item" not in pending]
+        retry_after = {}
+        order_details = self._fetch_order_details_batch(orders_to_fetch, retry_after=retry_after) if orders_to_fetch else {}
+        
+        self._apply_orders_batch(pending_orders, order_details, sync_result, retry_after=retry_after)
+        
+    def _process_data_item(self, data_item: Dict[str, Any], sync_result: Dict[str, Any],
+                           inserted_event_ids: Optional[set] = None,
+                           current_revisions: Optional[Dict[str, Optional[str]]] = None,
+                           order_decision: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Обработка одного события или заказа.
         
         Args:
-            sync_from_date: Дата начала синхронизации (обязательно)
-            sync_to_date: Дата окончания синхронизации (опционально)
+            data_item: Событие из Events API или заказ из Checkout Forms API
+            sync_result: Статистика синхронизации (обновляется на месте)
+            inserted_event_ids: ID событий, вставленных пакетно (_save_events_batch);
+                None - событие проверяется и сохраняется поштучно
+            current_revisions: Текущие revision заказов пачки (_get_current_revisions);
+                None - revision проверяется отдельным запросом
+            order_decision: Результат дедупликации заказов токена на пачку
+                (DeduplicationService.should_process_token_orders)
             
         Returns:
-            List: Список заказов с полными данными от Allegro API
+            Optional[Dict]: Заказ, для которого нужно получить полные детали, или None
         """
         
-        try:
-            # Получаем токен пользователя
-            from sqlmodel import select
-            from app.models.user_token import UserToken
-            from uuid import UUID
+        source = data_item.get("source", "events_api")
+        
+        if source == "checkout_forms_api":
+            # Данные получены напрямую через Checkout Forms API - НЕ создаем события
+            logger.info("📋 Обработка заказа из Checkout Forms API")
             
-            try:
-                token_uuid = UUID(self.token_id)
-                query = select(UserToken).where(
-                    UserToken.id == token_uuid,
-                    UserToken.user_id == self.user_id,
-                    UserToken.is_active == True,
-                    UserToken.expires_at > datetime.utcnow()
+            # Проверяем дедупликацию заказа
+            order_id = data_item.get("order_id")
+            if order_id and order_decision and not order_decision["should_process"]:
+                logger.info(f"🔄 Заказ {order_id} пропущен: {order_decision['reason']}")
+                sync_result["orders_deduplicated"] += 1
+                return
+            
+            # Заказ записывается пакетно вместе с остальными заказами пачки (без события)
+            return {
+                "order_id": order_id,
+                "action": "upsert",
+                "revision": data_item.get("order", {}).get("revision"),
+                "data_item": data_item,
+                "order_data_item": data_item
+            }
+            
+        # Данные получены через Events API - НОВАЯ ЛОГИКА
+        logger.info("📡 Обработка события из Events API")
+        
+        # Извлекаем ID события для дедупликации
+        event_info = data_item.get("event", {})
+        allegro_event_id = event_info.get("id")
+        order_id = data_item.get("order_id")
+        
+        if inserted_event_ids is not None:
+            # ✅ ШАГ 1: Событие уже сохранено пакетно - отсутствие в RETURNING означает дубликат
+            if allegro_event_id and allegro_event_id not in inserted_event_ids:
+                logger.info(f"🔄 Событие {allegro_event_id} пропущено: уже существует для токена {self.token_id}")
+                sync_result["events_deduplicated"] += 1
+                return
+        else:
+            # Проверяем, нужно ли обрабатывать это событие
+            if allegro_event_id:
+                event_decision = self.deduplication_service.should_process_event(
+                    allegro_event_id, UUID(self.token_id)
                 )
                 
-                token_record = self.db.exec(query).first()
-                if not token_record:
-                    logger.error(f"❌ Токен {self.token_id} недействителен или не принадлежит пользователю {self.user_id}")
-                    return []
+                if not event_decision["should_process"]:
+                    logger.info(f"🔄 Событие {allegro_event_id} пропущено: {event_decision['reason']}")
+                    sync_result["events_deduplicated"] += 1
+                    return
+            
+            # ✅ ШАГ 1: Сохраняем событие в базу данных (независимо от типа)
+            self._save_all_events_to_db(data_item)
+            
+        sync_result["events_saved"] += 1
+        
+        # ✅ ШАГ 2: Проверяем нужно ли создавать/обновлять заказ
+        if not order_id:
+            logger.info("📝 Событие сохранено, но order_id отсутствует - заказ не обработан")
+            return
+            
+        # Проверяем дедупликацию заказа
+        if order_decision and not order_decision["should_process"]:
+            logger.info(f"🔄 Заказ {order_id} пропущен: {order_decision['reason']}")
+            sync_result["orders_deduplicated"] += 1
+            return
+        
+        # Извлекаем revision из checkoutForm
+        checkout_form = data_item.get("order", {}).get("checkoutForm", {})
+        new_revision = checkout_form.get("revision")
+        
+        if not new_revision:
+            logger.warning(f"⚠️ Revision не найдена в событии для заказа {order_id}")
+            # Используем fallback revision на основе времени события
+            event_occurred_at = event_info.get("occurredAt")
+            if event_occurred_at:
+                try:
+                    occurred_dt = datetime.fromisoformat(event_occurred_at.replace("Z", "+00:00"))
+                    new_revision = str(int(occurred_dt.timestamp()))
+                except:
+                    new_revision = str(int(datetime.utcnow().timestamp()))
+            else:
+                new_revision = str(int(datetime.utcnow().timestamp()))
+            logger.info(f"🔧 Используется fallback revision: {new_revision}")
+        
+        # Проверяем нужно ли создавать/обновлять заказ
+        if current_revisions is not None:
+            update_check = self._decide_order_action(order_id, new_revision, current_revisions)
+        else:
+            update_check = self._check_order_needs_update(order_id, new_revision)
+        
+        if update_check["action"] == "skip":
+            logger.info(f"⏭️ Заказ {order_id} пропущен - revision не изменилась")
+            sync_result["orders_skipped"] += 1
+            return
+        
+        # ✅ ШАГ 3: Полные детали заказа запрашиваются для всей пачки конкурентно
+        logger.info(f"🔍 Заказ {order_id} поставлен в очередь на получение деталей (действие: {update_check['action']})")
+        
+        return {
+            "order_id": order_id,
+            "action": update_check["action"],
+            "revision": new_revision,
+            "data_item": data_item
+        }
+        
+    def _coalesce_pending_orders(self, pending_orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Схлопывает заказы пачки, ожидающие деталей, до одного на order_id.
+        
+        Все события уже сохранены для audit trail; для заказа остается самое
+        позднее событие пачки (лента упорядочена по времени), т.е. новейшая revision.
+        
+        Args:
+            pending_orders: Заказы, ожидающие деталей, в порядке событий
+            
+        Returns:
+            List[Dict]: По одному заказу на order_id
+        """
+        
+        coalesced = {}
+        for pending in pending_orders:
+            coalesced[pending["order_id"]] = pending
+            
+        if len(coalesced) < len(pending_orders):
+            logger.info(f"🧩 {len(pending_orders)} событий схлопнуты до {len(coalesced)} заказов")
+            
+        return list(coalesced.values())
+        
+    def _apply_orders_batch(self, pending_orders: List[Dict[str, Any]],
+                            order_details: Dict[str, Optional[Dict[str, Any]]],
+                            sync_result: Dict[str, Any],
+                            retry_after: Optional[Dict[str, float]] = None):
+        """
+        Пакетное создание/обновление заказов пачки через safe_order_upsert_many.
+        
+        Заказы, детали которых получить не удалось, сохраняются для повторной обработки.
+        
+        Args:
+            pending_orders: Заказы пачки (результаты _process_data_item)
+            order_details: Полные детали заказов {order_id: детали или None}
+            sync_result: Статистика синхронизации (обновляется на месте)
+            retry_after: Паузы Retry-After неполученных заказов {order_id: секунды}
+        """
+        
+        retry_after = retry_after or {}
+        order_writes = []
+        
+        for pending in pending_orders:
+            order_id = pending["order_id"]
+            order_data_item = pending.get("order_data_item")
+            
+            if order_data_item is None:
+                details = order_details.get(order_id)
+                
+                if not details:
+                    self._save_order_details_failure(pending, sync_result, retry_after.get(order_id))
+                    continue
                     
-                token = token_record.allegro_token
-                logger.info(f"✅ Используется токен {self.token_id} для получения заказов по датам")
+                order_data_item = {
+                    "order": details,
+                    "order_id": order_id,
+                    "source": "full_api_details"
+                }
                 
-            except ValueError:
-                logger.error(f"❌ Некорректный UUID токена: {self.token_id}")
-                return []
+            write_args = self._extract_order_write_args(order_data_item)
+            if not write_args:
+                sync_result["orders_failed"] += 1
+                continue
                 
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Accept": "application/vnd.allegro.public.v1+json"
-            }
+            order_writes.append(write_args)
             
-            # URL для получения заказов (checkout-forms)
-            url = "https://api.allegro.pl/order/checkout-forms"
+        if not order_writes:
+            return
             
-            # Параметры запроса с фильтрацией по датам
-            params = {
-                "limit": 100,  # Максимум 100 заказов за запрос
-                "lineItems.boughtAt.gte": sync_from_date.isoformat(),
-                "sort": "lineItems.boughtAt"  # Сортировка по дате покупки (ascending)
-            }
+        logger.info(f"💾 Пакетная запись {len(order_writes)} заказов")
+        
+        try:
+            results = self.protection_service.safe_order_upsert_many(order_writes)
             
-            if sync_to_date:
-                params["lineItems.boughtAt.lte"] = sync_to_date.isoformat()
-                
-            all_orders = []
-            offset = 0
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетной записи заказов: {e}")
+            sync_result["orders_failed"] += len(order_writes)
+            return
+            
+        for result in results:
+            if result["action"] == "failed":
+                # Ошибка целостности данных (DataIntegrityError при валидации)
+                sync_result["orders_failed"] += 1
+                sync_result["critical_issues"].append(result["message"])
+            else:
+                self._count_order_result(result, sync_result)
             
+    def _save_order_details_failure(self, pending: Dict[str, Any], sync_result: Dict[str, Any],
+                                    retry_after: Optional[float] = None):
+        """
+        Сохранение заказа, детали которого не удалось получить, для повторной обработки.
+        
+        Args:
+            pending: Заказ, ожидающий деталей (результат _process_data_item)
+            sync_result: Статистика синхронизации (обновляется на месте)
+            retry_after: Пауза, которую просит Allegro (Retry-After), в секундах
+        """
+        
+        order_id = pending["order_id"]
+        logger.warning(f"⚠️ Не удалось получить детали заказа {order_id}, сохраняем для повторной обработки")
+        
+        error_message = f"Не удалось получить детали заказа через API после retry"
+        saved = self._save_failed_order(
+            order_id=order_id,
+            action_required=pending["action"],
+            error_message=error_message,
+            error_type="api_fetch_failed",
+            event_data=pending["data_item"],
+            expected_revision=pending["revision"],
+            retry_after=retry_after
+        )
+        
+        if saved:
+            logger.info(f"💾 Заказ {order_id} сохранен для повторной обработки")
+        else:
+            logger.error(f"❌ Не удалось сохранить проблемный заказ {order_id}")
+            
+        sync_result["orders_failed"] += 1
+        
+    def _count_order_result(self, result: Dict[str, Any], sync_result: Dict[str, Any]):
+        """Учет результата обработки заказа в статистике синхронизации"""
+        
+        sync_result["orders_processed"] += 1
+        if result["action"] == "created":
+            sync_result["orders_created"] += 1
+        elif result["action"] == "updated":
+            sync_result["orders_updated"] += 1
+        elif result["action"] == "skipped":
+            sync_result["orders_skipped"] += 1
+            
+    def _check_batch_anomalies(self, data_items: List[Dict[str, Any]], sync_result: Dict[str, Any]):
+        """
+        Анализ качества обработанной пачки данных.
+        
+        Raises:
+            SyncPausedException: При критических аномалиях - дальнейшие страницы не обрабатываются
+        """
+        
+        logger.info(f"🔍 Анализ качества {len(data_items)} событий...")
+        anomalies = self.monitoring_service.detect_data_anomalies(data_items)
+        if anomalies:
+            sync_result["warnings"].extend(anomalies)
+            logger.warning(f"⚠️ Обнаружены аномалии: {anomalies}")
+            
+            # Критические аномалии - останавливаем синхронизацию
+            critical_anomalies = [a for a in anomalies if "🚨" in a]
+            if critical_anomalies:
+                sync_result["critical_issues"] = critical_anomalies
+                raise SyncPausedException(f"Критические аномалии в данных: {critical_anomalies}")
+        
+    def _iter_orders_by_date(self, sync_from_date: datetime, sync_to_date: Optional[datetime] = None,
+                             sync_result: Optional[Dict[str, Any]] = None,
+                             resume: Optional[Dict[str, Any]] = None,
+                             progress: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Получение заказов по датам через Checkout Forms API постранично.
+        
+        Используется когда задана дата sync_from_date - более эффективный способ
+        получения заказов за определенный период.
+        
+        Checkout Forms API не отдает записи дальше offset 10K, поэтому период
+        разбивается на временные окна. Окно, в котором заказов больше лимита
+        offset, делится пополам до тех пор, пока каждое окно не будет выгружено
+        полностью. Страницы отдаются по мере получения: выгрузка идет в фоновом
+        потоке с опережением не больше SYNC_PREFETCH_PAGES страниц (плюс запросы
+        в работе, не больше SYNC_BACKFILL_CONCURRENCY: группа страниц текущего
+        окна и первые страницы следующих окон), запись начинается после первого ответа.
+        
+        Args:
+            sync_from_date: Дата начала синхронизации (обязательно)
+            sync_to_date: Дата окончания синхронизации (опционально)
+            sync_result: Статистика синхронизации для предупреждений о невыгруженных окнах
+            resume: Позиция из checkpoint (оставшиеся окна и offset) для продолжения выгрузки
+            progress: Позиция следующей страницы после каждой отданной страницы (обновляется на месте)
+            
+        Yields:
+            List: Страница заказов с полными данными от Allegro API
+            
+        Raises:
+            httpx.HTTPError: Если окно не удалось выгрузить - синхронизация завершается
+                ошибкой, checkpoint остается на невыгруженном окне
+        """
+        
+        headers = self._get_allegro_headers()
+        if not headers:
+            return
+            
+        range_start = self._as_utc(sync_from_date)
+        range_end = self._as_utc(sync_to_date) if sync_to_date else datetime.now(timezone.utc)
+        start_offset = 0
+        
+        if resume and resume.get("mode") == "checkout_forms" and resume.get("windows"):
+            windows = [
+                (datetime.fromisoformat(window_start), datetime.fromisoformat(window_end))
+                for window_start, window_end in resume["windows"]
+            ]
+            start_offset = resume.get("offset", 0)
+            logger.info(f"⏯️ Продолжение выгрузки: осталось {len(windows)} окон, offset {start_offset}")
+        else:
+            windows = self._plan_backfill_windows(range_start, range_end)
+            logger.info(f"🗓️ Период {range_start} - {range_end} разбит на {len(windows)} окон для выгрузки")
+            
+            if self._progress_reporter is not None and sync_result is not None:
+                # Общее количество заказов периода нужно только для процента и ETA в прогрессе задачи
+                sync_result["orders_expected"] = self._count_orders_in_range(headers, range_start, range_end)
+        
+        failed_windows = []
+        orders_total = 0
+        
+        # Следующие страницы загружаются в фоновом потоке, пока текущая записывается в БД
+        pages = prefetch(
+            self._fetch_backfill_pages(headers, windows, failed_windows, start_offset),
+            settings.sync.prefetch_pages,
+            on_thread_exit=allegro_client.close_thread_loop,
+            name="checkout-forms-prefetch"
+        )
+        
+        try:
+            for orders, page_progress in pages:
+                orders_total += len(orders)
+                if progress is not None:
+                    # Позиция относится к отдаваемой странице, а не к последней предзагруженной
+                    progress.clear()
+                    progress.update(page_progress)
+                
+                # Преобразуем каждый заказ в формат для обработки
+                # НЕ создаем искусственные события - это прямые данные заказов
+                yield [
+                    {
+                        "order": order,  # Полные данные заказа
+                        "order_id": order.get("id"),
+                        "source": "checkout_forms_api"  # Помечаем источник данных
+                    }
+                    for order in orders
+                ]
+                
+        finally:
+            pages.close()
+            
+        for window_start, window_end in failed_windows:
+            warning = f"Окно {window_start.isoformat()} - {window_end.isoformat()} выгружено не полностью"
+            logger.warning(f"⚠️ {warning}")
+            if sync_result is not None:
+                sync_result["warnings"].append(warning)
+                
+        logger.info(f"✅ Всего получено {orders_total} заказов за период {sync_from_date} - {sync_to_date or 'сейчас'}")
+        
+    def _fetch_backfill_pages(self, headers: Dict[str, str], windows: List[Tuple[datetime, datetime]],
+                              failed_windows: List[Tuple[datetime, datetime]],
+                              start_offset: int = 0) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        """
+        Синхронный обход _stream_backfill_pages на event loop текущего потока.
+        
+        Yields:
+            Tuple: Заказы страницы и позиция следующей страницы (для checkpoint)
+        """
+        
+        stream_progress = {}
+        pages = self._stream_backfill_pages(headers, windows, failed_windows, start_offset, stream_progress)
+        
+        try:
             while True:
-                params["offset"] = offset
+                try:
+                    orders = allegro_client.run(pages.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield orders, dict(stream_progress)
                 
-                logger.info(f"🔄 Получение заказов: offset={offset}, limit={params['limit']}")
+        finally:
+            allegro_client.run(pages.aclose())
+            
+    def _count_orders_in_range(self, headers: Dict[str, str], range_start: datetime, range_end: datetime) -> int:
+        """Количество заказов периода по totalCount (запрос одной записи), 0 если неизвестно"""
+        
+        async def fetch_total_count():
+            client = allegro_client.async_client()
+            page = await self._fetch_checkout_forms_page(client, headers, range_start, range_end, 0, limit=1)
+            return page.get("totalCount", 0)
+            
+        try:
+            return allegro_client.run(fetch_total_count())
+        except (httpx.HTTPError, AllegroRetryLater) as e:
+            logger.warning(f"⚠️ Не удалось получить количество заказов за период: {e}")
+            return 0
+            
+    def _report_progress(self, sync_result: Dict[str, Any]) -> None:
+        """Публикация прогресса синхронизации (не чаще интервала TaskProgressReporter)"""
+        
+        if self._progress_reporter is None:
+            return
+            
+        self._progress_reporter.report(
+            sync_result["orders_processed"],
+            sync_result["orders_expected"] or None,
+            sync_history_id=sync_result["sync_history_id"],
+            orders_failed=sync_result["orders_failed"],
+            event_pages_fetched=sync_result["event_pages_fetched"]
+        )
+        
+    @staticmethod
+    def _as_utc(value: datetime) -> datetime:
+        """Приводит дату к UTC (naive даты считаются UTC)"""
+        
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+        
+    def _plan_backfill_windows(self, range_start: datetime, range_end: datetime) -> List[Tuple[datetime, datetime]]:
+        """
+        Разбивает период выгрузки на начальные окна размером SYNC_BACKFILL_WINDOW_DAYS.
+        
+        Args:
+            range_start: Начало периода (UTC)
+            range_end: Конец периода (UTC)
+            
+        Returns:
+            List[Tuple]: Окна (начало, конец), покрывающие период без пропусков
+        """
+        
+        window_size = timedelta(days=max(1, settings.sync.backfill_window_days))
+        windows = []
+        
+        window_start = range_start
+        while window_start < range_end:
+            window_end = min(window_start + window_size, range_end)
+            windows.append((window_start, window_end))
+            window_start = window_end
+            
+        return windows or [(range_start, range_end)]
+        
+    async def _stream_backfill_pages(self, headers: Dict[str, str], windows: List[Tuple[datetime, datetime]],
+                                     failed_windows: List[Tuple[datetime, datetime]], start_offset: int = 0,
+                                     progress: Optional[Dict[str, Any]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Асинхронная выгрузка окон периода через общий пул соединений Allegro API.
+        
+        Страницы отдаются в хронологическом порядке окон (позиция checkpoint -
+        оставшиеся окна и offset в первом из них). Пока отдается текущее окно,
+        первые страницы следующих окон запрашиваются заранее, страницы текущего
+        окна - группами; все запросы делят одно ограничение
+        SYNC_BACKFILL_CONCURRENCY. Окно с totalCount больше лимита offset
+        делится пополам и возвращается в очередь. Окно, на котором запрос
+        завершился ошибкой, повторяется с первой неотданной страницы; после
+        BACKFILL_WINDOW_MAX_ATTEMPTS попыток ошибка пробрасывается, а checkpoint
+        остается на этом окне.
+        
+        Args:
+            headers: Заголовки авторизации
+            windows: Окна периода (результат _plan_backfill_windows)
+            failed_windows: Накопитель окон минимального размера, не выгруженных
+                из-за лимита offset (обновляется на месте)
+            start_offset: Offset первой страницы первого окна (продолжение с checkpoint)
+            progress: Позиция следующей страницы, обновляется перед каждой отданной страницей
+            
+        Yields:
+            List[Dict]: Заказы одной страницы (без повторов между окнами)
+            
+        Raises:
+            httpx.HTTPError: Если окно не удалось выгрузить за BACKFILL_WINDOW_MAX_ATTEMPTS попыток
+        """
+        
+        concurrency = max(1, settings.sync.backfill_concurrency)
+        request_slots = asyncio.Semaphore(concurrency)
+        
+        # Заказ с несколькими товарами может попасть в несколько окон - дедупликация по ID
+        seen_order_ids = set()
+        pending_windows = list(reversed(windows))
+        # Число неудачных попыток выгрузки окна: {окно: попытки}
+        window_failures = {}
+        # Первые страницы следующих окон, запрошенные заранее: {окно: задача}
+        first_page_tasks = {}
+        
+        client = allegro_client.async_client()
+        
+        async def fetch_page(window_start: datetime, window_end: datetime, offset: int) -> Dict[str, Any]:
+            async with request_slots:
+                return await self._fetch_checkout_forms_page(client, headers, window_start, window_end, offset)
                 
-                # Выполняем запрос к Allegro API
-                with httpx.Client() as client:
-                    response = client.get(url, headers=headers, params=params, timeout=30.0)
-                    response.raise_for_status()
-                    
-                    data = response.json()
-                    orders = data.get("checkoutForms", [])
+        def prefetch_first_pages() -> None:
+            # Следующие окна - в конце pending_windows; число запросов в работе ограничивает request_slots
+            for window in pending_windows[-concurrency:]:
+                if window not in first_page_tasks:
+                    first_page_tasks[window] = asyncio.ensure_future(fetch_page(*window, 0))
                     
-                    if not orders:
-                        logger.info("📋 Больше заказов не найдено, завершаем получение")
-                        break
+        try:
+            while pending_windows:
+                window_start, window_end = pending_windows.pop()
+                window_offset, start_offset = start_offset, 0
+                # Offset первой страницы окна, которая еще не отдана
+                resume_offset = window_offset
+                
+                try:
+                    # Заранее запрашивается только offset 0: окно продолжения с checkpoint - первое в очереди
+                    first_page_task = first_page_tasks.pop((window_start, window_end), None)
+                    if first_page_task is not None:
+                        first_page = await first_page_task
+                    else:
+                        first_page = await fetch_page(window_start, window_end, window_offset)
+                    total_count = first_page.get("totalCount", len(first_page.get("checkoutForms", [])))
+                
+                    if total_count > CHECKOUT_FORMS_MAX_OFFSET:
+                        if window_end - window_start > CHECKOUT_FORMS_MIN_WINDOW:
+                            window_middle = window_start + (window_end - window_start) / 2
+                            logger.info(
+                                f"✂️ Окно {window_start} - {window_end} содержит {total_count} заказов "
+                                f"(лимит {CHECKOUT_FORMS_MAX_OFFSET}), делим пополам"
+                            )
+                            pending_windows.append((window_middle, window_end))
+                            pending_windows.append((window_start, window_middle))
+                            window_offset = 0
+                            continue
                         
-                    logger.info(f"📥 Получено {len(orders)} заказов от Allegro API")
+                        logger.error(f"❌ Окно {window_start} - {window_end} минимального размера содержит {total_count} заказов")
+                        failed_windows.append((window_start, window_end))
+                        total_count = CHECKOUT_FORMS_MAX_OFFSET
                     
-                    # Преобразуем каждый заказ в формат для обработки
-                    # НЕ создаем искусственные события - это прямые данные заказов
-                    for order in orders:
-                        order_record = {
-                            "order": order,  # Полные данные заказа
-                            "order_id": order.get("id"),
-                            "source": "checkout_forms_api"  # Помечаем источник данных
-                        }
-                        all_orders.append(order_record)
-                    
-                    # Если получили меньше чем лимит, значит больше данных нет
-                    if len(orders) < params["limit"]:
-                        logger.info("📋 Получены все доступные заказы")
-                        break
+                    next_offset = window_offset + CHECKOUT_FORMS_PAGE_LIMIT
+                    prefetch_first_pages()
+                    self._record_backfill_progress(progress, (window_start, window_end), pending_windows, next_offset, total_count)
+                    yield self._take_unseen_orders(first_page, seen_order_ids)
+                    resume_offset = next_offset
+                
+                    offsets = list(range(next_offset, total_count, CHECKOUT_FORMS_PAGE_LIMIT))
+                    for group_start in range(0, len(offsets), concurrency):
+                        group_offsets = offsets[group_start:group_start + concurrency]
+                        # Все запросы группы дожидаются завершения: ошибка одной страницы
+                        # не оставляет соседние запросы работать вхолостую
+                        pages = await asyncio.gather(*[
+                            fetch_page(window_start, window_end, offset)
+                            for offset in group_offsets
+                        ], return_exceptions=True)
+                        for offset, page in zip(group_offsets, pages):
+                            if isinstance(page, BaseException):
+                                raise page
+                            self._record_backfill_progress(
+                                progress, (window_start, window_end), pending_windows,
+                                offset + CHECKOUT_FORMS_PAGE_LIMIT, total_count
+                            )
+                            yield self._take_unseen_orders(page, seen_order_ids)
+                            resume_offset = offset + CHECKOUT_FORMS_PAGE_LIMIT
                         
-                    offset += params["limit"]
+                    logger.info(f"📥 Окно {window_start} - {window_end}: получено {total_count} заказов")
+                
+                except httpx.HTTPError as e:
+                    failures = window_failures.get((window_start, window_end), 0) + 1
+                    if failures >= BACKFILL_WINDOW_MAX_ATTEMPTS:
+                        logger.error(
+                            f"❌ Окно {window_start} - {window_end} не выгружено за {failures} попыток "
+                            f"(offset {resume_offset}): {e}"
+                        )
+                        raise
+                        
+                    window_failures[(window_start, window_end)] = failures
+                    logger.warning(
+                        f"⚠️ Ошибка при получении заказов за окно {window_start} - {window_end} "
+                        f"(offset {resume_offset}), повтор окна: {e}"
+                    )
+                    # Окно возвращается первым в очередь и продолжается с первой неотданной страницы
+                    pending_windows.append((window_start, window_end))
+                    start_offset = resume_offset
                     
-                    # Защита от бесконечного цикла
-                    if offset > 10000:  # Максимум 10K заказов за раз
-                        logger.warning("⚠️ Достигнут лимит в 10K заказов, прерываем получение")
-                        break
-            
-            logger.info(f"✅ Всего получено {len(all_orders)} заказов за период {sync_from_date} - {sync_to_date or 'сейчас'}")
-            return all_orders
+        finally:
+            # Выгрузка прервана (checkpoint, ошибка) - заранее запрошенные страницы не нужны
+            for task in first_page_tasks.values():
+                task.cancel()
+            await asyncio.gather(*first_page_tasks.values(), return_exceptions=True)
                 
-        except httpx.HTTPStatusError as e:
-            logger.error(f"❌ HTTP ошибка при получении заказов по датам: {e.response.status_code}")
-            logger.error(f"❌ Ответ API: {e.response.text}")
-            return []
+    @staticmethod
+    def _record_backfill_progress(progress: Optional[Dict[str, Any]], window: Tuple[datetime, datetime],
+                                  pending_windows: List[Tuple[datetime, datetime]],
+                                  next_offset: int, total_count: int) -> None:
+        """Позиция следующей страницы: оставшиеся окна в хронологическом порядке и offset в первом из них"""
+        
+        if progress is None:
+            return
             
-        except httpx.TimeoutException:
-            logger.error("❌ Timeout при получении заказов по датам от Allegro API")
-            return []
+        remaining = list(reversed(pending_windows))
+        if next_offset < total_count:
+            remaining.insert(0, window)
+        else:
+            next_offset = 0
             
-        except Exception as e:
-            logger.error(f"❌ Неожиданная ошибка при получении заказов по датам: {e}")
-            return []
+        progress.clear()
+        progress.update({
+            "windows": [[window_start.isoformat(), window_end.isoformat()] for window_start, window_end in remaining],
+            "offset": next_offset
+        })
+        
+    @staticmethod
+    def _take_unseen_orders(page: Dict[str, Any], seen_order_ids: set) -> List[Dict[str, Any]]:
+        """Заказы страницы, которые еще не встречались в соседних окнах"""
+        
+        orders = []
+        for order in page.get("checkoutForms", []):
+            if order.get("id") not in seen_order_ids:
+                seen_order_ids.add(order.get("id"))
+                orders.append(order)
+        return orders
+        
+    async def _fetch_checkout_forms_page(self, client: httpx.AsyncClient, headers: Dict[str, str],
+                                         window_start: datetime, window_end: datetime,
+                                         offset: int, max_retries: int = 3,
+                                         limit: int = CHECKOUT_FORMS_PAGE_LIMIT) -> Dict[str, Any]:
+        """
+        Получение одной страницы GET /order/checkout-forms за окно lineItems.boughtAt.
+        
+        Границы окна включительные - заказы на границе соседних окон
+        дедуплицируются по ID.
+        
+        Raises:
+            httpx.HTTPError: Если все попытки исчерпаны или ошибка постоянная
+            AllegroRetryLater: Если пауза перед повтором слишком долгая для ожидания в воркере
+        """
+        
+        url = "https://api.allegro.pl/order/checkout-forms"
+        params = {
+            "limit": limit,
+            "offset": offset,
+            "lineItems.boughtAt.gte": window_start.isoformat(),
+            "lineItems.boughtAt.lte": window_end.isoformat(),
+            "sort": "lineItems.boughtAt"  # Сортировка по дате покупки (ascending)
+        }
+        
+        for attempt in range(max_retries):
+            try:
+                response = await client.get(url, headers=headers, params=params)
+                response.raise_for_status()
+                return response.json()
+                
+            except httpx.HTTPStatusError as e:
+                if not is_retryable_response(e.response) or attempt == max_retries - 1:
+                    raise
+                wait_time = retry_delay(attempt, e.response)
+                    
+            except RETRYABLE_EXCEPTIONS:
+                if attempt == max_retries - 1:
+                    raise
+                wait_time = retry_delay(attempt)
+                
+            ensure_inline_wait(wait_time, f"checkout-forms offset={offset}")
+            logger.warning(f"⚠️ Временная ошибка получения заказов (offset={offset}), повтор через {wait_time:.1f}с...")
+            await asyncio.sleep(wait_time)
 
     def _get_last_event_id_from_db(self) -> Optional[str]:
         """
-        Получает последний event_id из базы данных для правильной пагинации Events API.
-        Если event_id не найден, получает текущую точку через Allegro API Statistics.
+        Получает точку продолжения Events API из курсора токена (sync_cursors).
+        Если курсора нет, получает текущую точку через Allegro API Statistics.
         
         Returns:
             Optional[str]: Последний event_id или None если ошибка
         """
         try:
-            from sqlmodel import select, desc
-            from app.models.order_event import OrderEvent
-            from uuid import UUID
+            from app.models.sync_cursor import SyncCursor
             
-            # Ищем последнее событие для данного токена (включая специальные события)
-            query = select(OrderEvent).where(
-                OrderEvent.token_id == UUID(self.token_id),
-                OrderEvent.event_id.isnot(None)  # Только события с event_id
-            ).order_by(desc(OrderEvent.occurred_at)).limit(1)
+            # Поиск по первичному ключу вместо сортировки order_events
+            cursor = self.db.get(SyncCursor, UUID(self.token_id))
             
-            last_event = self.db.exec(query).first()
-            
-            if last_event and last_event.event_id:
-                if last_event.order_id == "SYNC_STARTING_POINT":
-                    logger.info(f"🔍 Найден последний event_id стартовой точки в БД: {last_event.event_id}")
-                else:
-                    logger.info(f"🔍 Найден последний event_id в БД: {last_event.event_id}")
-                return last_event.event_id
+            if cursor:
+                logger.info(f"🔍 Найден курсор синхронизации: event_id={cursor.last_event_id}")
+                return cursor.last_event_id
             else:
-                logger.info("🔍 Event_id в БД не найден, получаем текущую точку от Allegro API")
+                logger.info("🔍 Курсор синхронизации не найден, получаем текущую точку от Allegro API")
                 
                 # Получаем текущую точку событий от Allegro API
                 current_event = self._get_current_event_point_from_api()
                 
                 if current_event:
-                    # Сохраняем стартовую точку в БД как специальное событие
-                    self._save_starting_point_event(current_event["event_id"], current_event["occurred_at"])
+                    # Сохраняем стартовую точку как курсор токена
+                    self._save_sync_cursor(current_event["event_id"], current_event["occurred_at"])
                     logger.info(f"🎯 Установлена стартовая точка event_id: {current_event['event_id']}")
                     return current_event["event_id"]
                 else:
@@ -526,64 +1075,40 @@ class OrderSyncService:
         """
         
         try:
-            # Получаем токен пользователя
-            from sqlmodel import select
-            from app.models.user_token import UserToken
-            from uuid import UUID
-            
-            try:
-                token_uuid = UUID(self.token_id)
-                query = select(UserToken).where(
-                    UserToken.id == token_uuid,
-                    UserToken.user_id == self.user_id,
-                    UserToken.is_active == True,
-                    UserToken.expires_at > datetime.utcnow()
-                )
-                
-                token_record = self.db.exec(query).first()
-                if not token_record:
-                    logger.error(f"❌ Токен {self.token_id} недействителен или не принадлежит пользователю {self.user_id}")
-                    return None
-                    
-                token = token_record.allegro_token
-                logger.info(f"✅ Получение текущей точки событий для токена {self.token_id}")
-                
-            except ValueError:
-                logger.error(f"❌ Некорректный UUID токена: {self.token_id}")
+            # Получаем заголовки авторизации по токену пользователя
+            headers = self._get_allegro_headers()
+            if not headers:
                 return None
                 
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Accept": "application/vnd.allegro.public.v1+json"
-            }
+            logger.info(f"✅ Получение текущей точки событий для токена {self.token_id}")
             
             # URL для получения статистики событий
             url = "https://api.allegro.pl/order/event-stats"
             
             # Выполняем запрос к Allegro API
-            with httpx.Client() as client:
-                response = client.get(url, headers=headers, timeout=30.0)
-                response.raise_for_status()
-                
-                data = response.json()
-                latest_event = data.get("latestEvent", {})
-                
-                event_id = latest_event.get("id")
-                occurred_at_str = latest_event.get("occurredAt")
-                
-                if event_id and occurred_at_str:
-                    # Парсим строку даты в объект datetime
-                    try:
-                        occurred_at = datetime.fromisoformat(occurred_at_str.replace("Z", "+00:00"))
-                        logger.info(f"📊 Получена текущая точка событий: id={event_id}, time={occurred_at}")
-                        return {"event_id": event_id, "occurred_at": occurred_at}
-                    except (ValueError, TypeError) as e:
-                        logger.error(f"❌ Ошибка парсинга даты события {occurred_at_str}: {e}")
-                        return None
-                else:
-                    logger.warning("⚠️ В ответе API отсутствует event_id или occurredAt")
+            client = allegro_client.sync_client
+            response = client.get(url, headers=headers)
+            response.raise_for_status()
+            
+            data = response.json()
+            latest_event = data.get("latestEvent", {})
+            
+            event_id = latest_event.get("id")
+            occurred_at_str = latest_event.get("occurredAt")
+            
+            if event_id and occurred_at_str:
+                # Парсим строку даты в объект datetime
+                try:
+                    occurred_at = datetime.fromisoformat(occurred_at_str.replace("Z", "+00:00"))
+                    logger.info(f"📊 Получена текущая точка событий: id={event_id}, time={occurred_at}")
+                    return {"event_id": event_id, "occurred_at": occurred_at}
+                except (ValueError, TypeError) as e:
+                    logger.error(f"❌ Ошибка парсинга даты события {occurred_at_str}: {e}")
                     return None
-                
+            else:
+                logger.warning("⚠️ В ответе API отсутствует event_id или occurredAt")
+                return None
+            
         except httpx.HTTPStatusError as e:
             logger.error(f"❌ HTTP ошибка при получении статистики событий: {e.response.status_code}")
             logger.error(f"❌ Ответ API: {e.response.text}")
@@ -597,9 +1122,41 @@ class OrderSyncService:
             logger.error(f"❌ Неожиданная ошибка при получении статистики событий: {e}")
             return None
 
-    def _save_starting_point_event(self, event_id: str, occurred_at: datetime):
+    def _advance_sync_cursor(self, last_event_id: str, last_occurred_at: Optional[datetime]) -> None:
+        """
+        Продвигает курсор токена в текущей транзакции (без commit).
+        
+        Вызывается вместе с сохранением страницы событий, чтобы курсор
+        и события фиксировались атомарно.
+        
+        Args:
+            last_event_id: ID последнего события страницы
+            last_occurred_at: Время последнего события страницы
+        """
+        
+        from sqlalchemy.dialects.postgresql import insert
+        from app.models.sync_cursor import SyncCursor
+        
+        table = SyncCursor.__table__
+        stmt = insert(table).values(
+            token_id=UUID(self.token_id),
+            last_event_id=last_event_id,
+            last_occurred_at=last_occurred_at,
+            updated_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.token_id],
+            set_={
+                "last_event_id": stmt.excluded.last_event_id,
+                "last_occurred_at": stmt.excluded.last_occurred_at,
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        self.db.exec(stmt)
+        
+    def _save_sync_cursor(self, event_id: str, occurred_at: Optional[datetime]):
         """
-        Сохраняет стартовую точку событий как специальное событие в БД.
+        Сохраняет курсор токена отдельной транзакцией (стартовая точка от Allegro API).
         
         Это позволит в будущем корректно продолжить синхронизацию с этой точки.
         
@@ -608,36 +1165,73 @@ class OrderSyncService:
             occurred_at: Время события (объект datetime)
         """
         
-        from app.models.order_event import OrderEvent
-        
         try:
-            # Создаем специальное событие для маркировки стартовой точки
-            # Используем специальное значение order_id вместо None
-            starting_point_event = OrderEvent(
-                order_id="SYNC_STARTING_POINT",  # Специальное значение вместо None
-                token_id=self.token_id,
-                event_type="SYNC_STARTING_POINT",
-                event_data={
-                    "event_id": event_id,
-                    "purpose": "starting_point_for_incremental_sync",
-                    "created_at": datetime.utcnow().isoformat(),
-                    "source": "allegro_events_statistics_api"
-                },
-                occurred_at=occurred_at,
-                event_id=event_id,  # Сохраняем event_id для пагинации
-                is_duplicate=False
-            )
-            
-            self.db.add(starting_point_event)
+            self._advance_sync_cursor(event_id, occurred_at)
             self.db.commit()
             
-            logger.info(f"📍 Сохранена стартовая точка событий: event_id={event_id}")
+            logger.info(f"📍 Сохранен курсор событий: event_id={event_id}")
             
         except Exception as e:
-            logger.error(f"❌ Ошибка сохранения стартовой точки событий: {e}")
+            logger.error(f"❌ Ошибка сохранения курсора событий: {e}")
             self.db.rollback()
-            # Не прерываем процесс из-за ошибки сохранения стартовой точки
+            # Не прерываем процесс из-за ошибки сохранения курсора
 
+    def _to_event_records(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Простая структура событий для _process_data_items"""
+        
+        return [
+            {
+                "event": event,  # Полное событие как есть от API
+                "order": event.get("order", {}),  # Данные заказа
+                "order_id": self._extract_order_id_from_event(event),  # Простое извлечение order_id
+                "source": "events_api"
+            }
+            for event in events
+        ]
+        
+    def get_event_poll_start(self) -> Optional[Dict[str, Any]]:
+        """
+        Заголовки авторизации и курсор ленты событий токена для внешнего опроса
+        Events API (EventPollerService).
+        
+        Returns:
+            Optional[Dict]: {"headers": {...}, "cursor": event_id или None} или None, если токен недействителен
+        """
+        
+        headers = self._get_allegro_headers()
+        if not headers:
+            return None
+            
+        return {"headers": headers, "cursor": self._get_last_event_id_from_db()}
+        
+    def ingest_events(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Запись страницы событий, полученной вне sync_orders_safe (EventPollerService).
+        
+        События проходят тот же пакетный путь, что и при синхронизации: пакетное
+        сохранение событий с продвижением курсора токена, детали и запись заказов.
+        
+        Args:
+            events: События в формате Allegro Events API
+            
+        Returns:
+            Dict: Счетчики обработки страницы
+            
+        Raises:
+            SyncPausedException: При критических аномалиях в странице
+        """
+        
+        sync_result = {counter: 0 for counter in CHECKPOINT_COUNTERS}
+        sync_result.update({"last_event_id": None, "critical_issues": [], "warnings": []})
+        
+        event_records = self._to_event_records(events)
+        self._process_data_items(event_records, sync_result)
+        self._check_batch_anomalies(event_records, sync_result)
+        
+        if events:
+            sync_result["last_event_id"] = events[-1].get("id")
+        return sync_result
+        
     def _extract_order_id_from_event(self, event: Dict[str, Any]) -> Optional[str]:
         """
         Простое извлечение order_id из события.
@@ -658,60 +1252,190 @@ class OrderSyncService:
             
         return None
 
-    def _fetch_order_events_safe(self, from_event_id: Optional[str] = None, sync_to_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    def _get_access_token(self) -> Optional[str]:
         """
-        Простое получение событий заказов от Allegro API.
+        Действительный access token сервиса.
         
-        Метод только получает события и возвращает их в простом формате.
-        Вся сложная логика обработки событий выполняется в sync_orders_safe.
+        Токен берется из кеша процесса, БД запрашивается только при промахе,
+        после истечения TTL кеша или инвалидации токена.
+        
+        Returns:
+            Optional[str]: Access token или None если токен недействителен
+        """
+        
+        from sqlmodel import select
+        from app.models.user_token import UserToken
+        
+        try:
+            token_uuid = UUID(self.token_id)
+        except ValueError:
+            logger.error(f"❌ Некорректный UUID токена: {self.token_id}")
+            return None
+            
+        def load_token():
+            query = select(UserToken).where(
+                UserToken.id == token_uuid,
+                UserToken.user_id == self.user_id,
+                UserToken.is_active == True,
+                UserToken.expires_at > datetime.utcnow()
+            )
+            token_record = self.db.exec(query).first()
+            if token_record:
+                logger.info(f"✅ Используется токен {self.token_id} для синхронизации")
+            return token_record
+            
+        token = access_token_cache.get_or_load(self.token_id, self.user_id, load_token)
+        if not token:
+            logger.error(f"❌ Токен {self.token_id} недействителен или не принадлежит пользователю {self.user_id}")
+            
+        return token
+
+    def _get_allegro_headers(self) -> Optional[Dict[str, str]]:
+        """
+        Получение заголовков авторизации для запросов к Allegro API по токену сервиса.
+        
+        Returns:
+            Optional[Dict]: Заголовки запроса или None если токен недействителен
+        """
+        
+        token = self._get_access_token()
+        if not token:
+            return None
+            
+        return allegro_client.auth_headers(token)
+
+    def _drain_order_events(self, sync_result: Dict[str, Any], from_event_id: Optional[str] = None,
+                            sync_to_date: Optional[datetime] = None) -> int:
+        """
+        Полная постраничная выгрузка ленты событий заказов (drain Events API).
+        
+        Следует курсору `from` страница за страницей, пока лента не исчерпана,
+        не пересечена sync_to_date или не исчерпан бюджет страниц на один запуск
+        (settings.sync.max_event_pages_per_run). Каждая страница обрабатывается сразу
+        после получения: события сохраняются в БД, поэтому курсор (последний event_id
+        токена) продвигается постранично и следующий запуск продолжит с места остановки.
+        Курсор также пишется в checkpoint SyncHistory: при приближении лимита времени
+        задачи выгрузка останавливается и продолжается новой задачей.
+        До SYNC_PREFETCH_PAGES следующих страниц загружаются в фоновом потоке,
+        пока текущая записывается в БД.
         
         Args:
+            sync_result: Статистика синхронизации (обновляется на месте)
             from_event_id: ID события, с которого начинать извлечение (опционально)
-            sync_to_date: Дата окончания синхронизации - события новее этой даты будут отфильтрованы
+            sync_to_date: Дата окончания синхронизации - события новее этой даты не выгружаются
             
         Returns:
-            List: Простой список событий для обработки в sync_orders_safe
+            int: Количество полученных событий
+            
+        Raises:
+            SyncPausedException: При критических аномалиях в очередной странице
         """
         
+        headers = self._get_allegro_headers()
+        if not headers:
+            return 0
+            
+        if sync_to_date and sync_to_date.tzinfo is None:
+            # Время событий Allegro всегда в UTC с таймзоной
+            sync_to_date = sync_to_date.replace(tzinfo=timezone.utc)
+            
+        max_pages = settings.sync.max_event_pages_per_run
+        cursor = from_event_id
+        events_count = 0
+        page_number = 0
+        
+        # Следующая страница ленты загружается в фоновом потоке, пока текущая записывается в БД
+        pages = prefetch(
+            self._iter_order_events_pages(headers, from_event_id, sync_to_date, max_pages),
+            settings.sync.prefetch_pages,
+            name="order-events-prefetch"
+        )
+        
         try:
-            # Получаем конкретный токен пользователя из базы данных
-            from sqlmodel import select
-            from app.models.user_token import UserToken
-            from datetime import datetime
-            from uuid import UUID
+            for page in pages:
+                page_number += 1
             
-            # Получаем конкретный токен по ID
-            try:
-                token_uuid = UUID(self.token_id)
-                query = select(UserToken).where(
-                    UserToken.id == token_uuid,
-                    UserToken.user_id == self.user_id,
-                    UserToken.is_active == True,
-                    UserToken.expires_at > datetime.utcnow()
-                )
+                if page is None:
+                    sync_result["warnings"].append(f"⚠️ Выгрузка событий прервана на странице {page_number} из-за ошибки API")
+                    break
                 
-                token_record = self.db.exec(query).first()
-                if not token_record:
-                    logger.error(f"❌ Токен {self.token_id} недействителен или не принадлежит пользователю {self.user_id}")
-                    return []
-                    
-                token = token_record.allegro_token
-                logger.info(f"✅ Используется токен {self.token_id} для синхронизации")
+                sync_result["event_pages_fetched"] += 1
+                events = page["events"]
+            
+                if events:
+                    events_count += len(events)
+                    logger.info(f"📄 Страница событий {page_number}: {len(events)} событий (курсор: {cursor})")
+                    self._process_data_items(events, sync_result)
+                    self._check_batch_anomalies(events, sync_result)
                 
-            except ValueError:
-                logger.error(f"❌ Некорректный UUID токена: {self.token_id}")
-                return []
+                if page["last_event_id"]:
+                    cursor = page["last_event_id"]
+                    sync_result["last_event_id"] = cursor
                 
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Accept": "application/vnd.allegro.public.v1+json"
-            }
+                self._save_checkpoint(sync_result, {"mode": "events", "event_cursor": cursor})
+                self._report_progress(sync_result)
+                
+                if not page["has_more"]:
+                    logger.info(f"✅ Лента событий выгружена полностью: {sync_result['event_pages_fetched']} страниц, {events_count} событий")
+                    break
+                
+                if self._deadline_reached():
+                    sync_result["events_backlog_remaining"] = True
+                    self._suspend_sync(sync_result)
+                    break
+            else:
+                # Бюджет страниц исчерпан, а лента еще не закончилась - продолжим в следующем запуске
+                sync_result["events_backlog_remaining"] = True
+                logger.warning(f"⚠️ Исчерпан бюджет {max_pages} страниц событий за запуск, остаток будет выгружен в следующем запуске")
+                
+        finally:
+            pages.close()
+            
+        return events_count
+        
+    def _iter_order_events_pages(self, headers: Dict[str, str], from_event_id: Optional[str],
+                                 sync_to_date: Optional[datetime], max_pages: int) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Страницы ленты событий по курсору `from` (только запросы к API, без БД).
+        
+        Обход завершается после страницы с ошибкой (None), последней страницы
+        ленты или по исчерпании бюджета max_pages.
+        """
+        
+        cursor = from_event_id
+        for _ in range(max_pages):
+            page = self._fetch_order_events_page(headers, from_event_id=cursor, sync_to_date=sync_to_date)
+            yield page
+            
+            if page is None or not page["has_more"]:
+                return
+            if page["last_event_id"]:
+                cursor = page["last_event_id"]
+
+    def _fetch_order_events_page(self, headers: Dict[str, str], from_event_id: Optional[str] = None,
+                                 sync_to_date: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Получение одной страницы событий заказов от Allegro API.
+        
+        Args:
+            headers: Заголовки авторизации
+            from_event_id: ID события, после которого начинать извлечение (опционально)
+            sync_to_date: Дата окончания синхронизации - события новее этой даты отбрасываются
+            
+        Returns:
+            Optional[Dict]: {"events": [...], "last_event_id": str, "has_more": bool} или None при ошибке
             
+        Raises:
+            AllegroRetryLater: Allegro ограничил запросы (429) или лимитер требует долгой паузы
+        """
+        
+        try:
             # URL для получения событий заказов
             url = "https://api.allegro.pl/order/events"
             
             # Параметры запроса
-            params = {"limit": 1000}
+            limit = settings.sync.events_page_limit
+            params = {"limit": limit}
             
             # Используем event ID для пагинации (а не дату)
             if from_event_id:
@@ -719,77 +1443,73 @@ class OrderSyncService:
                 logger.info(f"🔄 Получение событий с event ID: {from_event_id}")
             
             # Выполняем запрос к Allegro API
-            with httpx.Client() as client:
-                response = client.get(url, headers=headers, params=params, timeout=30.0)
-                response.raise_for_status()
-                
-                events_data = response.json()
-                events = events_data.get("events", [])
-                
-                logger.info(f"📥 Получено {len(events)} событий от Allegro API")
-                
-                # Фильтруем события по дате окончания (если указана)
-                if sync_to_date:
-                    filtered_events = []
-                    for event in events:
-                        # Проверяем время события из правильного поля
-                        event_time = None
-                        if "occurredAt" in event:
-                            event_time = datetime.fromisoformat(event["occurredAt"].replace("Z", "+00:00"))
+            client = allegro_client.sync_client
+            response = client.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            
+            events_data = response.json()
+            events = events_data.get("events", [])
+            
+            logger.info(f"📥 Получено {len(events)} событий от Allegro API")
+            
+            # Полная страница - в ленте, вероятно, есть еще события
+            has_more = len(events) >= limit
+            
+            # События идут в хронологическом порядке: обрезаем страницу на первом событии новее sync_to_date
+            if sync_to_date:
+                filtered_events = []
+                for event in events:
+                    event_time = None
+                    if "occurredAt" in event:
+                        event_time = datetime.fromisoformat(event["occurredAt"].replace("Z", "+00:00"))
+                        
+                    if event_time and event_time > sync_to_date:
+                        logger.info(f"🗓️ Достигнута дата окончания {sync_to_date}, выгрузка событий завершена")
+                        has_more = False
+                        break
                         
-                        # Включаем событие только если оно не новее sync_to_date
-                        if event_time and event_time <= sync_to_date:
-                            filtered_events.append(event)
-                        elif not event_time:
-                            # Если время не найдено, включаем событие (безопасный подход)
-                            filtered_events.append(event)
+                    # Если время не найдено, включаем событие (безопасный подход)
+                    filtered_events.append(event)
                     
-                    events = filtered_events
-                    logger.info(f"🗓️ После фильтрации по дате окончания: {len(events)} событий")
-                
-                # Возвращаем события в простом формате
-                # Вся обработка структуры данных теперь в sync_orders_safe
-                simple_events = []
-                
-                for event in events:
-                    # Простая структура для sync_orders_safe
-                    event_record = {
-                        "event": event,  # Полное событие как есть от API
-                        "order": event.get("order", {}),  # Данные заказа
-                        "order_id": self._extract_order_id_from_event(event),  # Простое извлечение order_id
-                        "source": "events_api"
-                    }
-                    simple_events.append(event_record)
-                
-                logger.info(f"✅ Обработано {len(simple_events)} событий для sync_orders_safe")
-                return simple_events
+                events = filtered_events
+            
+            return {
+                "events": self._to_event_records(events),
+                "last_event_id": events[-1].get("id") if events else None,
+                "has_more": has_more
+            }
                 
+        except (AllegroRetryLater, SoftTimeLimitExceeded):
+            raise
+            
         except httpx.HTTPStatusError as e:
+            if e.response.status_code == 429:
+                # Страница еще не обработана - выгрузка продолжится с того же курсора
+                raise AllegroRetryLater(retry_delay(0, e.response), "429 Events API")
+                
             logger.error(f"❌ HTTP ошибка при получении событий: {e.response.status_code}")
             logger.error(f"❌ Ответ API: {e.response.text}")
-            return []
+            return None
             
         except httpx.TimeoutException:
             logger.error("❌ Timeout при получении событий от Allegro API")
-            return []
+            return None
             
         except Exception as e:
             logger.error(f"❌ Неожиданная ошибка при получении событий: {e}")
-            return []
+            return None
             
-    def _process_single_order_safe(self, data_item: Dict[str, Any]) -> Dict[str, Any]:
+            
+    def _extract_order_write_args(self, data_item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
-        Безопасная обработка заказа с полной защитой данных.
-        
-        ВАЖНО: Этот метод ТОЛЬКО обрабатывает заказ. События уже сохраняются в родительском методе!
-        
-        Работает с данными как из Events API (с событиями), так и из Checkout Forms API (без событий).
+        Извлекает из данных заказа аргументы записи: order_id, данные, revision и дату заказа.
         
         Args:
             data_item: Данные заказа (с событием или без)
             
         Returns:
-            Dict: Результат обработки заказа
+            Optional[Dict]: Аргументы safe_order_update / safe_order_upsert_many
+                или None при некорректной структуре
         """
         
         # 🔍 Определяем источник данных и извлекаем информацию
@@ -800,11 +1520,11 @@ class OrderSyncService:
             
             if not order_id or not order_data:
                 logger.error(f"❌ Некорректная структура данных: {data_item}")
-                return {"success": False, "message": "Некорректная структура данных", "action": "failed"}
+                return None
                 
         except (KeyError, AttributeError) as e:
             logger.error(f"❌ Ошибка извлечения данных: {e}")
-            return {"success": False, "message": "Ошибка извлечения данных", "action": "failed"}
+            return None
         
         # 📅 Правильно извлекаем даты в зависимости от источника данных
         try:
@@ -859,30 +1579,23 @@ class OrderSyncService:
         
         logger.info(f"🔄 Обработка заказа {order_id}, revision {revision}, source={source}")
         
-        # 🛡️ Используем защищенное обновление заказа
-        # ПРИМЕЧАНИЕ: OrderProtectionService повторно проверит revision (optimistic locking)
-        # Это нормально - двойная проверка добавляет безопасность против race conditions
-        result = self.protection_service.safe_order_update(
-            order_id=order_id,
-            new_data=order_data,
-            allegro_revision=revision,
-            order_date=order_date
-        )
-        
-        if not result["success"]:
-            logger.warning(f"⚠️ Заказ {order_id} не обновлен: {result['message']}")
-        else:
-            logger.info(f"✅ Заказ {order_id} обработан: {result['action']} (источник: {source})")
-            
-        return result
+        return {
+            "order_id": order_id,
+            "new_data": order_data,
+            "allegro_revision": revision,
+            "order_date": order_date
+        }
         
-    def _create_sync_history_record(self, sync_type: str) -> SyncHistory:
+    def _create_sync_history_record(self, sync_type: str, sync_from_date: Optional[datetime] = None,
+                                    sync_to_date: Optional[datetime] = None) -> SyncHistory:
         """Создание записи о начале синхронизации"""
         
         sync_history = SyncHistory(
             token_id=self.token_id,
             sync_started_at=datetime.utcnow(),
-            sync_status=SyncStatus.RUNNING
+            sync_status=SyncStatus.RUNNING,
+            sync_from_date=sync_from_date,
+            sync_to_date=sync_to_date
         )
         
         self.db.add(sync_history)
@@ -903,14 +1616,110 @@ class OrderSyncService:
         sync_history.orders_updated = sync_result.get("orders_updated", 0)
         sync_history.error_message = error
         
+        if success:
+            # Синхронизация завершена - продолжать нечего
+            sync_history.checkpoint = None
+        
+        self.db.commit()
+        
+    def _resume_from_checkpoint(self, sync_id: str, sync_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Загрузка checkpoint прерванной синхронизации.
+        
+        Счетчики предыдущих запусков переносятся в sync_result, запись
+        SyncHistory продолжает использоваться до завершения синхронизации.
+        
+        Returns:
+            Optional[Dict]: Позиция продолжения или None, если checkpoint нет
+        """
+        
+        from sqlmodel import select
+        
+        sync_history = self.db.exec(
+            select(SyncHistory).where(
+                SyncHistory.id == sync_id,
+                SyncHistory.token_id == self.token_id
+            )
+        ).first()
+        
+        if not sync_history or not sync_history.checkpoint:
+            logger.warning(f"⚠️ Checkpoint синхронизации {sync_id} не найден, синхронизация начнется заново")
+            return None
+            
+        self._sync_history = sync_history
+        sync_result["sync_history_id"] = str(sync_history.id)
+        
+        checkpoint = sync_history.checkpoint
+        for counter in CHECKPOINT_COUNTERS:
+            sync_result[counter] = checkpoint.get("counters", {}).get(counter, 0)
+            
+        logger.info(f"⏯️ Продолжение синхронизации {sync_id} с checkpoint от {sync_history.checkpointed_at}")
+        return checkpoint.get("position")
+        
+    def _save_checkpoint(self, sync_result: Dict[str, Any], position: Dict[str, Any]) -> None:
+        """
+        Сохранение позиции синхронизации после обработанной страницы.
+        
+        Запись SyncHistory создается при первом checkpoint. Позиция указывает
+        на следующую страницу: при продолжении уже записанные заказы
+        пропускаются по ревизии, поэтому повторная выгрузка страницы безопасна.
+        """
+        
+        if self._sync_history is None:
+            self._sync_history = self._create_sync_history_record(
+                sync_result["sync_type"], sync_result["sync_from_date"], sync_result["sync_to_date"]
+            )
+            sync_result["sync_history_id"] = str(self._sync_history.id)
+            
+        self._sync_history.checkpoint = {
+            "position": position,
+            "counters": {counter: sync_result[counter] for counter in CHECKPOINT_COUNTERS}
+        }
+        self._sync_history.checkpointed_at = datetime.utcnow()
+        self._sync_history.orders_processed = sync_result["orders_processed"]
+        self._sync_history.orders_added = sync_result["orders_created"]
+        self._sync_history.orders_updated = sync_result["orders_updated"]
+        
+        self.db.add(self._sync_history)
         self.db.commit()
         
+    def _deadline_reached(self) -> bool:
+        """Пора ли передать синхронизацию следующей задаче (запас до soft time limit или потеря блокировки)"""
+        
+        if self._lease is not None and self._lease.lost:
+            return True
+        return self._deadline is not None and time.monotonic() >= self._deadline
+        
+    def _suspend_sync(self, sync_result: Dict[str, Any]) -> None:
+        """Остановка синхронизации с продолжением в следующей задаче"""
+        
+        sync_result["continuation_required"] = True
+        if self._sync_history is not None:
+            sync_result["sync_history_id"] = str(self._sync_history.id)
+            
+        logger.warning(
+            f"⏳ Синхронизация приостановлена по лимиту времени задачи "
+            f"(обработано {sync_result['orders_processed']} заказов), продолжение с checkpoint"
+        )
+        
+    def _mark_sync_failed(self, sync_result: Dict[str, Any], error: str) -> None:
+        """Запись ошибки синхронизации с сохранением checkpoint для ручного продолжения"""
+        
+        try:
+            self.db.rollback()
+            self._update_sync_history_record(self._sync_history, sync_result, success=False, error=error)
+        except Exception as e:
+            logger.error(f"❌ Не удалось записать ошибку синхронизации: {e}")
+        
     def emergency_restore_from_events(self, order_id: str, 
                                      target_timestamp: Optional[datetime] = None) -> bool:
         """
-        Экстренное восстановление заказа из событий.
+        Экстренное восстановление заказа из истории версий или событий.
         
         Используется для восстановления данных в случае их повреждения.
+        Сначала заказ восстанавливается из последней версии order_revisions
+        до target_timestamp, прошедшей проверку качества (поврежденные версии
+        пропускаются), события используются, если такой версии нет.
         
         Args:
             order_id: ID заказа для восстановления
@@ -921,6 +1730,37 @@ class OrderSyncService:
         """
         
         try:
+            snapshot = next(
+                (
+                    version
+                    for version in self.protection_service.revision_service.iter_versions(order_id, target_timestamp)
+                    if self._is_restorable(version["order_data"])
+                ),
+                None
+            )
+            if snapshot:
+                logger.info(f"🔄 Восстановление заказа {order_id} из версии {snapshot['seq']}")
+                
+                # Без allegro_revision: поврежденные данные могут иметь ту же revision
+                result = self.protection_service.safe_order_update(
+                    order_id=order_id,
+                    new_data=snapshot["order_data"]
+                )
+                
+                if result["success"]:
+                    self.protection_service._save_order_event(
+                        order_id, "ORDER_RESTORED", {
+                            "restored_from_revision_seq": snapshot["seq"],
+                            "restored_at": datetime.utcnow().isoformat(),
+                            "reason": "emergency_restore"
+                        }
+                    )
+                    self.db.commit()
+                    logger.info(f"✅ Заказ {order_id} успешно восстановлен из истории версий")
+                    return True
+                    
+                logger.warning(f"⚠️ Не удалось восстановить заказ {order_id} из истории версий: {result['message']}")
+                
             # Получаем все события заказа
             from sqlmodel import select
             events = self.db.exec(
@@ -976,6 +1816,83 @@ class OrderSyncService:
             logger.error(f"❌ Ошибка при восстановлении заказа {order_id}: {e}")
             return False 
 
+    def _is_restorable(self, order_data: Dict[str, Any]) -> bool:
+        """Проверка качества версии заказа для восстановления (без исключений)"""
+        
+        try:
+            return self.protection_service.validate_order_data_quality(order_data)
+        except DataIntegrityError:
+            return False
+
+    def _get_current_revisions(self, order_ids: List[str]) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Получает текущие revision заказов пачки одним запросом.
+        
+        Проецируется только order_data->>'revision', полный документ заказа не загружается.
+        
+        Args:
+            order_ids: ID заказов в системе Allegro
+            
+        Returns:
+            Optional[Dict]: {order_id: revision} для найденных заказов
+                или None при ошибке (revision проверяется поштучно)
+        """
+        
+        from sqlmodel import select
+        from app.models.order import Order
+        
+        try:
+            query = select(
+                Order.allegro_order_id,
+                Order.order_data["revision"].as_string()
+            ).where(
+                Order.token_id == UUID(self.token_id),
+                Order.allegro_order_id.in_(set(order_ids)),
+                Order.is_deleted == False
+            )
+            
+            current_revisions = {order_id: revision for order_id, revision in self.db.exec(query).all()}
+            
+            logger.info(f"🔎 Найдено {len(current_revisions)} из {len(set(order_ids))} заказов пачки в БД")
+            return current_revisions
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетной проверки revision заказов: {e}")
+            self.db.rollback()
+            return None
+            
+    def _decide_order_action(self, order_id: str, new_revision: str,
+                             current_revisions: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """
+        Решение create/update/skip по заранее загруженным revision (без запроса к БД).
+        
+        Args:
+            order_id: ID заказа в системе Allegro
+            new_revision: Новая revision из события
+            current_revisions: Результат _get_current_revisions
+            
+        Returns:
+            Dict в формате _check_order_needs_update
+        """
+        
+        if order_id not in current_revisions:
+            return {
+                "exists": False,
+                "needs_update": False,
+                "current_revision": None,
+                "action": "create"
+            }
+            
+        current_revision = current_revisions[order_id]
+        needs_update = current_revision != new_revision
+        
+        return {
+            "exists": True,
+            "needs_update": needs_update,
+            "current_revision": current_revision,
+            "action": "update" if needs_update else "skip"
+        }
+        
     def _check_order_needs_update(self, order_id: str, new_revision: str) -> Dict[str, Any]:
         """
         Проверяет существует ли заказ в БД и нужно ли его обновлять по revision.
@@ -1047,106 +1964,241 @@ class OrderSyncService:
                 "action": "create"
             }
 
-    def _get_order_details_from_api(self, order_id: str, max_retries: int = 3) -> Optional[Dict[str, Any]]:
+    def _fetch_order_details_batch(self, order_ids: List[str],
+                                   retry_after: Optional[Dict[str, float]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
         """
-        Получает полные детали заказа через Allegro API с retry механизмом.
+        Получает полные детали пачки заказов конкурентно.
+        
+        Время обработки пачки определяется лимитом параллельных запросов
+        (SYNC_DETAILS_FETCH_CONCURRENCY), а не количеством заказов.
         
         Args:
-            order_id: ID заказа в системе Allegro
-            max_retries: Максимальное количество попыток
+            order_ids: ID заказов в системе Allegro (повторы запрашиваются один раз)
+            retry_after: Накопитель пауз Retry-After заказов, отложенных по просьбе
+                Allegro, {order_id: секунды} (обновляется на месте)
             
         Returns:
-            Dict с деталями заказа или None при ошибке
+            Dict: {order_id: детали заказа или None при ошибке}
         """
-        import time
-        from sqlmodel import select
-        from app.models.user_token import UserToken
-        from uuid import UUID
         
-        # Получаем токен доступа
-        try:
-            token_uuid = UUID(self.token_id)
-            query = select(UserToken).where(
-                UserToken.id == token_uuid,
-                UserToken.user_id == self.user_id,
-                UserToken.is_active == True,
-                UserToken.expires_at > datetime.utcnow()
-            )
+        unique_order_ids = list(dict.fromkeys(order_ids))
+        
+        headers = self._get_allegro_headers()
+        if not headers:
+            return {order_id: None for order_id in unique_order_ids}
             
-            token_record = self.db.exec(query).first()
-            if not token_record:
-                logger.error(f"❌ Токен {self.token_id} недействителен для получения деталей заказа {order_id}")
-                return None
-                
-            token = token_record.allegro_token
+        logger.info(
+            f"🔍 Получение деталей {len(unique_order_ids)} заказов "
+            f"(параллельно до {settings.sync.details_fetch_concurrency})"
+        )
+        
+        return allegro_client.run(self._fetch_order_details_concurrently(unique_order_ids, headers, retry_after=retry_after))
+        
+    async def _fetch_order_details_concurrently(self, order_ids: List[str], headers: Dict[str, str],
+                                                max_retries: int = 3,
+                                                retry_after: Optional[Dict[str, float]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Конкурентное получение деталей заказов через общий пул соединений Allegro API.
+        
+        Args:
+            order_ids: ID заказов в системе Allegro
+            headers: Заголовки авторизации
+            max_retries: Максимальное количество попыток для каждого заказа
+            retry_after: Накопитель пауз Retry-After отложенных заказов (обновляется на месте)
             
-        except ValueError:
-            logger.error(f"❌ Некорректный UUID токена: {self.token_id}")
-            return None
+        Returns:
+            Dict: {order_id: детали заказа или None при ошибке}
+        """
+        
+        concurrency = max(1, settings.sync.details_fetch_concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        client = allegro_client.async_client()
+        results = await asyncio.gather(*[
+            self._fetch_order_details_async(client, semaphore, order_id, headers, max_retries, retry_after)
+            for order_id in order_ids
+        ])
+        
+        return dict(zip(order_ids, results))
+        
+    async def _fetch_order_details_async(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                                         order_id: str, headers: Dict[str, str],
+                                         max_retries: int = 3,
+                                         retry_after: Optional[Dict[str, float]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Получение полных деталей одного заказа через Allegro API.
+        
+        Слот семафора занимается только на время запроса - ожидание backoff
+        не блокирует получение деталей других заказов. Если Allegro просит
+        ждать дольше ALLEGRO_RETRY_MAX_INLINE_WAIT, заказ возвращается как
+        неполученный и уходит в повторную обработку проблемных заказов не
+        раньше запрошенной паузы (она записывается в retry_after).
+        
+        Args:
+            client: Общий HTTP клиент пачки
+            semaphore: Ограничитель параллельных запросов
+            order_id: ID заказа в системе Allegro
+            headers: Заголовки авторизации
+            max_retries: Максимальное количество попыток
+            retry_after: Накопитель пауз Retry-After {order_id: секунды} (обновляется на месте)
             
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/vnd.allegro.public.v1+json"
-        }
+        Returns:
+            Dict с деталями заказа или None при ошибке
+        """
         
         url = f"https://api.allegro.pl/order/checkout-forms/{order_id}"
         
-        # Retry логика с экспоненциальным backoff
         for attempt in range(max_retries):
             try:
-                logger.debug(f"🔍 Получение деталей заказа {order_id} через API (попытка {attempt + 1}/{max_retries})")
-                
-                with httpx.Client() as client:
-                    response = client.get(url, headers=headers, timeout=15.0)
+                async with semaphore:
+                    response = await client.get(url, headers=headers)
                     
-                    if response.status_code == 404:
-                        logger.warning(f"⚠️ Заказ {order_id} не найден в API")
-                        return None
-                        
-                    response.raise_for_status()
-                    order_data = response.json()
-                    
-                    logger.info(f"✅ Получены детали заказа {order_id} (попытка {attempt + 1})")
-                    return order_data
+                if response.status_code == 404:
+                    logger.warning(f"⚠️ Заказ {order_id} не найден в API")
+                    return None
                     
-            except (httpx.ConnectError, httpx.TimeoutException, ConnectionError) as e:
-                # Временные сетевые ошибки - делаем retry
+                response.raise_for_status()
+                
+                logger.info(f"✅ Получены детали заказа {order_id} (попытка {attempt + 1})")
+                return response.json()
+                
+            except AllegroRetryLater as e:
+                logger.warning(f"⏸️ Детали заказа {order_id} будут получены при повторной обработке: {e}")
+                if retry_after is not None:
+                    retry_after[order_id] = e.retry_after
+                return None
+                
+            except RETRYABLE_EXCEPTIONS as e:
                 error_msg = f"Сетевая ошибка при получении деталей заказа {order_id}: {e}"
+                wait_time = retry_delay(attempt)
                 
-                if attempt < max_retries - 1:
-                    # Exponential backoff: 1, 2, 4 секунды
-                    wait_time = 2 ** attempt
-                    logger.warning(f"⚠️ {error_msg}. Повторная попытка через {wait_time}с...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error(f"❌ {error_msg}. Все попытки исчерпаны.")
-                    return None
-                    
             except httpx.HTTPStatusError as e:
-                if e.response.status_code in [429, 500, 502, 503, 504]:
-                    # Временные ошибки сервера - делаем retry
-                    error_msg = f"Временная ошибка API при получении деталей заказа {order_id}: {e.response.status_code}"
-                    
-                    if attempt < max_retries - 1:
-                        wait_time = 2 ** attempt
-                        logger.warning(f"⚠️ {error_msg}. Повторная попытка через {wait_time}с...")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        logger.error(f"❌ {error_msg}. Все попытки исчерпаны.")
-                        return None
-                else:
-                    # Постоянные ошибки (401, 403, 404) - не ретраим
+                if not is_retryable_response(e.response):
+                    # Постоянные ошибки (401, 403) - не ретраим
                     logger.error(f"❌ HTTP ошибка при получении деталей заказа {order_id}: {e.response.status_code}")
                     return None
-                    
+                error_msg = f"Временная ошибка API при получении деталей заказа {order_id}: {e.response.status_code}"
+                wait_time = retry_delay(attempt, e.response)
+                
             except Exception as e:
                 logger.error(f"❌ Неожиданная ошибка при получении деталей заказа {order_id}: {e}")
                 return None
                 
+            if attempt == max_retries - 1:
+                logger.error(f"❌ {error_msg}. Все попытки исчерпаны.")
+            elif wait_time > settings.allegro.retry_max_inline_wait:
+                logger.warning(f"⏸️ {error_msg}. Allegro просит ждать {wait_time:.1f}с - заказ уйдет в повторную обработку")
+                if retry_after is not None:
+                    retry_after[order_id] = wait_time
+                return None
+            else:
+                logger.warning(f"⚠️ {error_msg}. Повторная попытка через {wait_time:.1f}с...")
+                await asyncio.sleep(wait_time)
+                
         return None
 
+    def _save_events_batch(self, events: List[Dict[str, Any]]) -> Optional[Tuple[set, List[Dict[str, Any]]]]:
+        """
+        Сохраняет страницу событий одним multi-row INSERT ... ON CONFLICT DO NOTHING.
+        
+        Дедупликация выполняется уникальными ограничениями order_events
+        (uq_order_events_per_token) в том же запросе: RETURNING возвращает только
+        реально вставленные события. Курсор токена (sync_cursors) продвигается
+        до последнего события страницы в той же транзакции.
+        
+        Args:
+            events: События из Events API
+            
+        Returns:
+            Optional[Tuple]: ID вставленных событий и некорректные события (без
+                order_id), которые не сохранялись; None при ошибке (события будут
+                обработаны поштучно)
+        """
+        
+        from sqlalchemy.dialects.postgresql import insert
+        from uuid import uuid4
+        
+        now = datetime.utcnow()
+        rows = []
+        invalid_events = []
+        
+        for event_data in events:
+            event_info = event_data.get("event", {})
+            
+            if not event_data.get("order_id"):
+                logger.warning(f"⚠️ Событие {event_info.get('id')} без order_id не сохраняется")
+                invalid_events.append(event_data)
+                continue
+                
+            # Парсим дату события
+            occurred_at = self._parse_event_occurred_at(event_info) or now
+                    
+            rows.append({
+                "id": uuid4(),
+                "created_at": now,
+                "updated_at": now,
+                "order_id": event_data.get("order_id"),
+                "token_id": UUID(self.token_id),
+                "event_type": event_info.get("type", "UNKNOWN"),
+                "event_data": event_info,
+                "occurred_at": occurred_at,
+                "event_id": event_info.get("id"),  # Используем allegro_event_id для pagination
+                "is_duplicate": False
+            })
+            
+        last_event = events[-1].get("event", {}) if events else {}
+        
+        if not rows and not last_event.get("id"):
+            return set(), invalid_events
+            
+        try:
+            inserted_event_ids = set()
+            
+            if rows:
+                table = OrderEvent.__table__
+                stmt = (
+                    insert(table)
+                    .values(rows)
+                    .on_conflict_do_nothing()
+                    .returning(table.c.event_id)
+                )
+                inserted_event_ids = set(self.db.exec(stmt).scalars().all())
+                
+            if last_event.get("id"):
+                self._advance_sync_cursor(last_event["id"], self._parse_event_occurred_at(last_event))
+                
+            # Счетчики качества данных - только по реально вставленным событиям
+            self.monitoring_service.record_events(self.token_id, [
+                (row["occurred_at"], row["event_type"], row["event_data"])
+                for row in rows if row["event_id"] in inserted_event_ids
+            ])
+                
+            self.db.commit()
+            
+            logger.info(
+                f"📝 Сохранено {len(inserted_event_ids)} из {len(rows)} событий (остальные - дубликаты), "
+                f"некорректных событий пропущено: {len(invalid_events)}"
+            )
+            return inserted_event_ids, invalid_events
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетного сохранения событий: {e}")
+            self.db.rollback()
+            return None
+            
+    @staticmethod
+    def _parse_event_occurred_at(event_info: Dict[str, Any]) -> Optional[datetime]:
+        """Время события из поля occurredAt или None"""
+        
+        if "occurredAt" not in event_info:
+            return None
+            
+        try:
+            return datetime.fromisoformat(event_info["occurredAt"].replace("Z", "+00:00"))
+        except (ValueError, TypeError, AttributeError):
+            logger.warning(f"⚠️ Не удалось распарсить дату события: {event_info.get('occurredAt')}")
+            return None
+            
     def _save_all_events_to_db(self, event_data: Dict[str, Any]):
         """
         Сохраняет все события в базу данных для полноты audit trail.
@@ -1182,6 +2234,7 @@ class OrderSyncService:
             )
             
             self.db.add(order_event)
+            self.monitoring_service.record_events(self.token_id, [(occurred_at, order_event.event_type, event_info)])
             self.db.commit()
             
             logger.debug(f"📝 Сохранено событие {event_info.get('type')} для заказа {order_id or 'unknown'}")
@@ -1193,7 +2246,7 @@ class OrderSyncService:
     
     def _save_failed_order(self, order_id: str, action_required: str, error_message: str, 
                           error_type: str = "api_error", event_data: Optional[Dict[str, Any]] = None,
-                          expected_revision: Optional[str] = None) -> bool:
+                          expected_revision: Optional[str] = None, retry_after: Optional[float] = None) -> bool:
         """
         Сохраняет проблемный заказ для последующей переобработки.
         
@@ -1204,6 +2257,7 @@ class OrderSyncService:
             error_type: Тип ошибки
             event_data: Данные события
             expected_revision: Ожидаемая revision
+            retry_after: Пауза, которую просит Allegro (Retry-After) - повтор не раньше нее
             
         Returns:
             bool: True если успешно сохранен
@@ -1223,7 +2277,7 @@ class OrderSyncService:
             
             if existing_failed:
                 # Обновляем существующую запись
-                existing_failed.mark_for_retry(error_message, error_type)
+                existing_failed.mark_for_retry(error_message, error_type, retry_after=retry_after)
                 if event_data:
                     existing_failed.event_data = event_data
                 if expected_revision:
@@ -1240,7 +2294,8 @@ class OrderSyncService:
                     error_message=error_message,
                     event_data=event_data,
                     expected_revision=expected_revision,
-                    next_retry_at=datetime.utcnow() + timedelta(minutes=1)  # Первая попытка через 1 минуту
+                    # Первая попытка через 1 минуту или после паузы Retry-After, если она дольше
+                    next_retry_at=datetime.utcnow() + max(timedelta(minutes=1), timedelta(seconds=retry_after or 0))
                 )
                 
                 self.db.add(failed_order)
@@ -1256,7 +2311,10 @@ class OrderSyncService:
     
     def process_failed_orders(self, limit: int = 50) -> Dict[str, Any]:
         """
-        Переобрабатывает проблемные заказы, которые готовы к повторной попытке.
+        Переобрабатывает проблемные заказы токена, которые готовы к повторной попытке.
+        
+        Заказы захватываются через FailedOrderService.claim_due (FOR UPDATE SKIP LOCKED),
+        поэтому одновременный запуск с воркером retry_failed_orders безопасен.
         
         Args:
             limit: Максимальное количество заказов для обработки за раз
@@ -1276,17 +2334,7 @@ class OrderSyncService:
         }
         
         try:
-            from sqlmodel import select
-            from uuid import UUID
-            
-            # Получаем проблемные заказы готовые к повторной обработке
-            query = select(FailedOrderProcessing).where(
-                FailedOrderProcessing.token_id == UUID(self.token_id),
-                FailedOrderProcessing.status == FailedOrderStatus.PENDING,
-                FailedOrderProcessing.next_retry_at <= datetime.utcnow()
-            ).limit(limit)
-            
-            failed_orders = self.db.exec(query).all()
+            failed_orders = FailedOrderService(self.db).claim_due(limit, token_id=self.token_id)
             
             if not failed_orders:
                 logger.info("✅ Проблемных заказов для переобработки не найдено")
@@ -1294,72 +2342,7 @@ class OrderSyncService:
                 
             logger.info(f"🔄 Найдено {len(failed_orders)} проблемных заказов для переобработки")
             
-            for failed_order in failed_orders:
-                try:
-                    result["processed"] += 1
-                    
-                    # Отмечаем как в процессе обработки
-                    failed_order.status = FailedOrderStatus.RETRYING
-                    failed_order.last_retry_at = datetime.utcnow()
-                    self.db.commit()
-                    
-                    logger.info(f"🔄 Переобработка заказа {failed_order.order_id} (попытка {failed_order.retry_count + 1})")
-                    
-                    # Пытаемся получить детали заказа
-                    order_details = self._get_order_details_from_api(failed_order.order_id)
-                    
-                    if order_details:
-                        # Создаем структуру данных для обработки
-                        order_data_item = {
-                            "order": order_details,
-                            "order_id": failed_order.order_id,
-                            "source": "full_api_details"
-                        }
-                        
-                        # Обрабатываем заказ
-                        process_result = self._process_single_order_safe(order_data_item)
-                        
-                        if process_result["success"]:
-                            # Успех - помечаем как разрешенный
-                            failed_order.mark_resolved()
-                            result["resolved"] += 1
-                            logger.info(f"✅ Проблемный заказ {failed_order.order_id} успешно обработан: {process_result['action']}")
-                        else:
-                            # Ошибка обработки
-                            error_msg = f"Ошибка обработки заказа: {process_result.get('message', 'Unknown error')}"
-                            failed_order.mark_for_retry(error_msg, "processing_error")
-                            result["failed"] += 1
-                            
-                            if failed_order.status == FailedOrderStatus.ABANDONED:
-                                result["abandoned"] += 1
-                            
-                    else:
-                        # Не удалось получить детали - отмечаем для retry
-                        failed_order.mark_for_retry("Не удалось получить детали заказа", "api_fetch_failed")
-                        result["failed"] += 1
-                        
-                        if failed_order.status == FailedOrderStatus.ABANDONED:
-                            result["abandoned"] += 1
-                            
-                    self.db.commit()
-                    
-                except Exception as e:
-                    logger.error(f"❌ Ошибка при переобработке заказа {failed_order.order_id}: {e}")
-                    
-                    # Откатываем изменения для этого заказа
-                    self.db.rollback()
-                    
-                    # Пытаемся отметить заказ как проблемный
-                    try:
-                        failed_order.mark_for_retry(f"Неожиданная ошибка: {str(e)}", "unexpected_error")
-                        if failed_order.status == FailedOrderStatus.ABANDONED:
-                            result["abandoned"] += 1
-                        self.db.commit()
-                    except:
-                        pass
-                        
-                    result["failed"] += 1
-                    
+            result.update(self.resolve_failed_orders(failed_orders))
             result["completed_at"] = datetime.utcnow()
             
             logger.info(
@@ -1372,9 +2355,83 @@ class OrderSyncService:
             
         except Exception as e:
             logger.error(f"❌ Критическая ошибка переобработки проблемных заказов: {e}")
+            self.db.rollback()
             result["error"] = str(e)
             return result
             
+    def resolve_failed_orders(self, failed_orders: List[FailedOrderProcessing]) -> Dict[str, int]:
+        """
+        Повторная обработка захваченных проблемных заказов токена одной пачкой.
+        
+        Детали заказов запрашиваются конкурентно (_fetch_order_details_batch),
+        полученные заказы записываются одним safe_order_upsert_many, статусы
+        проблемных заказов сохраняются одним commit.
+        
+        Args:
+            failed_orders: Заказы в статусе RETRYING (FailedOrderService.claim_due)
+            
+        Returns:
+            Dict: processed, resolved, failed, abandoned
+        """
+        
+        result = {"processed": len(failed_orders), "resolved": 0, "failed": 0, "abandoned": 0}
+        if not failed_orders:
+            return result
+            
+        retry_after = {}
+        order_details = self._fetch_order_details_batch(
+            [failed_order.order_id for failed_order in failed_orders], retry_after=retry_after
+        )
+        
+        write_targets = []
+        order_writes = []
+        
+        for failed_order in failed_orders:
+            details = order_details.get(failed_order.order_id)
+            if not details:
+                failed_order.mark_for_retry(
+                    "Не удалось получить детали заказа", "api_fetch_failed",
+                    retry_after=retry_after.get(failed_order.order_id)
+                )
+                continue
+                
+            write_args = self._extract_order_write_args({
+                "order": details,
+                "order_id": failed_order.order_id,
+                "source": "full_api_details"
+            })
+            if not write_args:
+                failed_order.mark_for_retry("Некорректная структура данных заказа", "processing_error")
+                continue
+                
+            write_targets.append(failed_order)
+            order_writes.append(write_args)
+            
+        if order_writes:
+            try:
+                write_results = self.protection_service.safe_order_upsert_many(order_writes)
+            except Exception as e:
+                write_results = [{"success": False, "message": str(e)} for _ in order_writes]
+                
+            for failed_order, write_result in zip(write_targets, write_results):
+                if write_result["success"]:
+                    failed_order.mark_resolved()
+                    result["resolved"] += 1
+                    logger.info(f"✅ Проблемный заказ {failed_order.order_id} успешно обработан: {write_result['action']}")
+                else:
+                    error_msg = f"Ошибка обработки заказа: {write_result.get('message', 'Unknown error')}"
+                    failed_order.mark_for_retry(error_msg, "processing_error")
+                    
+        for failed_order in failed_orders:
+            if failed_order.status == FailedOrderStatus.ABANDONED:
+                result["abandoned"] += 1
+            self.db.add(failed_order)
+            
+        self.db.commit()
+        
+        result["failed"] = result["processed"] - result["resolved"]
+        return result
+        
     def _save_order_event(self, order_id: str, event_type: str, 
                          event_data: Dict[str, Any], occurred_at: Optional[datetime] = None):
         """
@@ -1402,6 +2459,7 @@ class OrderSyncService:
             )
             
             self.db.add(order_event)
+            self.monitoring_service.record_events(self.token_id, [(occurred_at, event_type, event_data)])
             self.db.commit()
             logger.debug(f"📝 Сохранено событие {event_type} для заказа {order_id} в {occurred_at}")
             
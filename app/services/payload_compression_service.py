@@ -0,0 +1,109 @@
+"""
+@file: payload_compression_service.py
+@description: Пересжатие несжатых JSON-документов в колонках CompressedJSON пачками
+@dependencies: CompressedJSON, OrderEvent, TaskHistory, OrderRevision, sqlalchemy
+"""
+
+import logging
+import time
+from typing import Dict, Optional
+from sqlalchemy import LargeBinary, Table, and_, bindparam, func, literal, select, type_coerce, update
+from sqlmodel import Session
+
+from app.core.compressed_json import ZSTD_MAGIC, get_codec
+from app.core.settings import settings
+from app.models.order_event import OrderEvent
+from app.models.order_revision import OrderRevision
+from app.models.task_history import TaskHistory
+
+logger = logging.getLogger(__name__)
+
+# Колонки CompressedJSON: (таблица, колонка)
+COMPRESSED_COLUMNS = (
+    (OrderEvent.__table__, "event_data"),
+    (TaskHistory.__table__, "result"),
+    (OrderRevision.__table__, "data"),
+)
+
+
+class PayloadCompressionService:
+    """
+    Сжатие документов, записанных без zstd (перенесенных миграцией или
+    записанных при выключенном STORAGE_JSON_COMPRESSION).
+
+    Пачка строк захватывается FOR UPDATE SKIP LOCKED и перезаписывается
+    одним executemany в своей транзакции, поэтому пересжатие идет
+    параллельно с работой приложения.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _uncompressed(column):
+        raw = type_coerce(column, LargeBinary)
+        return and_(
+            raw.isnot(None),
+            func.substring(raw, 1, len(ZSTD_MAGIC), type_=LargeBinary) != literal(ZSTD_MAGIC, LargeBinary)
+        )
+
+    def compress_batch(self, table: Table, column_name: str, batch_size: int) -> int:
+        """
+        Сжатие одной пачки документов колонки.
+
+        Returns:
+            int: Количество пересжатых строк (0 - несжатых не осталось)
+        """
+
+        column = table.c[column_name]
+        primary_key = list(table.primary_key.columns)
+
+        rows = self.db.execute(
+            select(*primary_key, column)
+            .where(self._uncompressed(column))
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        if rows:
+            # Документ прочитан через CompressedJSON и записывается им же - уже сжатым
+            stmt = (
+                update(table)
+                .where(*[key == bindparam(f"pk_{key.name}") for key in primary_key])
+                .values({column_name: bindparam("payload", type_=column.type)})
+            )
+            self.db.execute(stmt, [
+                {**{f"pk_{key.name}": row[index] for index, key in enumerate(primary_key)}, "payload": row[-1]}
+                for row in rows
+            ])
+
+        self.db.commit()
+        return len(rows)
+
+    def compress_all(self, deadline: Optional[float] = None) -> Dict[str, int]:
+        """
+        Пересжатие всех колонок до конца или до deadline (time.monotonic()).
+
+        Returns:
+            Dict: {таблица.колонка: количество пересжатых строк}
+        """
+
+        if not settings.storage.json_compression or get_codec() is None:
+            logger.warning("⚠️ Сжатие JSON выключено или пакет zstandard не установлен - пересжатие пропущено")
+            return {}
+
+        batch_size = max(1, settings.storage.compression_batch_size)
+        compressed = {}
+
+        for table, column_name in COMPRESSED_COLUMNS:
+            key = f"{table.name}.{column_name}"
+            compressed[key] = 0
+            while deadline is None or time.monotonic() < deadline:
+                count = self.compress_batch(table, column_name, batch_size)
+                compressed[key] += count
+                if count < batch_size:
+                    break
+
+            logger.info(f"🗜️ {key}: сжато {compressed[key]} документов")
+
+        return compressed
@@ -14,6 +14,12 @@ class PeriodicTaskService:
         self.db = db
 
     def add_periodic_sync_task(self, task_name: str, user_id: str, token_id: str, interval_minutes: int):
+        """
+        Устаревший запуск синхронизации токена отдельной задачей Beat.
+        
+        Автосинхронизация запускается задачей dispatch_due_syncs по таблице
+        active_sync_schedules; метод оставлен для совместимости.
+        """
         # Найти или создать расписание
         schedule = self.db.query(IntervalSchedule).filter_by(every=interval_minutes, period="minutes").first()
         if not schedule:
@@ -44,4 +50,17 @@ class PeriodicTaskService:
             self.db.delete(task)
             self.db.commit()
             return True
-        return False 
\ No newline at end of file
+        return False
+
+    def remove_legacy_sync_tasks(self) -> int:
+        """
+        Удаление задач Beat синхронизации отдельных токенов (до dispatch_due_syncs).
+        
+        Удаление через ORM, чтобы DatabaseScheduler заметил изменение расписания.
+        """
+        tasks = self.db.query(PeriodicTask).filter_by(task="run_order_sync_task").all()
+        for task in tasks:
+            self.db.delete(task)
+        if tasks:
+            self.db.commit()
+        return len(tasks)
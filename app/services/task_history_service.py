@@ -5,15 +5,21 @@
 """
 import json
 import logging
+import time
 from datetime import datetime
 from typing import Optional, Dict, Any
 from uuid import UUID
 
+from sqlalchemy import update
 from sqlmodel import Session, select
+from app.core.settings import settings
 from app.models.task_history import TaskHistory
 
 logger = logging.getLogger(__name__)
 
+# Статусы, в которых задача еще выполняется и может сообщать прогресс
+ACTIVE_TASK_STATUSES = ("PENDING", "STARTED")
+
 class TaskHistoryService:
     def __init__(self, db: Session):
         self.db = db
@@ -107,6 +113,47 @@ class TaskHistoryService:
         self.db.refresh(task)
         return task
 
+    def update_progress(self, task_id: str, progress: Optional[float], details: Dict[str, Any]) -> bool:
+        """
+        Запись прогресса выполняющейся задачи одним UPDATE без загрузки строки.
+        
+        Завершенные и отмененные задачи не изменяются.
+        
+        Returns:
+            bool: True, если запись обновлена
+        """
+        result = self.db.execute(
+            update(TaskHistory)
+            .where(
+                TaskHistory.task_id == task_id,
+                TaskHistory.status.in_(ACTIVE_TASK_STATUSES)
+            )
+            .values(
+                status="STARTED",
+                progress=progress,
+                progress_details=details,
+                updated_at=datetime.utcnow()
+            )
+        )
+        self.db.commit()
+        return result.rowcount > 0
+
+    def get_running_token_ids(self, task_type: str, updated_since: datetime) -> list[str]:
+        """
+        token_id задач типа task_type, которые еще выполняются или ждут повтора.
+        
+        Записи без обновлений с updated_since считаются зависшими (воркер остановлен)
+        и не учитываются.
+        """
+        return self.db.exec(
+            select(TaskHistory.params["token_id"].as_string())
+            .where(
+                TaskHistory.task_type == task_type,
+                TaskHistory.status.in_(ACTIVE_TASK_STATUSES + ("RETRY",)),
+                TaskHistory.updated_at >= updated_since
+            )
+        ).all()
+
     def get_task_by_id(self, task_id: str) -> Optional[TaskHistory]:
         """Получить задачу по task_id"""
         return self.db.exec(select(TaskHistory).where(TaskHistory.task_id == task_id)).first()
@@ -150,9 +197,73 @@ class TaskHistoryService:
             "result": task.result,
             "error": task.error,
             "progress": task.progress,
+            "progress_details": task.progress_details,
             "started_at": task.started_at,
             "finished_at": task.finished_at,
             "updated_at": task.updated_at,
             "params": task.params,
             "description": task.description
-        } 
\ No newline at end of file
+        }
+
+
+class TaskProgressReporter:
+    """
+    Публикация прогресса задачи в TaskHistory не чаще SYNC_PROGRESS_INTERVAL_SECONDS.
+    
+    Скорость считается с первого отчета задачи, поэтому продолжение
+    синхронизации с checkpoint не завышает ее счетчиками прошлых запусков.
+    Ошибка записи прогресса не прерывает задачу.
+    """
+
+    def __init__(self, task_history: TaskHistoryService, task_id: str, interval_seconds: Optional[float] = None):
+        self.task_history = task_history
+        self.task_id = task_id
+        self.interval_seconds = settings.sync.progress_interval_seconds if interval_seconds is None else interval_seconds
+        self._started_at = None
+        self._start_processed = 0
+        self._last_report_at = None
+
+    def report(self, processed: int, total: Optional[int] = None, force: bool = False, **extra) -> bool:
+        """
+        Сообщить прогресс, если с прошлой записи прошло достаточно времени.
+        
+        Args:
+            processed: Обработано элементов (с учетом прошлых запусков)
+            total: Ожидаемое общее количество, если известно
+            force: Записать независимо от интервала
+            **extra: Дополнительные поля деталей прогресса
+            
+        Returns:
+            bool: True, если прогресс записан
+        """
+        now = time.monotonic()
+        if self._started_at is None:
+            self._started_at = now
+            self._start_processed = processed
+
+        if not force and self._last_report_at is not None and now - self._last_report_at < self.interval_seconds:
+            return False
+        self._last_report_at = now
+
+        elapsed = now - self._started_at
+        rate = (processed - self._start_processed) / elapsed if elapsed > 0 else 0.0
+        eta_seconds = None
+        if total and rate > 0:
+            eta_seconds = round(max(0, total - processed) / rate)
+
+        details = {
+            "processed": processed,
+            "total": total,
+            "orders_per_second": round(rate, 2),
+            "eta_seconds": eta_seconds,
+            "reported_at": datetime.utcnow().isoformat(),
+            **extra
+        }
+        progress = min(1.0, processed / total) if total else None
+
+        try:
+            return self.task_history.update_progress(self.task_id, progress, details)
+        except Exception as e:
+            self.task_history.db.rollback()
+            logger.warning(f"⚠️ Не удалось записать прогресс задачи {self.task_id}: {e}")
+            return False
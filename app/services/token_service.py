@@ -14,6 +14,7 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.user_token import UserToken
 from app.exceptions import NotFoundError, ValidationError
 from app.core.logging import get_logger
+from app.core.token_cache import access_token_cache
 from app.models.user_token import UserTokenUpdate
 from app.services.active_sync_schedule_service import ActiveSyncScheduleService
 from app.services.periodic_task_service import PeriodicTaskService
@@ -111,6 +112,8 @@ class TokenService:
             
             self.db_session.add(token)
             await self.db_session.commit()
+            for old_token in old_tokens:
+                await access_token_cache.invalidate_async(old_token.id)
             await self.db_session.refresh(token)
             
             logger.info(f"Token created for user {user_id}")
@@ -283,6 +286,7 @@ class TokenService:
             
             await self.db_session.exec(text(sql).bindparams(**values))
             await self.db_session.commit()
+            await access_token_cache.invalidate_async(token_id)
             
             # Возвращаем обновленный токен
             return await self.get_token(token_id)
@@ -330,6 +334,7 @@ class TokenService:
                 )
             )
             await self.db_session.commit()
+            await access_token_cache.invalidate_async(token_id)
             
             # Проверяем что токен был найден и обновлен
             updated_token = await self.get_token(token_id)
@@ -572,6 +577,7 @@ class TokenService:
             setattr(token, k, v)
         self.db_session.add(token)
         self.db_session.commit()
+        access_token_cache.invalidate(token_id)
         self.db_session.refresh(token)
         logger.info(f"[SYNC] Token {token_id} updated")
         return token 
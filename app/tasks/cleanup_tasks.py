@@ -4,8 +4,14 @@
 @dependencies: celery
 """
 
+import time
+
 from app.celery_app import celery_app
+from app.core.database import get_sync_db_session_direct
 from app.core.logging import get_logger
+from app.core.settings import settings
+from app.services.data_monitoring_service import DataMonitoringService
+from app.services.payload_compression_service import PayloadCompressionService
 
 logger = get_logger(__name__)
 
@@ -25,4 +31,41 @@ def cleanup_old_order_events():
     logger.info("Starting order events cleanup task")
     # TODO: Реализовать очистку старых order_events
     logger.info("Order events cleanup task completed")
-    return {"status": "completed", "events_deleted": 0} 
\ No newline at end of file
+    return {"status": "completed", "events_deleted": 0}
+
+
+@celery_app.task
+def cleanup_data_health_counters():
+    """Удаление устаревших интервалов счетчиков качества данных"""
+    db = get_sync_db_session_direct()
+    try:
+        counters_deleted = DataMonitoringService(db).purge_health_counters()
+    finally:
+        db.close()
+    logger.info(f"Data health counters cleanup completed: {counters_deleted} buckets deleted")
+    return {"status": "completed", "counters_deleted": counters_deleted}
+
+
+@celery_app.task(bind=True)
+def compress_json_payloads(self):
+    """
+    Сжатие JSON-документов, записанных без zstd (после миграции или включения сжатия).
+    
+    Запускается вручную; если не успевает до soft time limit, ставит в очередь свое продолжение.
+    """
+    soft_time_limit = self.app.conf.task_soft_time_limit
+    deadline = None
+    if soft_time_limit:
+        deadline = time.monotonic() + max(0, soft_time_limit - settings.sync.time_limit_margin_seconds)
+    
+    db = get_sync_db_session_direct()
+    try:
+        compressed = PayloadCompressionService(db).compress_all(deadline)
+    finally:
+        db.close()
+    
+    continued = deadline is not None and time.monotonic() >= deadline
+    if continued:
+        compress_json_payloads.delay()
+    logger.info(f"JSON payload compression completed: {compressed}, continued: {continued}")
+    return {"status": "completed", "compressed": compressed, "continued": continued}
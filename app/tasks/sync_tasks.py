@@ -4,24 +4,55 @@
 @dependencies: celery_app, OrderSyncService, TaskHistoryService
 """
 from celery import shared_task
-from datetime import datetime
+from celery.exceptions import Retry
+from datetime import datetime, timedelta
 from typing import Optional
+import random
+import time
 from app.services.order_sync_service import OrderSyncService
-from app.core.database import get_sync_db_session_direct
-from app.services.task_history_service import TaskHistoryService
+from app.core.database import get_sync_db_session_direct, get_alchemy_session
+from app.core.settings import settings
+from app.core.sync_lock import token_sync_lock
+from app.services.task_history_service import TaskHistoryService, TaskProgressReporter
+from app.services.active_sync_schedule_service import ActiveSyncScheduleService
+from app.services.periodic_task_service import PeriodicTaskService
+from app.services.failed_order_service import FailedOrderService
+from app.models.failed_order_processing import FailedOrderStatus
 import logging
 
 logger = logging.getLogger(__name__)
 
-@shared_task(bind=True, name="run_order_sync_task")
-def run_order_sync_task(self, user_id: str, token_id: str, sync_from_date: Optional[str] = None, force_full_sync: bool = False):
+# Максимум откладываний синхронизации из-за пауз Allegro (429/Retry-After)
+MAX_SYNC_DEFERRALS = 10
+
+
+def _sync_deadline(task) -> Optional[float]:
+    """Момент time.monotonic(), когда синхронизацию нужно передать следующей задаче"""
+    timelimit = task.request.timelimit or (None, None)
+    soft_time_limit = timelimit[1] or task.app.conf.task_soft_time_limit
+    if not soft_time_limit:
+        return None
+    return time.monotonic() + max(0, soft_time_limit - settings.sync.time_limit_margin_seconds)
+
+
+@shared_task(bind=True, name="run_order_sync_task", max_retries=MAX_SYNC_DEFERRALS)
+def run_order_sync_task(self, user_id: str, token_id: str, sync_from_date: Optional[str] = None, force_full_sync: bool = False,
+                        sync_history_id: Optional[str] = None, parent_task_id: Optional[str] = None):
     """
     Celery задача для асинхронной синхронизации заказов Allegro.
+    
+    Перед soft time limit синхронизация сохраняет checkpoint и продолжается
+    новой задачей с тем же sync_history_id (цепочка связана через parent_task_id).
+    Одновременно токен синхронизирует только одна цепочка задач (блокировка в Redis):
+    новая синхронизация при занятой блокировке пропускается и возвращает ID
+    выполняющейся задачи, а продолжение с checkpoint откладывается.
     Args:
         user_id: ID пользователя
         token_id: ID токена
         sync_from_date: дата начала синхронизации (ISO str)
         force_full_sync: принудительная полная синхронизация
+        sync_history_id: ID записи SyncHistory, с checkpoint которой продолжить
+        parent_task_id: ID первой задачи цепочки продолжений
     Returns:
         dict: результат синхронизации
     """
@@ -31,7 +62,8 @@ def run_order_sync_task(self, user_id: str, token_id: str, sync_from_date: Optio
         "user_id": user_id,
         "token_id": token_id,
         "sync_from_date": sync_from_date,
-        "force_full_sync": force_full_sync
+        "force_full_sync": force_full_sync,
+        "sync_history_id": sync_history_id
     }
     # 1. Создаём запись о задаче (если не существует)
     task_history.create_task(
@@ -39,8 +71,30 @@ def run_order_sync_task(self, user_id: str, token_id: str, sync_from_date: Optio
         user_id=user_id,
         task_type="order_sync",
         params=params,
-        description="Синхронизация заказов Allegro"
+        description="Синхронизация заказов Allegro" if not sync_history_id else "Продолжение синхронизации заказов Allegro",
+        parent_task_id=parent_task_id
     )
+    lease = token_sync_lock.acquire(token_id, owner=parent_task_id or self.request.id)
+    if lease is None:
+        running_task_id = token_sync_lock.holder(token_id)
+        if sync_history_id and self.request.retries < self.max_retries:
+            # Checkpoint нельзя потерять - повторим после истечения чужого lease
+            logger.warning(f"[Celery] Токен {token_id} синхронизирует задача {running_task_id}, продолжение отложено")
+            task_history.update_task(task_id=self.request.id, status="RETRY", error=None)
+            db_session.close()
+            raise self.retry(countdown=settings.sync.lock_ttl_seconds)
+        logger.info(f"[Celery] Синхронизация token_id={token_id} пропущена: уже выполняется задача {running_task_id}")
+        skipped = {"skipped": True, "running_task_id": running_task_id}
+        task_history.update_task(
+            task_id=self.request.id,
+            status="SKIPPED",
+            result=skipped,
+            error=None,
+            finished=True
+        )
+        db_session.close()
+        return {"success": True, "statistics": skipped, "error": None}
+    handed_over = False
     try:
         logger.info(f"[Celery] Запуск синхронизации для user_id={user_id}, token_id={token_id}, sync_from_date={sync_from_date}, force_full_sync={force_full_sync}")
         sync_service = OrderSyncService(db_session, user_id, token_id)
@@ -49,8 +103,52 @@ def run_order_sync_task(self, user_id: str, token_id: str, sync_from_date: Optio
             dt_from = datetime.fromisoformat(sync_from_date)
         result = sync_service.sync_orders_safe(
             full_sync=force_full_sync,
-            sync_from_date=dt_from
+            sync_from_date=dt_from,
+            resume_sync_id=sync_history_id,
+            deadline=_sync_deadline(self),
+            # Прогресс пишется после checkpoint страницы, когда сессия уже зафиксирована
+            progress_reporter=TaskProgressReporter(task_history, self.request.id),
+            lease=lease
         )
+        if result.get("continuation_required"):
+            # Лимит времени задачи близко - продолжаем с checkpoint в новой задаче
+            next_task = run_order_sync_task.apply_async(kwargs={
+                "user_id": user_id,
+                "token_id": token_id,
+                "sync_from_date": sync_from_date,
+                "force_full_sync": force_full_sync,
+                "sync_history_id": result["sync_history_id"],
+                "parent_task_id": parent_task_id or self.request.id
+            })
+            logger.info(f"[Celery] Синхронизация token_id={token_id} продолжится в задаче {next_task.id}")
+            # Lease не освобождается: до захвата продолжением (тот же владелец) его держит TTL
+            lease.stop_heartbeat()
+            handed_over = True
+            task_history.update_task(
+                task_id=self.request.id,
+                status="SUCCESS",
+                result=result,
+                error=None,
+                finished=True
+            )
+            db_session.close()
+            return {"success": True, "statistics": result, "error": None, "continuation_task_id": next_task.id}
+        if result.get("retry_after_seconds") is not None and self.request.retries < self.max_retries:
+            # Allegro просит подождать - вместо sleep в воркере перезапускаем задачу с countdown
+            countdown = max(1, int(result["retry_after_seconds"]) + 1)
+            logger.warning(f"[Celery] Синхронизация отложена на {countdown} сек для token_id={token_id}")
+            task_history.update_task(
+                task_id=self.request.id,
+                status="RETRY",
+                result=result,
+                error=None
+            )
+            db_session.close()
+            # Повтор продолжает ту же запись SyncHistory, если checkpoint уже сохранен
+            raise self.retry(
+                countdown=countdown,
+                kwargs={**self.request.kwargs, "sync_history_id": result.get("sync_history_id") or sync_history_id}
+            )
         logger.info(f"[Celery] Синхронизация завершена для user_id={user_id}, token_id={token_id}")
         # 2. Обновляем запись о задаче (успех)
         task_history.update_task(
@@ -62,6 +160,8 @@ def run_order_sync_task(self, user_id: str, token_id: str, sync_from_date: Optio
         )
         db_session.close()
         return {"success": result["success"], "statistics": result, "error": None}
+    except Retry:
+        raise
     except Exception as e:
         logger.error(f"[Celery] Ошибка синхронизации: {e}")
         # 3. Обновляем запись о задаче (ошибка)
@@ -73,4 +173,173 @@ def run_order_sync_task(self, user_id: str, token_id: str, sync_from_date: Optio
             finished=True
         )
         db_session.close()
-        return {"success": False, "statistics": None, "error": str(e)} 
\ No newline at end of file
+        return {"success": False, "statistics": None, "error": str(e)}
+    finally:
+        if not handed_over:
+            lease.release()
+
+
+# Задачи Beat отдельных токенов удаляются один раз за процесс после перехода на диспетчер
+_legacy_sync_tasks_removed = False
+
+
+def _remove_legacy_sync_tasks():
+    global _legacy_sync_tasks_removed
+    if _legacy_sync_tasks_removed:
+        return
+    alchemy_db = get_alchemy_session()
+    try:
+        removed = PeriodicTaskService(alchemy_db).remove_legacy_sync_tasks()
+        if removed:
+            logger.info(f"[Celery] Удалено {removed} задач Beat синхронизации отдельных токенов")
+        _legacy_sync_tasks_removed = True
+    except Exception as e:
+        logger.warning(f"[Celery] Не удалось удалить задачи Beat отдельных токенов: {e}")
+    finally:
+        alchemy_db.close()
+
+
+@shared_task(bind=True, name="dispatch_due_syncs")
+def dispatch_due_syncs(self):
+    """
+    Запуск автосинхронизаций токенов, интервал которых истек.
+    
+    Одна задача Beat читает active_sync_schedules и ставит в очередь
+    run_order_sync_task для просроченных токенов:
+    - не больше SYNC_DISPATCH_MAX_CONCURRENT синхронизаций одновременно
+      (с учетом уже выполняющихся), самые просроченные - первыми;
+    - токены с выполняющейся синхронизацией пропускаются;
+    - запуск сдвигается на случайную задержку до SYNC_DISPATCH_JITTER_SECONDS,
+      чтобы токены с одинаковым интервалом не стартовали одновременно;
+    - last_run_at запущенных расписаний обновляется одним UPDATE.
+    Returns:
+        dict: количество запущенных синхронизаций и свободных слотов
+    """
+    _remove_legacy_sync_tasks()
+    
+    db_session = get_sync_db_session_direct()
+    try:
+        now = datetime.utcnow()
+        task_history = TaskHistoryService(db_session)
+        schedule_service = ActiveSyncScheduleService(db_session)
+        
+        # Задачи без обновлений дольше hard time limit считаются зависшими
+        stale_after = timedelta(seconds=self.app.conf.task_time_limit or 30 * 60)
+        running_token_ids = set(task_history.get_running_token_ids("order_sync", now - stale_after))
+        free_slots = settings.sync.dispatch_max_concurrent - len(running_token_ids)
+        
+        due_schedules = schedule_service.get_due(now, free_slots, exclude_token_ids=running_token_ids)
+        if not due_schedules:
+            db_session.rollback()
+            return {"dispatched": 0, "free_slots": max(0, free_slots)}
+        
+        jitter = max(0, settings.sync.dispatch_jitter_seconds)
+        for schedule in due_schedules:
+            run_order_sync_task.apply_async(
+                kwargs={
+                    "user_id": schedule.user_id,
+                    "token_id": schedule.token_id,
+                    "force_full_sync": False
+                },
+                countdown=random.uniform(0, jitter) if jitter else None
+            )
+        
+        # Снимает блокировку FOR UPDATE SKIP LOCKED выбранных расписаний
+        schedule_service.mark_run([schedule.id for schedule in due_schedules], now)
+        logger.info(f"[Celery] Запущено {len(due_schedules)} автосинхронизаций (выполняется: {len(running_token_ids)})")
+        return {"dispatched": len(due_schedules), "free_slots": free_slots - len(due_schedules)}
+    finally:
+        db_session.close()
+
+
+@shared_task(bind=True, name="dispatch_failed_order_retries")
+def dispatch_failed_order_retries(self):
+    """
+    Запуск воркеров повторной обработки проблемных заказов.
+    
+    Ставит в очередь не больше SYNC_FAILED_RETRY_WORKERS задач retry_failed_orders -
+    по одной на каждые SYNC_FAILED_RETRY_BATCH_SIZE готовых заказов. Задачи,
+    не начатые до следующего запуска диспетчера, отбрасываются (expires).
+    Returns:
+        dict: количество готовых заказов и запущенных воркеров
+    """
+    workers = max(0, settings.sync.failed_retry_workers)
+    batch_size = max(1, settings.sync.failed_retry_batch_size)
+    
+    db_session = get_sync_db_session_direct()
+    try:
+        due = FailedOrderService(db_session).count_due(workers * batch_size)
+    finally:
+        db_session.close()
+    
+    started = min(workers, -(-due // batch_size))
+    for _ in range(started):
+        retry_failed_orders.apply_async(expires=settings.sync.failed_retry_interval_seconds)
+    
+    if started:
+        logger.info(f"[Celery] Запущено {started} воркеров повторной обработки ({due} готовых заказов)")
+    return {"due": due, "workers": started}
+
+
+@shared_task(bind=True, name="retry_failed_orders")
+def retry_failed_orders(self):
+    """
+    Воркер повторной обработки проблемных заказов всех токенов.
+    
+    Захватывает пачки через FailedOrderService.claim_due (FOR UPDATE SKIP LOCKED),
+    поэтому несколько воркеров работают параллельно без пересечений. Пачка
+    группируется по токенам, заказы каждого токена обрабатываются одним
+    OrderSyncService.resolve_failed_orders. Воркер завершается, когда готовых
+    заказов не осталось или близок soft time limit.
+    Returns:
+        dict: суммарная статистика обработки
+    """
+    totals = {"processed": 0, "resolved": 0, "failed": 0, "abandoned": 0}
+    deadline = _sync_deadline(self)
+    batch_size = max(1, settings.sync.failed_retry_batch_size)
+    
+    db_session = get_sync_db_session_direct()
+    try:
+        failed_order_service = FailedOrderService(db_session)
+        while deadline is None or time.monotonic() < deadline:
+            claimed = failed_order_service.claim_due(batch_size)
+            if not claimed:
+                break
+            
+            by_token = {}
+            for failed_order in claimed:
+                by_token.setdefault(failed_order.token_id, []).append(failed_order)
+            owners = failed_order_service.get_token_owners(by_token)
+            
+            for token_id, failed_orders in by_token.items():
+                user_id = owners.get(str(token_id))
+                if user_id is None:
+                    # Токен удален - заказы будут отброшены после max_retries
+                    for failed_order in failed_orders:
+                        failed_order.mark_for_retry("Токен не найден", "token_not_found")
+                        db_session.add(failed_order)
+                        if failed_order.status == FailedOrderStatus.ABANDONED:
+                            totals["abandoned"] += 1
+                    db_session.commit()
+                    totals["processed"] += len(failed_orders)
+                    totals["failed"] += len(failed_orders)
+                    continue
+                
+                try:
+                    result = OrderSyncService(db_session, user_id, str(token_id)).resolve_failed_orders(failed_orders)
+                except Exception as e:
+                    # Захват истечет через SYNC_FAILED_RETRY_CLAIM_TIMEOUT_SECONDS
+                    logger.error(f"[Celery] Ошибка повторной обработки заказов токена {token_id}: {e}")
+                    db_session.rollback()
+                    continue
+                for key in totals:
+                    totals[key] += result[key]
+        
+        if totals["processed"]:
+            logger.info(
+                f"[Celery] Повторная обработка: обработано {totals['processed']}, "
+                f"разрешено {totals['resolved']}, отброшено {totals['abandoned']}"
+            )
+        return totals
+    finally:
+        db_session.close()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+@file: scripts/train_zstd_dictionary.py
+@description: Обучение словаря zstd на checkout forms из таблицы orders (для STORAGE_ZSTD_DICTIONARY_PATH)
+@dependencies: zstandard, sqlmodel
+"""
+
+import sys
+from pathlib import Path
+
+# Добавляем путь к приложению
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from sqlmodel import select
+
+from app.core.compressed_json import DEFAULT_DICTIONARY_SIZE, train_dictionary
+from app.core.database import get_sync_db_session_direct
+from app.core.logging import setup_logging, get_logger
+from app.models.order import Order
+
+# Настройка логирования
+setup_logging()
+logger = get_logger(__name__)
+
+
+def train(output: str, samples: int, dict_size: int) -> None:
+    """
+    Обучает словарь на order_data последних заказов и записывает его в файл.
+
+    Словарь нельзя менять для уже сжатых документов: новый словарь
+    записывается в новый файл, а STORAGE_ZSTD_DICTIONARY_PATH переключается
+    после пересжатия (compress_json_payloads).
+
+    Args:
+        output: Путь к файлу словаря
+        samples: Количество заказов для обучения
+        dict_size: Размер словаря в байтах
+    """
+    db = get_sync_db_session_direct()
+    try:
+        documents = db.exec(
+            select(Order.order_data).order_by(Order.updated_at.desc()).limit(samples)
+        ).all()
+    finally:
+        db.close()
+
+    if not documents:
+        logger.error("No orders found for dictionary training")
+        sys.exit(1)
+
+    dictionary = train_dictionary(documents, dict_size=dict_size)
+    Path(output).write_bytes(dictionary)
+    logger.info(f"Dictionary trained on {len(documents)} orders: {output} ({len(dictionary)} bytes)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train zstd dictionary on Allegro checkout forms")
+    parser.add_argument("output", help="Dictionary file path")
+    parser.add_argument("--samples", type=int, default=10000, help="Number of orders to sample")
+    parser.add_argument("--dict-size", type=int, default=DEFAULT_DICTIONARY_SIZE, help="Dictionary size in bytes")
+
+    args = parser.parse_args()
+    train(args.output, args.samples, args.dict_size)
@@ -1,11 +1,15 @@
 """
 @file: tests/unit/test_allegro_auth_service_sync.py
 @description: Unit-тесты для sync-методов AllegroAuthService
-@dependencies: pytest, unittest.mock, AllegroAuthService, requests
+@dependencies: pytest, unittest.mock, httpx, AllegroAuthService
 """
 import pytest
+import httpx
+from contextlib import contextmanager
 from unittest.mock import patch, MagicMock
 from datetime import datetime, timedelta
+from app.core.settings import settings
+from app.core.allegro_client import AllegroApiClient
 from app.services.allegro_auth_service import AllegroAuthService
 from app.models.user_token import UserToken
 from app.exceptions import ValidationError, InternalServerErrorHTTPException
@@ -15,113 +19,112 @@ class DummySession:
 
 @pytest.fixture
 def service():
-    return AllegroAuthService(DummySession())
+    service = AllegroAuthService(DummySession())
+    service.token_service = MagicMock()
+    return service
 
-@patch('app.services.allegro_auth_service.requests.post')
-def test_initialize_device_flow_sync_success(mock_post, service):
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = {
+@contextmanager
+def mock_allegro_client(handler):
+    client = AllegroApiClient()
+    options = client._client_options()
+    client._client_options = lambda: {**options, "transport": httpx.MockTransport(handler)}
+    with patch("app.services.allegro_auth_service.allegro_client", client), \
+         patch.object(settings.allegro, "rate_limit_enabled", False):
+        yield client
+    client.close()
+
+def respond(status_code, json=None, text=None, requests=None):
+    def handler(request):
+        if requests is not None:
+            requests.append(request)
+        if json is not None:
+            return httpx.Response(status_code, json=json)
+        return httpx.Response(status_code, text=text or "")
+    return handler
+
+def make_token():
+    return UserToken(id=1, user_id='user1', allegro_token='tok', refresh_token='refresh', expires_at=datetime.utcnow())
+
+def test_initialize_device_flow_sync_success(service):
+    requests = []
+    handler = respond(200, json={
         'device_code': 'dev123',
         'user_code': 'user123',
         'verification_uri': 'https://allegro.pl/auth',
         'expires_in': 600
-    }
-    mock_post.return_value = mock_response
-    result = service.initialize_device_flow_sync('user1')
+    }, requests=requests)
+    with mock_allegro_client(handler):
+        result = service.initialize_device_flow_sync('user1')
     assert result['device_code'] == 'dev123'
     assert 'expires_at_iso' in result
+    assert requests[0].method == 'POST'
+    assert str(requests[0].url) == service.auth_url
+    assert requests[0].headers['Authorization'].startswith('Basic ')
+
+def test_initialize_device_flow_sync_fail(service):
+    with mock_allegro_client(respond(400, text='Bad Request')):
+        with pytest.raises(ValidationError):
+            service.initialize_device_flow_sync('user1')
+
+def test_initialize_device_flow_sync_network_error(service):
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+    with mock_allegro_client(handler):
+        with pytest.raises(ValidationError):
+            service.initialize_device_flow_sync('user1')
 
-@patch('app.services.allegro_auth_service.requests.post')
-def test_initialize_device_flow_sync_fail(mock_post, service):
-    mock_response = MagicMock()
-    mock_response.status_code = 400
-    mock_response.text = 'Bad Request'
-    mock_post.return_value = mock_response
-    with pytest.raises(ValidationError):
-        service.initialize_device_flow_sync('user1')
-
-@patch('app.services.allegro_auth_service.requests.post')
-@patch.object(AllegroAuthService, 'token_service')
-def test_check_auth_status_sync_completed(mock_token_service, mock_post, service):
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = {
+def test_check_auth_status_sync_completed(service):
+    handler = respond(200, json={
         'access_token': 'token',
         'refresh_token': 'refresh',
         'expires_in': 3600
-    }
-    mock_post.return_value = mock_response
-    mock_token_service.create_token_sync = MagicMock()
-    result = service.check_auth_status_sync('devcode', 'user1')
+    })
+    with mock_allegro_client(handler):
+        result = service.check_auth_status_sync('devcode', 'user1', 'account')
     assert result['status'] == 'completed'
-    mock_token_service.create_token_sync.assert_called_once()
-
-@patch('app.services.allegro_auth_service.requests.post')
-def test_check_auth_status_sync_pending(mock_post, service):
-    mock_response = MagicMock()
-    mock_response.status_code = 400
-    mock_response.json.return_value = {'error': 'authorization_pending'}
-    mock_post.return_value = mock_response
-    result = service.check_auth_status_sync('devcode', 'user1')
+    service.token_service.create_token_sync.assert_called_once()
+
+def test_check_auth_status_sync_pending(service):
+    with mock_allegro_client(respond(400, json={'error': 'authorization_pending'})):
+        result = service.check_auth_status_sync('devcode', 'user1', 'account')
     assert result['status'] == 'pending'
 
-@patch('app.services.allegro_auth_service.requests.post')
-def test_check_auth_status_sync_failed(mock_post, service):
-    mock_response = MagicMock()
-    mock_response.status_code = 400
-    mock_response.json.return_value = {'error': 'access_denied'}
-    mock_post.return_value = mock_response
-    result = service.check_auth_status_sync('devcode', 'user1')
+def test_check_auth_status_sync_failed(service):
+    with mock_allegro_client(respond(400, json={'error': 'access_denied'})):
+        result = service.check_auth_status_sync('devcode', 'user1', 'account')
     assert result['status'] == 'failed'
 
-@patch('app.services.allegro_auth_service.requests.post')
-@patch.object(AllegroAuthService, 'token_service')
-def test_refresh_token_sync_success(mock_token_service, mock_post, service):
-    token = UserToken(id=1, user_id='user1', allegro_token='old', refresh_token='refresh', expires_at=datetime.utcnow())
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = {
+def test_refresh_token_sync_success(service):
+    token = make_token()
+    requests = []
+    handler = respond(200, json={
         'access_token': 'newtoken',
         'refresh_token': 'newrefresh',
         'expires_in': 3600
-    }
-    mock_post.return_value = mock_response
-    mock_token_service.update_token_sync = MagicMock(return_value=token)
-    result = service.refresh_token_sync(token)
+    }, requests=requests)
+    service.token_service.update_token_sync = MagicMock(return_value=token)
+    with mock_allegro_client(handler):
+        result = service.refresh_token_sync(token)
     assert result == token
-    mock_token_service.update_token_sync.assert_called_once()
-
-@patch('app.services.allegro_auth_service.requests.post')
-def test_refresh_token_sync_fail(mock_post, service):
-    token = UserToken(id=1, user_id='user1', allegro_token='old', refresh_token='refresh', expires_at=datetime.utcnow())
-    mock_response = MagicMock()
-    mock_response.status_code = 400
-    mock_response.text = 'Bad Request'
-    mock_post.return_value = mock_response
-    with pytest.raises(ValidationError):
-        service.refresh_token_sync(token)
-
-@patch('app.services.allegro_auth_service.requests.get')
-def test_validate_token_sync_valid(mock_get, service):
-    token = UserToken(id=1, user_id='user1', allegro_token='tok', refresh_token='ref', expires_at=datetime.utcnow())
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_get.return_value = mock_response
-    assert service.validate_token_sync(token) is True
-
-@patch('app.services.allegro_auth_service.requests.get')
-def test_validate_token_sync_expired(mock_get, service):
-    token = UserToken(id=1, user_id='user1', allegro_token='tok', refresh_token='ref', expires_at=datetime.utcnow())
-    mock_response = MagicMock()
-    mock_response.status_code = 401
-    mock_get.return_value = mock_response
-    assert service.validate_token_sync(token) is False
-
-@patch('app.services.allegro_auth_service.requests.get')
-def test_validate_token_sync_unexpected(mock_get, service):
-    token = UserToken(id=1, user_id='user1', allegro_token='tok', refresh_token='ref', expires_at=datetime.utcnow())
-    mock_response = MagicMock()
-    mock_response.status_code = 500
-    mock_get.return_value = mock_response
-    assert service.validate_token_sync(token) is False 
\ No newline at end of file
+    service.token_service.update_token_sync.assert_called_once()
+    assert b'grant_type=refresh_token' in requests[0].content
+
+def test_refresh_token_sync_fail(service):
+    with mock_allegro_client(respond(400, text='Bad Request')):
+        with pytest.raises(ValidationError):
+            service.refresh_token_sync(make_token())
+
+def test_validate_token_sync_valid(service):
+    requests = []
+    with mock_allegro_client(respond(200, json={}, requests=requests)):
+        assert service.validate_token_sync(make_token()) is True
+    assert requests[0].url.path == '/me'
+    assert requests[0].headers['Authorization'] == 'Bearer tok'
+
+def test_validate_token_sync_expired(service):
+    with mock_allegro_client(respond(401, json={})):
+        assert service.validate_token_sync(make_token()) is False
+
+def test_validate_token_sync_unexpected(service):
+    with mock_allegro_client(respond(500, text='error')):
+        assert service.validate_token_sync(make_token()) is False
@@ -0,0 +1,40 @@
+"""
+Тесты общего HTTP клиента Allegro API
+"""
+
+from app.core.allegro_client import AllegroApiClient
+
+
+async def _get_async_client(client: AllegroApiClient):
+    return client.async_client()
+
+
+def test_sync_client_is_reused_until_close():
+    client = AllegroApiClient()
+
+    first = client.sync_client
+    assert client.sync_client is first
+
+    client.close()
+    assert first.is_closed
+    assert client.sync_client is not first
+    client.close()
+
+
+def test_async_client_is_reused_across_runs():
+    client = AllegroApiClient()
+
+    first = client.run(_get_async_client(client))
+    second = client.run(_get_async_client(client))
+
+    assert first is second
+
+    client.close()
+    assert first.is_closed
+
+
+def test_auth_headers():
+    headers = AllegroApiClient.auth_headers("token-1")
+
+    assert headers["Authorization"] == "Bearer token-1"
+    assert headers["Accept"] == "application/vnd.allegro.public.v1+json"
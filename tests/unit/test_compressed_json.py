@@ -0,0 +1,91 @@
+"""
+@file: tests/unit/test_compressed_json.py
+@description: Unit-тесты колонки CompressedJSON и пересжатия документов (PayloadCompressionService)
+@dependencies: pytest, unittest.mock, compressed_json, PayloadCompressionService
+"""
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+import pytest
+from sqlalchemy.dialects import postgresql
+from app.core import compressed_json
+from app.core.compressed_json import ZSTD_MAGIC, CompressedJSON
+from app.core.settings import settings
+from app.models.order_event import OrderEvent
+from app.services.payload_compression_service import PayloadCompressionService
+
+DOCUMENT = {"id": "o1", "buyer": {"email": "a@example.com", "address": {"city": "Kraków"}},
+            "lineItems": [{"offer": {"name": "Produkt"}, "quantity": 2}] * 5}
+
+
+@pytest.fixture
+def zstd_codec():
+    compressed_json.get_codec.cache_clear()
+    with patch.object(settings.storage, "json_compression", True), \
+         patch.object(settings.storage, "zstd_dictionary_path", ""):
+        yield compressed_json.get_codec()
+    compressed_json.get_codec.cache_clear()
+
+
+def test_uncompressed_documents_round_trip():
+    column_type = CompressedJSON()
+
+    with patch.object(settings.storage, "json_compression", False):
+        stored = column_type.process_bind_param(DOCUMENT, postgresql.dialect())
+
+    assert stored.startswith(b"{")
+    assert column_type.process_result_value(memoryview(stored), postgresql.dialect()) == DOCUMENT
+    assert column_type.process_bind_param(None, postgresql.dialect()) is None
+
+
+def test_compressed_frame_requires_zstandard():
+    with patch.object(compressed_json, "get_codec", return_value=None):
+        with pytest.raises(RuntimeError):
+            compressed_json.decode_json(ZSTD_MAGIC + b"\x00")
+
+
+def test_codec_requires_zstandard_when_compression_enabled():
+    compressed_json.get_codec.cache_clear()
+    try:
+        with patch.object(compressed_json, "_load_zstd", return_value=None):
+            with patch.object(settings.storage, "json_compression", True):
+                with pytest.raises(RuntimeError):
+                    compressed_json.get_codec()
+            with patch.object(settings.storage, "json_compression", False):
+                compressed_json.get_codec.cache_clear()
+                assert compressed_json.get_codec() is None
+    finally:
+        compressed_json.get_codec.cache_clear()
+
+
+def test_compressed_documents_round_trip(zstd_codec):
+    stored = compressed_json.encode_json(DOCUMENT)
+
+    assert stored[:4] == ZSTD_MAGIC
+    assert len(stored) < len(compressed_json.json.dumps(DOCUMENT))
+    assert compressed_json.decode_json(stored) == DOCUMENT
+
+
+def test_compress_batch_rewrites_uncompressed_rows_with_skip_locked():
+    db = MagicMock()
+    ids = [uuid4(), uuid4()]
+    db.execute.side_effect = [MagicMock(all=MagicMock(return_value=[(ids[0], DOCUMENT), (ids[1], {"a": 1})])), MagicMock()]
+
+    count = PayloadCompressionService(db).compress_batch(OrderEvent.__table__, "event_data", 10)
+
+    assert count == 2
+    select_sql = str(db.execute.call_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+    assert "SUBSTRING(order_events.event_data FROM" in select_sql
+    assert "FOR UPDATE SKIP LOCKED" in select_sql
+    update_stmt, params = db.execute.call_args_list[1].args
+    assert str(update_stmt.compile(dialect=postgresql.dialect())).startswith("UPDATE order_events SET event_data=")
+    assert params == [{"pk_id": ids[0], "payload": DOCUMENT}, {"pk_id": ids[1], "payload": {"a": 1}}]
+    db.commit.assert_called_once()
+
+
+def test_compress_all_skips_without_codec():
+    db = MagicMock()
+
+    with patch("app.services.payload_compression_service.get_codec", return_value=None):
+        assert PayloadCompressionService(db).compress_all() == {}
+
+    db.execute.assert_not_called()
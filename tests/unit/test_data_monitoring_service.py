@@ -0,0 +1,154 @@
+"""
+Тесты счетчиков качества данных (DataMonitoringService)
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.data_monitoring_service import DataMonitoringService
+
+GOOD_EVENT = {
+    "id": "order-1",
+    "status": "READY_FOR_PROCESSING",
+    "buyer": {"email": "buyer@example.com", "firstName": "Jan"},
+    "lineItems": [{"id": "item-1"}]
+}
+
+
+def make_service(row=None):
+    db = MagicMock()
+    db.exec.return_value.one.return_value = row
+    return DataMonitoringService(db), db
+
+
+def test_issue_mask_round_trips_issue_texts():
+    service, _ = make_service()
+    events = [
+        {},
+        {"id": "order-1", "buyer": {"email": "buyer@example.com"}},
+        {**GOOD_EVENT, "lineItems": []},
+        GOOD_EVENT
+    ]
+
+    mask = 0
+    expected = set()
+    for event in events:
+        issues = service._analyze_data_quality(event)
+        mask |= service._issue_mask(issues)
+        expected.update(issues["critical_issues"])
+
+    assert set(service._issues_from_mask(mask)) == expected
+    assert service._issue_mask(service._analyze_data_quality(GOOD_EVENT)) == 0
+
+
+def test_record_events_aggregates_per_bucket_in_one_upsert():
+    service, db = make_service()
+    token_id = str(uuid4())
+    base = datetime(2026, 10, 16, 12, 1, tzinfo=timezone.utc)
+
+    service.record_events(token_id, [
+        (base, "BOUGHT", GOOD_EVENT),
+        (base + timedelta(minutes=2), "BOUGHT", {}),
+        (base + timedelta(minutes=10), "BOUGHT", GOOD_EVENT)
+    ])
+
+    assert db.exec.call_count == 2
+    stmt = db.exec.call_args_list[0].args[0]
+    params = stmt.compile(dialect=postgresql.dialect()).params
+    assert "ON CONFLICT" in str(stmt.compile(dialect=postgresql.dialect()))
+    assert params["bucket_start_m0"] == datetime(2026, 10, 16, 12, 0)
+    assert params["total_events_m0"] == 2
+    assert params["missing_data_count_m0"] == 1
+    assert params["issues_count_m0"] == 1
+    assert params["bucket_start_m1"] == datetime(2026, 10, 16, 12, 10)
+    assert params["total_events_m1"] == 1
+    assert params["issue_mask_m1"] == 0
+    db.commit.assert_not_called()
+
+
+def test_record_events_without_events_does_not_touch_db():
+    service, db = make_service()
+
+    service.record_events(str(uuid4()), [])
+
+    db.exec.assert_not_called()
+
+
+def test_should_pause_sync_reads_token_counters():
+    service, _ = make_service()
+    issues = service._analyze_data_quality({})
+    service.db.exec.return_value.one.return_value = (100, 60, 60, 60, service._issue_mask(issues))
+    service._get_last_successful_sync = MagicMock(return_value=datetime.utcnow())
+
+    assert service.should_pause_sync(str(uuid4())) is True
+
+    metrics = service.check_token_health(str(uuid4()))
+    assert metrics.total_orders == 100
+    assert metrics.missing_data_ratio == 0.6
+    assert set(metrics.critical_issues) == set(issues["critical_issues"])
+
+
+def test_should_pause_sync_keeps_healthy_token_running():
+    service, _ = make_service((100, 0, 0, 0, 0))
+    service._get_last_successful_sync = MagicMock(return_value=datetime.utcnow())
+
+    assert service.should_pause_sync(str(uuid4())) is False
+
+
+def test_record_events_updates_daily_rollup_by_issue():
+    service, db = make_service()
+
+    service.record_events(str(uuid4()), [
+        (datetime(2026, 10, 16, 23, 59), "BOUGHT", GOOD_EVENT),
+        (datetime(2026, 10, 16, 23, 58), "BOUGHT", {"id": "order-2", "status": "BOUGHT"})
+    ])
+
+    stmt = db.exec.call_args_list[1].args[0]
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    assert str(compiled).startswith("INSERT INTO data_quality_daily")
+    rows = {}
+    index = 0
+    while f"issue_m{index}" in compiled.params:
+        rows[compiled.params[f"issue_m{index}"]] = compiled.params[f"events_count_m{index}"]
+        assert compiled.params[f"day_m{index}"] == date(2026, 10, 16)
+        index += 1
+    assert rows == {
+        "all": 2,
+        "problematic": 1,
+        "missing_data": 1,
+        "regression": 1,
+        "missing_field:buyer": 1,
+        "missing_field:lineItems": 1,
+        "empty_buyer_field:email": 1,
+        "empty_buyer_field:firstName": 1
+    }
+
+
+def test_quality_report_is_built_from_one_grouped_query():
+    service, db = make_service()
+    today = datetime.utcnow().date()
+    yesterday = today - timedelta(days=1)
+    db.exec.return_value.all.return_value = [
+        (yesterday, "all", 10),
+        (yesterday, "problematic", 1),
+        (today, "all", 20),
+        (today, "problematic", 10),
+        (today, "missing_data", 10),
+        (today, "regression", 4),
+        (today, "empty_buyer_field:email", 7)
+    ]
+
+    report = service.generate_data_quality_report(days=7, token_id=str(uuid4()))
+
+    db.exec.assert_called_once()
+    assert report["total_sync_events"] == 30
+    assert [day["date"] for day in report["daily_metrics"]] == [yesterday.isoformat(), today.isoformat()]
+    assert report["daily_metrics"][-1]["health_score"] == 0.5
+    assert report["top_issues"] == [
+        {"issue": "Missing buyer email", "count": 7, "severity": "medium"},
+        {"issue": "Empty line items", "count": 4, "severity": "high"}
+    ]
+    assert report["start_date"] == (today - timedelta(days=6)).isoformat()
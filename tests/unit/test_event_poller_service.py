@@ -0,0 +1,180 @@
+"""
+Тесты опроса Events API (EventPollerService)
+"""
+
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+from app.core.retry_policy import AllegroRetryLater
+from app.core.settings import settings
+from app.services.event_poller_service import EventPollerService, TokenPollState
+from app.services.order_sync_service import SyncPausedException
+
+
+def make_client(events, status_code=200, requests=None):
+    def handler(request):
+        if requests is not None:
+            requests.append(request)
+        return httpx.Response(status_code, json={"events": events})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def make_state(cursor="evt-0"):
+    return TokenPollState(
+        user_id="user-1",
+        token_id="token-1",
+        headers={"Authorization": "Bearer test"},
+        cursor=cursor
+    )
+
+
+async def poll(service, state, client):
+    with patch("app.services.event_poller_service.allegro_client.async_client", return_value=client):
+        return await service._poll_once(state)
+
+
+@pytest.mark.asyncio
+async def test_cursor_advances_after_ingest_and_full_page_polls_again():
+    service = EventPollerService()
+    state = make_state()
+    limit = settings.sync.events_page_limit
+    events = [{"id": f"evt-{i}"} for i in range(1, limit + 1)]
+    requests = []
+
+    with patch.object(service, "_ingest", return_value=True) as ingest:
+        interval = await poll(service, state, make_client(events, requests=requests))
+
+    ingest.assert_called_once_with("user-1", "token-1", events)
+    assert requests[0].url.params["from"] == "evt-0"
+    assert state.cursor == f"evt-{limit}"
+    assert interval == 0.0
+
+
+@pytest.mark.asyncio
+async def test_partial_page_uses_min_interval():
+    service = EventPollerService()
+    state = make_state()
+
+    with patch.object(service, "_ingest", return_value=True):
+        interval = await poll(service, state, make_client([{"id": "evt-1"}]))
+
+    assert state.cursor == "evt-1"
+    assert interval == settings.sync.poller_min_interval_seconds
+
+
+@pytest.mark.asyncio
+async def test_empty_feed_backs_off_up_to_max_interval():
+    service = EventPollerService()
+    state = make_state()
+    intervals = []
+
+    with patch.object(service, "_ingest") as ingest:
+        for _ in range(10):
+            state.interval = await poll(service, state, make_client([]))
+            intervals.append(state.interval)
+
+    ingest.assert_not_called()
+    assert intervals[0] == settings.sync.poller_min_interval_seconds
+    assert intervals == sorted(intervals)
+    assert intervals[-1] == settings.sync.poller_max_interval_seconds
+
+
+@pytest.mark.asyncio
+async def test_cursor_reloaded_after_token_locked_by_sync_task():
+    service = EventPollerService()
+    state = make_state()
+    requests = []
+
+    with patch("app.services.event_poller_service.token_sync_lock.acquire", return_value=None), \
+         patch("app.services.event_poller_service.get_sync_db_session_direct") as get_db:
+        interval = await poll(service, state, make_client([{"id": "evt-1"}]))
+
+    get_db.assert_not_called()
+    assert state.cursor is None
+    assert interval == settings.sync.poller_max_interval_seconds
+
+    # Синхронизация Celery сдвинула курсор токена - опрос продолжается с него
+    start = {"headers": {"Authorization": "Bearer test"}, "cursor": "evt-9"}
+    with patch.object(service, "_load_poll_start", return_value=start), \
+         patch.object(service, "_ingest", return_value=True):
+        await poll(service, state, make_client([], requests=requests))
+
+    assert requests[0].url.params["from"] == "evt-9"
+
+
+@pytest.mark.asyncio
+async def test_token_refresh_reloads_cursor_from_db():
+    service = EventPollerService()
+    state = make_state()
+    service._states = {state.token_id: state}
+    requests = []
+
+    with patch.object(service, "_load_active_tokens", return_value=[("user-1", "token-1", False)]):
+        await service._refresh_tokens()
+
+    start = {"headers": {"Authorization": "Bearer test"}, "cursor": "evt-5"}
+    with patch.object(service, "_load_poll_start", return_value=start):
+        await poll(service, state, make_client([], requests=requests))
+
+    assert state.cursor == "evt-5"
+    assert requests[0].url.params["from"] == "evt-5"
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_poll_raises_retry_later():
+    service = EventPollerService()
+    state = make_state()
+
+    with pytest.raises(AllegroRetryLater):
+        await poll(service, state, make_client([], status_code=429))
+
+    assert state.cursor == "evt-0"
+
+
+def test_ingest_releases_lock_after_write():
+    service = EventPollerService()
+    lease = MagicMock()
+    sync_service = MagicMock()
+    sync_service.ingest_events.return_value = {"orders_created": 1, "orders_updated": 0}
+
+    with patch("app.services.event_poller_service.token_sync_lock.acquire", return_value=lease), \
+         patch("app.services.event_poller_service.get_sync_db_session_direct"), \
+         patch("app.services.event_poller_service.OrderSyncService", return_value=sync_service):
+        assert service._ingest("user-1", "token-1", [{"id": "evt-1"}]) is True
+
+    sync_service.ingest_events.assert_called_once()
+    lease.release.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_anomalies_pause_only_affected_token():
+    service = EventPollerService()
+    tokens = [("user-1", "token-1", True), ("user-2", "token-2", False)]
+
+    with patch.object(service, "_load_active_tokens", return_value=tokens):
+        await service._refresh_tokens()
+
+    assert [state.token_id for state in service._due_states(float("inf"))] == ["token-2"]
+
+    tokens = [("user-1", "token-1", False), ("user-2", "token-2", False)]
+    with patch.object(service, "_load_active_tokens", return_value=tokens):
+        await service._refresh_tokens()
+
+    assert {state.token_id for state in service._due_states(float("inf"))} == {"token-1", "token-2"}
+
+
+@pytest.mark.asyncio
+async def test_paused_ingest_pauses_token_only():
+    service = EventPollerService()
+    state = make_state()
+    other = TokenPollState(user_id="user-2", token_id="token-2")
+    service._states = {state.token_id: state, other.token_id: other}
+
+    with patch.object(service, "_poll_once", side_effect=SyncPausedException("anomalies")):
+        await service._poll_token(state)
+
+    assert state.paused is True
+    assert service._due_states(float("inf")) == [other]
@@ -0,0 +1,100 @@
+"""
+@file: tests/unit/test_failed_order_service.py
+@description: Unit-тесты повторной обработки проблемных заказов (FailedOrderService, retry_failed_orders)
+@dependencies: pytest, unittest.mock, FailedOrderService, OrderSyncService
+"""
+from unittest.mock import MagicMock, patch
+from uuid import UUID
+from sqlalchemy.dialects import postgresql
+from app.core.settings import settings
+from app.models.failed_order_processing import FailedOrderProcessing, FailedOrderStatus
+from app.services.failed_order_service import FailedOrderService
+from app.services.order_sync_service import OrderSyncService
+from app.tasks import sync_tasks
+
+TOKEN_ID = "11111111-1111-1111-1111-111111111111"
+
+
+def compile_sql(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def make_failed_order(order_id, retry_count=0):
+    return FailedOrderProcessing(order_id=order_id, token_id=UUID(TOKEN_ID), error_type="api_fetch_failed",
+                                 error_message="", status=FailedOrderStatus.RETRYING, retry_count=retry_count,
+                                 max_retries=3)
+
+
+def test_claim_due_skips_locked_rows_in_priority_order():
+    db = MagicMock()
+    pending = make_failed_order("o1")
+    pending.status = FailedOrderStatus.PENDING
+    db.exec.return_value.all.return_value = [pending]
+
+    claimed = FailedOrderService(db).claim_due(10, token_id=TOKEN_ID)
+
+    sql = compile_sql(db.exec.call_args.args[0])
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "ORDER BY failed_order_processing.priority, failed_order_processing.next_retry_at ASC NULLS FIRST" in sql
+    assert "failed_order_processing.token_id =" in sql
+    assert claimed[0].status == FailedOrderStatus.RETRYING
+    assert claimed[0].last_retry_at is not None
+    db.commit.assert_called_once()
+
+
+def test_resolve_failed_orders_writes_batch_once():
+    db = MagicMock()
+    service = OrderSyncService(db, "user1", TOKEN_ID)
+    service._fetch_order_details_batch = MagicMock(return_value={
+        "o1": {"id": "o1", "revision": "r1"}, "o2": None, "o3": {"id": "o3", "revision": "r3"}})
+    service.protection_service = MagicMock()
+    service.protection_service.safe_order_upsert_many.return_value = [
+        {"success": True, "action": "created", "message": "", "order_id": "o1"},
+        {"success": False, "action": "error", "message": "boom", "order_id": "o3"},
+    ]
+    failed_orders = [make_failed_order("o1"), make_failed_order("o2", retry_count=2), make_failed_order("o3")]
+
+    result = service.resolve_failed_orders(failed_orders)
+
+    assert result == {"processed": 3, "resolved": 1, "failed": 2, "abandoned": 1}
+    assert service.protection_service.safe_order_upsert_many.call_count == 1
+    writes = service.protection_service.safe_order_upsert_many.call_args.args[0]
+    assert [write["order_id"] for write in writes] == ["o1", "o3"]
+    assert [order.status for order in failed_orders] == [
+        FailedOrderStatus.RESOLVED, FailedOrderStatus.ABANDONED, FailedOrderStatus.PENDING]
+    db.commit.assert_called_once()
+
+
+def test_dispatcher_starts_workers_by_due_backlog():
+    failed_order_service = MagicMock()
+    failed_order_service.count_due.return_value = 120
+
+    with patch.object(sync_tasks, "get_sync_db_session_direct"), \
+         patch.object(sync_tasks, "FailedOrderService", return_value=failed_order_service), \
+         patch.object(sync_tasks.retry_failed_orders, "apply_async") as apply_async, \
+         patch.object(settings.sync, "failed_retry_workers", 4), \
+         patch.object(settings.sync, "failed_retry_batch_size", 50):
+        result = sync_tasks.dispatch_failed_order_retries()
+
+    failed_order_service.count_due.assert_called_once_with(200)
+    assert apply_async.call_count == 3
+    assert result == {"due": 120, "workers": 3}
+
+
+def test_worker_claims_until_queue_is_empty_and_groups_by_token():
+    batches = [[make_failed_order("o1"), make_failed_order("o2")], []]
+    failed_order_service = MagicMock()
+    failed_order_service.claim_due.side_effect = batches
+    failed_order_service.get_token_owners.return_value = {TOKEN_ID: "user1"}
+    sync_service = MagicMock()
+    sync_service.resolve_failed_orders.return_value = {"processed": 2, "resolved": 2, "failed": 0, "abandoned": 0}
+
+    with patch.object(sync_tasks, "get_sync_db_session_direct"), \
+         patch.object(sync_tasks, "FailedOrderService", return_value=failed_order_service), \
+         patch.object(sync_tasks, "OrderSyncService", return_value=sync_service) as service_cls:
+        result = sync_tasks.retry_failed_orders()
+
+    assert failed_order_service.claim_due.call_count == 2
+    assert service_cls.call_args.args[1:] == ("user1", TOKEN_ID)
+    assert sync_service.resolve_failed_orders.call_args.args[0] == batches[0]
+    assert result == {"processed": 2, "resolved": 2, "failed": 0, "abandoned": 0}
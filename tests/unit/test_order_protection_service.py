@@ -0,0 +1,126 @@
+"""
+@file: tests/unit/test_order_protection_service.py
+@description: Unit-тесты для OrderProtectionService (пакетный upsert заказов)
+@dependencies: pytest, unittest.mock, OrderProtectionService
+"""
+import pytest
+from uuid import UUID
+from unittest.mock import MagicMock
+from sqlalchemy.dialects import postgresql
+from app.models.order import Order
+from app.services.order_protection_service import OrderProtectionService
+
+TOKEN_ID = UUID("11111111-1111-1111-1111-111111111111")
+
+
+def make_order(order_id, revision, **fields):
+    data = {"id": order_id, "revision": revision, "buyer": {"email": f"{order_id}@example.com"}, "lineItems": [{}]}
+    data.update(fields)
+    return {"order_id": order_id, "new_data": data, "allegro_revision": revision, "order_date": None}
+
+
+@pytest.fixture
+def db():
+    return MagicMock()
+
+
+def setup_db(db, existing_orders, written_order_ids):
+    statements = []
+
+    def execute(stmt):
+        statements.append(stmt)
+        result = MagicMock()
+        if len(statements) == 1:
+            result.all.return_value = existing_orders
+        else:
+            result.scalars.return_value.all.return_value = written_order_ids
+        return result
+
+    db.exec.side_effect = execute
+    return statements
+
+
+def test_upsert_many_writes_chunk_with_single_statement(db):
+    existing = Order(token_id=TOKEN_ID, allegro_order_id="o1", order_data={"revision": "r1", "buyer": {"phoneNumber": "123"}},
+                     order_date=None)
+    statements = setup_db(db, [existing], ["o1", "o2"])
+    service = OrderProtectionService(db, TOKEN_ID)
+
+    results = service.safe_order_upsert_many([make_order("o1", "r2"), make_order("o2", "r1")])
+
+    assert [result["action"] for result in results] == ["updated", "created"]
+    assert all(result["success"] for result in results)
+    assert db.commit.call_count == 1
+
+    upsert = statements[1]
+    sql = str(upsert.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT ON CONSTRAINT uq_orders_per_token DO UPDATE" in sql
+    assert "IS DISTINCT FROM" in sql
+    merged = [value for value in upsert.compile(dialect=postgresql.dialect()).params.values()
+              if isinstance(value, dict) and value.get("id") == "o1"]
+    assert merged[0]["buyer"]["phoneNumber"] == "123"
+
+
+def test_upsert_many_skips_same_revision_and_duplicates(db):
+    existing = Order(token_id=TOKEN_ID, allegro_order_id="o1", order_data={"revision": "r1"}, order_date=None)
+    statements = setup_db(db, [existing], ["o2"])
+    service = OrderProtectionService(db, TOKEN_ID)
+
+    results = service.safe_order_upsert_many([make_order("o1", "r1"), make_order("o2", "a"), make_order("o2", "b")])
+
+    assert [result["action"] for result in results] == ["skipped", "skipped", "created"]
+    assert len(statements) == 2
+
+
+def test_upsert_many_reports_rows_filtered_by_revision_guard_as_skipped(db):
+    setup_db(db, [], [])
+    service = OrderProtectionService(db, TOKEN_ID)
+
+    results = service.safe_order_upsert_many([make_order("o1", "r1")])
+
+    assert results[0]["action"] == "skipped"
+    assert results[0]["success"] is True
+
+
+def test_upsert_many_counts_inserted_orders_in_same_statement(db):
+    statements = setup_db(db, [], ["o1"])
+    service = OrderProtectionService(db, TOKEN_ID)
+
+    service.safe_order_upsert_many([make_order("o1", "r1")])
+
+    sql = str(statements[1].compile(dialect=postgresql.dialect()))
+    assert "RETURNING orders.allegro_order_id, orders.revision_seq, xmax = 0 AS inserted" in sql
+    assert "INSERT INTO token_order_counts" in sql
+    assert "orders_count = (token_order_counts.orders_count + excluded.orders_count)" in sql
+
+
+def test_detect_anomalies_compares_batch_with_cached_token_count(db):
+    db.exec.return_value.first.return_value = 100
+    service = OrderProtectionService(db, TOKEN_ID)
+
+    anomalies = service.detect_data_anomalies([make_order("o1", "r1")["new_data"]] * 10)
+
+    assert any("10 vs 100" in anomaly for anomaly in anomalies)
+    sql = str(db.exec.call_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "FROM token_order_counts" in sql
+    assert "count(" not in sql
+
+
+def test_upsert_many_records_revisions_of_written_orders(db):
+    existing = Order(token_id=TOKEN_ID, allegro_order_id="o1", order_data={"revision": "r1", "buyer": {"email": "o1@example.com"}},
+                     order_date=None, revision_seq=2)
+    statements = setup_db(db, [existing], ["o1"])
+    service = OrderProtectionService(db, TOKEN_ID)
+
+    service.safe_order_upsert_many([make_order("o1", "r2")])
+
+    assert "FOR UPDATE" in str(statements[0].compile(dialect=postgresql.dialect()))
+    compiled = statements[1].compile(dialect=postgresql.dialect())
+    assert "INSERT INTO order_revisions" in str(compiled)
+    assert "JOIN written_orders ON written_orders.allegro_order_id = candidate_revisions.allegro_order_id" in str(compiled)
+    assert "revision_seq = (orders.revision_seq + %(revision_seq_1)s)" in str(compiled)
+    assert "written_orders.revision_seq" in str(compiled)
+    assert 3 in compiled.params.values()
+    delta = [value for value in compiled.params.values()
+             if isinstance(value, list) and value and isinstance(value[0], dict) and "op" in value[0]]
+    assert {"op": "replace", "path": "/revision", "value": "r2"} in delta[0]
@@ -0,0 +1,104 @@
+"""
+@file: tests/unit/test_order_revision_service.py
+@description: Unit-тесты истории версий заказов (JSON Patch, OrderRevisionService)
+@dependencies: pytest, unittest.mock, json_patch, OrderRevisionService
+"""
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from uuid import UUID
+import pytest
+from sqlalchemy.dialects import postgresql
+from app.core.json_patch import apply_patch, make_patch
+from app.core.settings import settings
+from app.models.order_revision import OrderRevision
+from app.services.order_revision_service import OrderRevisionService
+
+TOKEN_ID = UUID("11111111-1111-1111-1111-111111111111")
+
+V1 = {"id": "o1", "revision": "r1", "status": "BOUGHT", "buyer": {"email": "a@example.com", "a/b": 1},
+      "lineItems": [{"id": "l1", "quantity": 1}], "summary": {"totalToPay": {"amount": "10.00"}}}
+V2 = {"id": "o1", "revision": "r2", "status": "READY_FOR_PROCESSING", "buyer": {"email": "a@example.com", "a/b": 2},
+      "lineItems": [{"id": "l1", "quantity": 2}, {"id": "l2", "quantity": 1}], "delivery": {"method": "courier"}}
+V3 = {"id": "o1", "revision": "r3", "status": "READY_FOR_PROCESSING", "buyer": {"email": "b@example.com", "a/b": True},
+      "lineItems": [{"id": "l1", "quantity": 3}, {"id": "l2", "quantity": 1}], "delivery": {"method": "courier"}}
+
+
+@pytest.mark.parametrize("source, target", [(V1, V2), (V2, V3), (V3, V1), (V1, V1)])
+def test_patch_round_trip(source, target):
+    patch_ops = make_patch(source, target)
+
+    assert apply_patch(source, patch_ops) == target
+    if source == target:
+        assert patch_ops == []
+
+
+def test_patch_is_smaller_than_document_for_small_change():
+    patch_ops = make_patch(V2, V3)
+
+    assert {op["path"] for op in patch_ops} == {"/revision", "/buyer/email", "/buyer/a~1b", "/lineItems/0/quantity"}
+    assert apply_patch(V2, patch_ops)["buyer"]["a/b"] is True
+
+
+def test_apply_patch_rejects_missing_path():
+    with pytest.raises(ValueError):
+        apply_patch({"a": 1}, [{"op": "replace", "path": "/b/c", "value": 1}])
+
+
+def test_keyframe_every_interval():
+    with patch.object(settings.sync, "revision_keyframe_interval", 3):
+        kinds = [OrderRevisionService.build_revision(V1, V2, seq)[0] for seq in range(1, 8)]
+
+    assert kinds == [True, False, False, True, False, False, True]
+    assert OrderRevisionService.build_revision(None, V2, 5) == (True, V2)
+
+
+def make_revision(seq, is_keyframe, data):
+    return OrderRevision(token_id=TOKEN_ID, allegro_order_id="o1", seq=seq, revision=f"r{seq}",
+                         is_keyframe=is_keyframe, data=data, recorded_at=datetime(2026, 1, seq))
+
+
+def test_get_order_at_applies_patches_after_last_keyframe():
+    db = MagicMock()
+    db.exec.return_value.all.return_value = [
+        make_revision(1, True, V1), make_revision(2, False, make_patch(V1, V2)), make_revision(3, False, make_patch(V2, V3))]
+
+    snapshot = OrderRevisionService(db, TOKEN_ID).get_order_at("o1", datetime(2026, 1, 3))
+
+    assert snapshot["order_data"] == V3
+    assert snapshot["seq"] == 3
+    sql = str(db.exec.call_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "max(order_revisions.seq)" in sql
+    assert "order_revisions.is_keyframe" in sql
+    assert "order_revisions.recorded_at <=" in sql
+
+
+def test_get_order_at_refuses_broken_chain():
+    db = MagicMock()
+    db.exec.return_value.all.return_value = [make_revision(1, True, V1), make_revision(3, False, make_patch(V2, V3))]
+
+    assert OrderRevisionService(db, TOKEN_ID).get_order_at("o1") is None
+
+
+def test_iter_versions_walks_segments_newest_first():
+    db = MagicMock()
+    db.exec.return_value.all.side_effect = [
+        [4, 1],
+        [make_revision(4, True, V2), make_revision(5, False, make_patch(V2, V3))],
+        [make_revision(1, True, V1), make_revision(2, False, make_patch(V1, V2)), make_revision(3, False, make_patch(V2, V1))],
+    ]
+
+    versions = OrderRevisionService(db, TOKEN_ID).iter_versions("o1")
+
+    assert [(version["seq"], version["order_data"]) for version in versions] == [(5, V3), (4, V2), (3, V1), (2, V2), (1, V1)]
+    segment_sql = str(db.exec.call_args_list[2].args[0].compile(dialect=postgresql.dialect()))
+    assert "order_revisions.seq >=" in segment_sql and "order_revisions.seq <" in segment_sql
+
+
+def test_iter_versions_reads_older_segments_lazily():
+    db = MagicMock()
+    db.exec.return_value.all.side_effect = [[2, 1], [make_revision(2, True, V2)]]
+
+    versions = OrderRevisionService(db, TOKEN_ID).iter_versions("o1")
+
+    assert next(versions)["order_data"] == V2
+    assert db.exec.call_count == 2
@@ -0,0 +1,573 @@
+"""
+@file: tests/unit/test_order_sync_service.py
+@description: Unit-тесты для OrderSyncService (пагинация Events API и обработка пачек)
+@dependencies: pytest, unittest.mock, OrderSyncService
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+import httpx
+import pytest
+from sqlalchemy.dialects import postgresql
+from unittest.mock import MagicMock, patch
+from app.core.settings import settings
+from app.core.allegro_client import AllegroApiClient
+from app.core.retry_policy import AllegroRetryLater
+from app.services.order_protection_service import DataIntegrityError
+from app.services.order_sync_service import OrderSyncService, CHECKPOINT_COUNTERS
+
+TOKEN_ID = "11111111-1111-1111-1111-111111111111"
+
+
+@contextmanager
+def mock_allegro_client(handler):
+    client = AllegroApiClient()
+    options = client._client_options()
+    client._client_options = lambda: {**options, "transport": httpx.MockTransport(handler)}
+    with patch("app.services.order_sync_service.allegro_client", client), \
+         patch.object(settings.allegro, "rate_limit_enabled", False):
+        yield client
+    client.close()
+
+
+def make_page(event_ids, has_more):
+    events = [{"event": {"id": eid}, "order_id": f"order-{eid}", "source": "events_api"} for eid in event_ids]
+    return {"events": events, "last_event_id": event_ids[-1] if event_ids else None, "has_more": has_more}
+
+
+def make_sync_result():
+    sync_result = {counter: 0 for counter in CHECKPOINT_COUNTERS}
+    sync_result.update({"sync_type": "incremental", "sync_from_date": None, "sync_to_date": None,
+                        "events_backlog_remaining": False, "last_event_id": None,
+                        "continuation_required": False, "sync_history_id": None, "warnings": []})
+    return sync_result
+
+
+@pytest.fixture
+def service():
+    service = OrderSyncService(MagicMock(), "user1", TOKEN_ID)
+    service._get_allegro_headers = MagicMock(return_value={"Authorization": "Bearer tok"})
+    service._process_data_items = MagicMock()
+    service._check_batch_anomalies = MagicMock()
+    return service
+
+
+def test_drain_follows_cursor_until_feed_exhausted(service):
+    service._fetch_order_events_page = MagicMock(side_effect=[
+        make_page(["e1", "e2"], has_more=True),
+        make_page(["e3"], has_more=False),
+    ])
+    sync_result = make_sync_result()
+
+    count = service._drain_order_events(sync_result, from_event_id="e0")
+
+    assert count == 3
+    cursors = [call.kwargs["from_event_id"] for call in service._fetch_order_events_page.call_args_list]
+    assert cursors == ["e0", "e2"]
+    assert service._process_data_items.call_count == 2
+    assert sync_result["event_pages_fetched"] == 2
+    assert sync_result["last_event_id"] == "e3"
+    assert sync_result["events_backlog_remaining"] is False
+
+
+def test_drain_stops_at_page_budget(service):
+    service._fetch_order_events_page = MagicMock(side_effect=lambda headers, from_event_id, sync_to_date: make_page([f"{from_event_id}+"], has_more=True))
+    sync_result = make_sync_result()
+
+    with patch("app.services.order_sync_service.settings.sync.max_event_pages_per_run", 3):
+        service._drain_order_events(sync_result, from_event_id="e0")
+
+    assert service._fetch_order_events_page.call_count == 3
+    assert sync_result["events_backlog_remaining"] is True
+
+
+def test_drain_stops_on_api_error(service):
+    service._fetch_order_events_page = MagicMock(side_effect=[make_page(["e1"], has_more=True), None])
+    sync_result = make_sync_result()
+
+    count = service._drain_order_events(sync_result)
+
+    assert count == 1
+    assert sync_result["last_event_id"] == "e1"
+    assert len(sync_result["warnings"]) == 1
+
+
+def test_process_items_fetches_details_for_whole_batch(service):
+    del service._process_data_items
+    service._process_data_item = MagicMock(side_effect=[
+        {"order_id": "o1", "action": "create", "revision": "r1", "data_item": {}},
+        None,
+        {"order_id": "o2", "action": "update", "revision": "r2", "data_item": {}},
+    ])
+    service._save_events_batch = MagicMock(return_value=(set(), []))
+    service._fetch_order_details_batch = MagicMock(return_value={"o1": {"id": "o1"}, "o2": None})
+    service._apply_orders_batch = MagicMock()
+
+    service._process_data_items([{}, {}, {}], make_sync_result())
+
+    service._fetch_order_details_batch.assert_called_once_with(["o1", "o2"], retry_after={})
+    pending_orders, order_details, _ = service._apply_orders_batch.call_args.args
+    assert [pending["order_id"] for pending in pending_orders] == ["o1", "o2"]
+    assert order_details == {"o1": {"id": "o1"}, "o2": None}
+
+
+def test_details_fetch_respects_concurrency_cap(service):
+    in_flight = {"current": 0, "max": 0}
+
+    async def handler(request):
+        in_flight["current"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["current"])
+        await asyncio.sleep(0.01)
+        in_flight["current"] -= 1
+        order_id = request.url.path.rsplit("/", 1)[-1]
+        if order_id == "missing":
+            return httpx.Response(404)
+        return httpx.Response(200, json={"id": order_id})
+
+    order_ids = [f"o{i}" for i in range(12)] + ["missing"]
+
+    with patch("app.services.order_sync_service.settings.sync.details_fetch_concurrency", 4), \
+         mock_allegro_client(handler):
+        details = service._fetch_order_details_batch(order_ids)
+
+    assert in_flight["max"] == 4
+    assert details["missing"] is None
+    assert details["o7"] == {"id": "o7"}
+    assert len(details) == 13
+
+
+def test_details_fetch_hands_off_long_retry_after(service):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(429, headers={"Retry-After": "120"})
+
+    with patch.object(settings.allegro, "retry_max_inline_wait", 10.0), \
+         patch("app.services.order_sync_service.asyncio.sleep") as sleep, \
+         mock_allegro_client(handler):
+        retry_after = {}
+        details = service._fetch_order_details_batch(["o1"], retry_after=retry_after)
+
+    assert details == {"o1": None}
+    assert retry_after == {"o1": 120.0}
+    assert len(calls) == 1
+    sleep.assert_not_called()
+
+
+def test_failed_order_is_not_retried_before_retry_after(service):
+    service.db.exec.return_value.first.return_value = None
+
+    before = datetime.utcnow()
+    service._save_failed_order("o1", "create", "HTTP 429", retry_after=600.0)
+
+    failed_order = service.db.add.call_args.args[0]
+    assert failed_order.next_retry_at >= before + timedelta(seconds=600)
+
+
+def test_events_page_429_defers_sync(service):
+    def handler(request):
+        return httpx.Response(429, headers={"Retry-After": "45"})
+
+    with mock_allegro_client(handler), pytest.raises(AllegroRetryLater) as exc_info:
+        service._fetch_order_events_page({"Authorization": "Bearer tok"}, from_event_id="e1")
+
+    assert exc_info.value.retry_after == 45.0
+
+
+def test_events_batch_insert_deduplicates_by_returning(service):
+    del service._process_data_items
+    captured = {}
+
+    def execute(stmt):
+        captured.setdefault("stmt", stmt)
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = ["e1"]
+        return result
+
+    service.db.exec.side_effect = execute
+    service.deduplication_service.should_process_token_orders = MagicMock(return_value={"should_process": False, "reason": "other token"})
+    sync_result = make_sync_result()
+    sync_result.update({"events_saved": 0, "events_deduplicated": 0, "orders_deduplicated": 0, "orders_failed": 0})
+
+    service._process_data_items(make_page(["e1", "e2"], has_more=False)["events"], sync_result)
+
+    sql = str(captured["stmt"].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT DO NOTHING" in sql
+    assert "RETURNING order_events.event_id" in sql
+    assert service.db.commit.call_count == 1
+    assert sync_result["events_saved"] == 1
+    assert sync_result["events_deduplicated"] == 1
+
+
+def test_events_without_order_id_are_counted_as_invalid(service):
+    del service._process_data_items
+
+    def execute(stmt):
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = ["e1"]
+        return result
+
+    service.db.exec.side_effect = execute
+    service.deduplication_service.should_process_token_orders = MagicMock(return_value={"should_process": False, "reason": "other token"})
+    sync_result = make_sync_result()
+    events = make_page(["e1", "e2"], has_more=False)["events"]
+    events[1]["order_id"] = None
+
+    service._process_data_items(events, sync_result)
+
+    assert sync_result["events_saved"] == 1
+    assert sync_result["events_invalid"] == 1
+    assert sync_result["events_deduplicated"] == 0
+    # Дальше обрабатывается только корректное событие
+    assert sync_result["orders_deduplicated"] == 1
+
+
+def test_order_deduplication_checks_token_once_per_page(service):
+    del service._process_data_items
+    service.deduplication_service.should_process_token_orders = MagicMock(return_value={"should_process": False, "reason": "other token"})
+    service._apply_orders_batch = MagicMock()
+    sync_result = make_sync_result()
+    items = [{"source": "checkout_forms_api", "order_id": f"o{index}", "order": {}} for index in range(3)]
+
+    service._process_data_items(items, sync_result)
+
+    service.deduplication_service.should_process_token_orders.assert_called_once_with(UUID(TOKEN_ID))
+    assert sync_result["orders_deduplicated"] == 3
+    service._apply_orders_batch.assert_not_called()
+
+
+def test_events_batch_advances_cursor_in_same_transaction(service):
+    statements = []
+
+    def execute(stmt):
+        statements.append(str(stmt.compile(dialect=postgresql.dialect())))
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = ["e1", "e2"]
+        return result
+
+    service.db.exec.side_effect = execute
+    page = make_page(["e1", "e2"], has_more=False)["events"]
+    page[-1]["event"]["occurredAt"] = "2026-10-16T10:00:00Z"
+
+    assert service._save_events_batch(page) == ({"e1", "e2"}, [])
+
+    assert statements[0].startswith("INSERT INTO order_events")
+    assert statements[1].startswith("INSERT INTO sync_cursors")
+    assert "ON CONFLICT (token_id) DO UPDATE" in statements[1]
+    assert service.db.commit.call_count == 1
+    service.db.rollback.assert_not_called()
+
+
+def test_resume_point_is_primary_key_lookup(service):
+    service.db.get.return_value = MagicMock(last_event_id="e42")
+
+    assert service._get_last_event_id_from_db() == "e42"
+    service.db.exec.assert_not_called()
+
+
+def test_current_revisions_projects_only_revision(service):
+    captured = {}
+
+    def execute(stmt):
+        captured["stmt"] = stmt
+        result = MagicMock()
+        result.all.return_value = [("o1", "rev-1")]
+        return result
+
+    service.db.exec.side_effect = execute
+
+    revisions = service._get_current_revisions(["o1", "o2", "o1"])
+
+    assert revisions == {"o1": "rev-1"}
+    sql = str(captured["stmt"].compile(dialect=postgresql.dialect()))
+    assert "->>" in sql
+    assert "orders.order_data," not in sql
+
+
+@pytest.mark.parametrize("order_id, expected", [("missing", "create"), ("o1", "skip"), ("o2", "update")])
+def test_decide_order_action_in_memory(service, order_id, expected):
+    current_revisions = {"o1": "rev-1", "o2": "rev-old"}
+
+    decision = service._decide_order_action(order_id, "rev-1" if order_id == "o1" else "rev-new", current_revisions)
+
+    assert decision["action"] == expected
+    service.db.exec.assert_not_called()
+
+
+def test_process_items_coalesces_events_of_same_order(service):
+    del service._process_data_items
+    service._process_data_item = MagicMock(side_effect=[
+        {"order_id": "o1", "action": "create", "revision": "r1", "data_item": {"event": {"type": "BOUGHT"}}},
+        {"order_id": "o2", "action": "update", "revision": "r7", "data_item": {}},
+        {"order_id": "o1", "action": "create", "revision": "r2", "data_item": {"event": {"type": "FILLED_IN"}}},
+        {"order_id": "o1", "action": "create", "revision": "r3", "data_item": {"event": {"type": "READY_FOR_PROCESSING"}}},
+    ])
+    service._fetch_order_details_batch = MagicMock(return_value={"o1": {"id": "o1"}, "o2": {"id": "o2"}})
+    service._apply_orders_batch = MagicMock()
+    sync_result = make_sync_result()
+
+    service._process_data_items([{"source": "checkout_forms_api"}] * 4, sync_result)
+
+    service._fetch_order_details_batch.assert_called_once_with(["o1", "o2"], retry_after={})
+    applied = [(pending["order_id"], pending["revision"]) for pending in service._apply_orders_batch.call_args.args[0]]
+    assert applied == [("o1", "r3"), ("o2", "r7")]
+    assert sync_result["orders_coalesced"] == 2
+
+
+def test_apply_orders_batch_writes_once_and_saves_fetch_failures(service):
+    service.protection_service = MagicMock()
+    service.protection_service.safe_order_upsert_many.return_value = [
+        {"success": True, "action": "created", "message": "", "order_id": "o1"},
+        {"success": True, "action": "skipped", "message": "", "order_id": "o3"},
+    ]
+    service._save_failed_order = MagicMock(return_value=True)
+    pending_orders = [
+        {"order_id": "o1", "action": "create", "revision": "r1", "data_item": {}},
+        {"order_id": "o2", "action": "update", "revision": "r2", "data_item": {}},
+        {"order_id": "o3", "action": "upsert", "revision": "r3", "data_item": {},
+         "order_data_item": {"order": {"id": "o3", "revision": "r3"}, "order_id": "o3", "source": "checkout_forms_api"}},
+    ]
+    sync_result = make_sync_result()
+    sync_result.update({"orders_processed": 0, "orders_created": 0, "orders_updated": 0,
+                        "orders_skipped": 0, "orders_failed": 0, "critical_issues": []})
+
+    service._apply_orders_batch(pending_orders, {"o1": {"id": "o1", "revision": "r1"}, "o2": None}, sync_result)
+
+    writes = service.protection_service.safe_order_upsert_many.call_args.args[0]
+    assert [(write["order_id"], write["allegro_revision"]) for write in writes] == [("o1", "r1"), ("o3", "r3")]
+    service._save_failed_order.assert_called_once()
+    assert sync_result["orders_created"] == 1
+    assert sync_result["orders_skipped"] == 1
+    assert sync_result["orders_failed"] == 1
+
+
+def make_checkout_forms_handler(bought_at_by_id, max_offset):
+    requests_seen = []
+
+    def handler(request):
+        params = request.url.params
+        offset, limit = int(params["offset"]), int(params["limit"])
+        requests_seen.append(params)
+        if offset >= max_offset:
+            return httpx.Response(422, json={"errors": [{"code": "OFFSET_TOO_LARGE"}]})
+        window_start = datetime.fromisoformat(params["lineItems.boughtAt.gte"])
+        window_end = datetime.fromisoformat(params["lineItems.boughtAt.lte"])
+        matching = sorted(
+            (bought_at, order_id) for order_id, bought_at in bought_at_by_id.items()
+            if window_start <= bought_at <= window_end
+        )
+        page = [{"id": order_id} for _, order_id in matching[offset:offset + limit]]
+        return httpx.Response(200, json={"checkoutForms": page, "count": len(page), "totalCount": len(matching)})
+
+    return handler, requests_seen
+
+
+def test_backfill_splits_windows_over_offset_cap_without_gaps(service):
+    range_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    # Плотный пик заказов в одном дне и редкие заказы в остальные дни
+    bought_at_by_id = {f"peak-{i}": range_start + timedelta(days=10, seconds=i * 20) for i in range(2500)}
+    bought_at_by_id.update({f"tail-{i}": range_start + timedelta(days=i) for i in range(60)})
+    handler, requests_seen = make_checkout_forms_handler(bought_at_by_id, max_offset=1000)
+    sync_result = make_sync_result()
+
+    with patch("app.services.order_sync_service.CHECKOUT_FORMS_MAX_OFFSET", 1000), \
+         patch("app.services.order_sync_service.settings.sync.backfill_window_days", 30), \
+         mock_allegro_client(handler):
+        pages = list(service._iter_orders_by_date(range_start, range_start + timedelta(days=60), sync_result))
+
+    orders = [order for page in pages for order in page]
+    assert max(len(page) for page in pages) <= 100
+    assert len(orders) == len(bought_at_by_id)
+
+    assert {order["order_id"] for order in orders} == set(bought_at_by_id)
+    assert all(order["source"] == "checkout_forms_api" for order in orders)
+    assert sync_result["warnings"] == []
+    assert all(int(params["offset"]) < 1000 for params in requests_seen)
+
+
+def test_backfill_yields_first_page_before_downloading_the_rest(service):
+    range_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    bought_at_by_id = {f"o-{i}": range_start + timedelta(hours=i) for i in range(1000)}
+    handler, requests_seen = make_checkout_forms_handler(bought_at_by_id, max_offset=10000)
+
+    # Без фоновой предзагрузки, чтобы счетчик запросов не зависел от планирования потоков
+    with patch("app.services.order_sync_service.settings.sync.backfill_concurrency", 2), \
+         patch("app.services.order_sync_service.settings.sync.prefetch_pages", 0), \
+         mock_allegro_client(handler):
+        pages = service._iter_orders_by_date(range_start, range_start + timedelta(days=30))
+        first_page = next(pages)
+        requests_before_first_write = len(requests_seen)
+        pages.close()
+
+    assert len(first_page) == 100
+    assert requests_before_first_write == 1
+
+
+def test_backfill_fetches_windows_concurrently_within_cap(service):
+    range_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    bought_at_by_id = {f"o-{i:02d}": range_start + timedelta(hours=12 + 24 * i) for i in range(12)}
+    sync_handler, _ = make_checkout_forms_handler(bought_at_by_id, max_offset=10000)
+    in_flight = {"current": 0, "max": 0}
+
+    async def handler(request):
+        in_flight["current"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["current"])
+        await asyncio.sleep(0.01)
+        in_flight["current"] -= 1
+        return sync_handler(request)
+
+    with patch("app.services.order_sync_service.settings.sync.backfill_window_days", 1), \
+         patch("app.services.order_sync_service.settings.sync.backfill_concurrency", 3), \
+         patch("app.services.order_sync_service.settings.sync.prefetch_pages", 0), \
+         mock_allegro_client(handler):
+        pages = list(service._iter_orders_by_date(range_start, range_start + timedelta(days=12)))
+
+    assert [order["order_id"] for page in pages for order in page] == sorted(bought_at_by_id)
+    assert in_flight["max"] == 3
+
+
+def test_backfill_resumes_from_recorded_progress(service):
+    range_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    bought_at_by_id = {f"o-{i}": range_start + timedelta(hours=i) for i in range(1000)}
+    handler, _ = make_checkout_forms_handler(bought_at_by_id, max_offset=10000)
+    range_end = range_start + timedelta(days=60)
+
+    with patch("app.services.order_sync_service.settings.sync.backfill_window_days", 30), \
+         mock_allegro_client(handler):
+        progress = {}
+        pages = service._iter_orders_by_date(range_start, range_end, progress=progress)
+        processed = [order for _ in range(3) for order in next(pages)]
+        checkpoint = {"mode": "checkout_forms", **progress}
+        pages.close()
+
+        resumed = [order for page in service._iter_orders_by_date(range_start, range_end, resume=checkpoint)
+                   for order in page]
+
+    assert checkpoint["offset"] == 300
+    assert len(checkpoint["windows"]) == 2
+    processed_ids = {order["order_id"] for order in processed}
+    resumed_ids = {order["order_id"] for order in resumed}
+    assert processed_ids.isdisjoint(resumed_ids)
+    assert processed_ids | resumed_ids == set(bought_at_by_id)
+
+
+def make_flaky_handler(handler, failing_offset, failures):
+    remaining = {"failures": failures}
+
+    def flaky_handler(request):
+        if int(request.url.params["offset"]) == failing_offset and remaining["failures"] > 0:
+            remaining["failures"] -= 1
+            return httpx.Response(400, json={"errors": [{"code": "BAD_REQUEST"}]})
+        return handler(request)
+
+    return flaky_handler
+
+
+def test_backfill_retries_failed_window_from_first_unyielded_page(service):
+    range_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    bought_at_by_id = {f"o-{i}": range_start + timedelta(hours=i) for i in range(500)}
+    handler, _ = make_checkout_forms_handler(bought_at_by_id, max_offset=10000)
+
+    with patch("app.services.order_sync_service.settings.sync.backfill_window_days", 30), \
+         mock_allegro_client(make_flaky_handler(handler, failing_offset=200, failures=1)):
+        pages = list(service._iter_orders_by_date(range_start, range_start + timedelta(days=30)))
+
+    orders = [order["order_id"] for page in pages for order in page]
+    assert len(orders) == len(set(orders)) == len(bought_at_by_id)
+
+
+def test_backfill_fails_with_checkpoint_on_window_after_retries(service):
+    range_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    bought_at_by_id = {f"o-{i}": range_start + timedelta(hours=i) for i in range(500)}
+    handler, _ = make_checkout_forms_handler(bought_at_by_id, max_offset=10000)
+    range_end = range_start + timedelta(days=30)
+    progress = {}
+    processed = []
+
+    with patch("app.services.order_sync_service.settings.sync.backfill_window_days", 30), \
+         patch("app.services.order_sync_service.settings.sync.backfill_concurrency", 1), \
+         mock_allegro_client(make_flaky_handler(handler, failing_offset=200, failures=10)):
+        with pytest.raises(httpx.HTTPStatusError):
+            for page in service._iter_orders_by_date(range_start, range_end, progress=progress):
+                processed.extend(page)
+
+    assert len(processed) == 200
+    assert progress["offset"] == 200
+    assert progress["windows"] == [[range_start.isoformat(), range_end.isoformat()]]
+
+
+def test_drain_suspends_at_deadline_with_checkpoint(service):
+    service._fetch_order_events_page = MagicMock(return_value=make_page(["e1", "e2"], has_more=True))
+    service._deadline = time.monotonic() - 1
+    sync_result = make_sync_result()
+    sync_result["orders_processed"] = 2
+
+    with patch("app.services.order_sync_service.settings.sync.prefetch_pages", 2):
+        service._drain_order_events(sync_result, from_event_id="e0")
+
+    assert service._process_data_items.call_count == 1
+    # Обработана одна страница, предзагрузка ограничена очередью и одной страницей в работе
+    assert service._fetch_order_events_page.call_count <= 1 + 2 + 1
+    assert sync_result["continuation_required"] is True
+    assert sync_result["events_backlog_remaining"] is True
+    checkpoint = service._sync_history.checkpoint
+    assert checkpoint["position"] == {"mode": "events", "event_cursor": "e2"}
+    assert checkpoint["counters"]["orders_processed"] == 2
+    assert sync_result["sync_history_id"] == str(service._sync_history.id)
+
+
+def test_resume_restores_counters_from_checkpoint(service):
+    sync_history = MagicMock(id=TOKEN_ID, checkpoint={
+        "position": {"mode": "events", "event_cursor": "e9"},
+        "counters": {"orders_processed": 7, "orders_created": 5}
+    })
+    service.db.exec.return_value.first.return_value = sync_history
+    sync_result = make_sync_result()
+
+    position = service._resume_from_checkpoint(TOKEN_ID, sync_result)
+
+    assert position == {"mode": "events", "event_cursor": "e9"}
+    assert sync_result["orders_processed"] == 7
+    assert sync_result["orders_created"] == 5
+    assert sync_result["orders_failed"] == 0
+    assert service._sync_history is sync_history
+
+
+def test_drain_prefetches_next_page_while_processing(service):
+    pages = [make_page(["e1"], has_more=True), make_page(["e2"], has_more=True), make_page(["e3"], has_more=False)]
+    service._fetch_order_events_page = MagicMock(side_effect=pages)
+    fetched_before_processing = []
+    service._process_data_items = MagicMock(side_effect=lambda events, sync_result: (
+        time.sleep(0.05), fetched_before_processing.append(service._fetch_order_events_page.call_count)
+    ))
+    sync_result = make_sync_result()
+
+    with patch("app.services.order_sync_service.settings.sync.prefetch_pages", 2):
+        count = service._drain_order_events(sync_result, from_event_id="e0")
+
+    assert count == 3
+    cursors = [call.kwargs["from_event_id"] for call in service._fetch_order_events_page.call_args_list]
+    assert cursors == ["e0", "e1", "e2"]
+    # Пока записывается первая страница, остальные уже загружены
+    assert fetched_before_processing[0] == 3
+    assert sync_result["last_event_id"] == "e3"
+
+
+def test_emergency_restore_uses_latest_valid_revision(service):
+    service.protection_service = MagicMock()
+    service.protection_service.revision_service.iter_versions.return_value = iter([
+        {"seq": 3, "order_data": {"corrupted": True}},
+        {"seq": 2, "order_data": {"id": "o1", "revision": "r2"}},
+        {"seq": 1, "order_data": {"id": "o1", "revision": "r1"}},
+    ])
+    service.protection_service.validate_order_data_quality.side_effect = [DataIntegrityError("missing id"), True, True]
+    service.protection_service.safe_order_update.return_value = {"success": True}
+
+    assert service.emergency_restore_from_events("o1") is True
+
+    service.protection_service.safe_order_update.assert_called_once_with(order_id="o1", new_data={"id": "o1", "revision": "r2"})
+    assert service.protection_service.validate_order_data_quality.call_count == 2
+    service.protection_service.revision_service.iter_versions.assert_called_once_with("o1", None)
@@ -0,0 +1,78 @@
+"""
+Тесты предзагрузки элементов итератора в фоновом потоке
+"""
+
+import threading
+import time
+
+import pytest
+
+from app.core.prefetch import prefetch
+
+
+def test_prefetch_preserves_order():
+    assert list(prefetch(range(10), depth=2)) == list(range(10))
+
+
+def test_prefetch_without_depth_runs_in_caller_thread():
+    threads = []
+
+    def source():
+        for i in range(3):
+            threads.append(threading.current_thread())
+            yield i
+
+    assert list(prefetch(source(), depth=0)) == [0, 1, 2]
+    assert set(threads) == {threading.current_thread()}
+
+
+def test_prefetch_lead_is_bounded():
+    produced = []
+
+    def source():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    items = prefetch(source(), depth=2)
+    assert next(items) == 0
+    time.sleep(0.2)
+
+    # Очередь из двух элементов и один элемент, ожидающий места в очереди
+    assert len(produced) <= 1 + 2 + 1
+    items.close()
+
+
+def test_prefetch_raises_producer_error_after_items():
+    def source():
+        yield 1
+        yield 2
+        raise ValueError("api error")
+
+    items = prefetch(source(), depth=2)
+
+    assert next(items) == 1
+    assert next(items) == 2
+    with pytest.raises(ValueError, match="api error"):
+        next(items)
+
+
+def test_prefetch_close_stops_producer_in_its_thread():
+    closed = threading.Event()
+    exit_threads = []
+
+    def source():
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            closed.set()
+
+    items = prefetch(source(), depth=1, on_thread_exit=lambda: exit_threads.append(threading.current_thread()))
+    assert next(items) == 0
+    items.close()
+
+    assert closed.wait(timeout=2)
+    time.sleep(0.05)
+    assert len(exit_threads) == 1
+    assert exit_threads[0] is not threading.current_thread()
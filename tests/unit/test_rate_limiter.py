@@ -0,0 +1,99 @@
+"""
+Тесты распределенного rate limiter Allegro API
+"""
+
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+import redis
+
+from app.core.rate_limiter import AllegroRateLimiter
+from app.core.retry_policy import AllegroRetryLater
+from app.core.settings import settings
+
+
+def make_limiter(script):
+    limiter = AllegroRateLimiter(redis_url="redis://localhost:6379/0")
+    limiter._get_script = lambda: script
+    return limiter
+
+
+def test_classify_endpoints():
+    assert AllegroRateLimiter.classify(httpx.URL(f"{settings.allegro.api_url}/order/events")) == "events"
+    assert AllegroRateLimiter.classify(httpx.URL(f"{settings.allegro.api_url}/order/event-stats")) == "events"
+    assert AllegroRateLimiter.classify(httpx.URL(f"{settings.allegro.api_url}/order/checkout-forms/1")) == "orders"
+    assert AllegroRateLimiter.classify(httpx.URL(f"{settings.allegro.api_url}/sale/offers")) == "general"
+    assert AllegroRateLimiter.classify(httpx.URL(f"{settings.allegro.auth_url}/token")) == "auth"
+
+
+def test_reserve_uses_bucket_per_token_and_class():
+    script = MagicMock(return_value=1_500_000)
+    limiter = make_limiter(script)
+
+    with patch.object(settings.allegro, "rate_limit_orders", 120), \
+         patch.object(settings.allegro, "rate_limit_burst", 5), \
+         patch.object(settings.allegro, "retry_max_inline_wait", 10.0):
+        wait = limiter.reserve("orders", "abc")
+
+    assert wait == 1.5
+    _, kwargs = script.call_args
+    assert kwargs["keys"] == ["allegro:ratelimit:abc:orders"]
+    assert kwargs["args"][:2] == [5, 2.0]
+    # Ожидание дольше порога скрипт только вычисляет, не списывая токен
+    assert kwargs["args"][4] == 10_000_000
+
+
+def test_acquire_sleeps_and_records_wait():
+    limiter = make_limiter(MagicMock(side_effect=[0, 250_000]))
+
+    with patch("app.core.rate_limiter.time.sleep") as sleep:
+        limiter.acquire("events", "abc")
+        limiter.acquire("events", "abc")
+
+    sleep.assert_called_once_with(0.25)
+    stats = limiter.get_stats()["events"]
+    assert stats["requests"] == 2
+    assert stats["waited_requests"] == 1
+    assert stats["max_wait_seconds"] == 0.25
+    assert limiter.total_wait_seconds() == 0.25
+
+
+def test_reserve_fails_open_when_redis_unavailable():
+    script = MagicMock(side_effect=redis.ConnectionError("down"))
+    limiter = make_limiter(script)
+
+    assert limiter.reserve("general", "abc") == 0.0
+    assert limiter.reserve("general", "abc") == 0.0
+
+    # Повторное подключение откладывается
+    script.assert_called_once()
+    assert limiter.get_stats()["general"]["redis_errors"] == 1
+
+
+def test_throttled_response_penalizes_bucket_with_retry_after():
+    limiter = make_limiter(MagicMock())
+    limiter._penalty_script = MagicMock(return_value=b"0.5")
+    request = httpx.Request("GET", f"{settings.allegro.api_url}/order/checkout-forms/1",
+                            headers={"Authorization": "Bearer tok"})
+
+    limiter.after_response(httpx.Response(429, headers={"Retry-After": "20"}, request=request))
+    limiter.after_response(httpx.Response(200, request=request))
+
+    limiter._penalty_script.assert_called_once()
+    _, kwargs = limiter._penalty_script.call_args
+    assert kwargs["keys"] == [f"allegro:ratelimit:{AllegroRateLimiter.token_key('Bearer tok')}:orders"]
+    assert kwargs["args"][2] == 20_000_000
+    assert limiter.get_stats()["orders"]["throttled_responses"] == 1
+
+
+def test_long_limiter_wait_is_handed_off():
+    limiter = make_limiter(MagicMock(return_value=120_000_000))
+
+    with patch.object(settings.allegro, "retry_max_inline_wait", 10.0), \
+         patch("app.core.rate_limiter.time.sleep") as sleep, \
+         pytest.raises(AllegroRetryLater) as exc_info:
+        limiter.acquire("events", "abc")
+
+    sleep.assert_not_called()
+    assert exc_info.value.retry_after == 120.0
@@ -0,0 +1,49 @@
+"""
+Тесты политики повторов запросов к Allegro API
+"""
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.core.retry_policy import AllegroRetryLater, ensure_inline_wait, parse_retry_after, retry_delay
+from app.core.settings import settings
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after(httpx.Response(429, headers={"Retry-After": "12"})) == 12.0
+
+
+def test_parse_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=120)
+    delay = parse_retry_after(httpx.Response(503, headers={"Retry-After": format_datetime(retry_at, usegmt=True)}))
+
+    assert 115 <= delay <= 120
+
+
+def test_parse_rate_limit_reset_only_for_429():
+    headers = {"X-RateLimit-Reset": "30"}
+
+    assert parse_retry_after(httpx.Response(429, headers=headers)) == 30.0
+    assert parse_retry_after(httpx.Response(503, headers=headers)) is None
+
+
+def test_retry_delay_prefers_server_hint():
+    assert retry_delay(0, httpx.Response(429, headers={"Retry-After": "7"})) == 7.0
+
+    with patch.object(settings.allegro, "retry_base_delay", 1.0):
+        delay = retry_delay(2, httpx.Response(503))
+    assert 4.0 <= delay <= 4.4
+
+
+def test_ensure_inline_wait_hands_off_long_waits():
+    with patch.object(settings.allegro, "retry_max_inline_wait", 10.0):
+        ensure_inline_wait(5.0)
+
+        with pytest.raises(AllegroRetryLater) as exc_info:
+            ensure_inline_wait(60.0, "429")
+
+    assert exc_info.value.retry_after == 60.0
@@ -0,0 +1,77 @@
+"""
+@file: tests/unit/test_sync_dispatcher.py
+@description: Unit-тесты диспетчера автосинхронизаций (dispatch_due_syncs)
+@dependencies: pytest, unittest.mock, ActiveSyncScheduleService
+"""
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+from sqlalchemy.dialects import postgresql
+from app.core.settings import settings
+from app.models.active_sync_schedule import ActiveSyncSchedule
+from app.services.active_sync_schedule_service import ActiveSyncScheduleService
+from app.tasks import sync_tasks
+
+
+def compile_sql(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_get_due_selects_overdue_schedules_with_skip_locked():
+    db = MagicMock()
+
+    ActiveSyncScheduleService(db).get_due(datetime(2026, 1, 1), limit=5, exclude_token_ids=["t-busy"])
+
+    sql = compile_sql(db.exec.call_args.args[0])
+    assert "make_interval" in sql
+    assert "active_sync_schedules.last_run_at IS NULL" in sql
+    assert "NOT IN" in sql
+    assert "ORDER BY active_sync_schedules.last_run_at ASC NULLS FIRST" in sql
+    assert "FOR UPDATE SKIP LOCKED" in sql
+
+
+def test_get_due_without_free_slots_skips_query():
+    db = MagicMock()
+
+    assert ActiveSyncScheduleService(db).get_due(datetime(2026, 1, 1), limit=0) == []
+    db.exec.assert_not_called()
+
+
+def test_mark_run_is_single_update():
+    db = MagicMock()
+
+    ActiveSyncScheduleService(db).mark_run([uuid4(), uuid4()], datetime(2026, 1, 1))
+
+    assert db.execute.call_count == 1
+    assert compile_sql(db.execute.call_args.args[0]).startswith("UPDATE active_sync_schedules SET last_run_at=")
+    db.commit.assert_called_once()
+
+
+def make_schedule(token_id):
+    return ActiveSyncSchedule(id=uuid4(), user_id="user1", token_id=token_id, interval_minutes=15, task_name=f"sync_{token_id}_periodic")
+
+
+def test_dispatcher_respects_concurrency_cap_and_running_tokens():
+    due = [make_schedule("t-1"), make_schedule("t-2")]
+    schedule_service = MagicMock()
+    schedule_service.get_due.return_value = due
+    task_history = MagicMock()
+    task_history.get_running_token_ids.return_value = ["t-running"]
+
+    with patch.object(sync_tasks, "_legacy_sync_tasks_removed", True), \
+         patch.object(sync_tasks, "get_sync_db_session_direct"), \
+         patch.object(sync_tasks, "ActiveSyncScheduleService", return_value=schedule_service), \
+         patch.object(sync_tasks, "TaskHistoryService", return_value=task_history), \
+         patch.object(sync_tasks.run_order_sync_task, "apply_async") as apply_async, \
+         patch.object(settings.sync, "dispatch_max_concurrent", 3), \
+         patch.object(settings.sync, "dispatch_jitter_seconds", 30):
+        result = sync_tasks.dispatch_due_syncs()
+
+    args, kwargs = schedule_service.get_due.call_args
+    assert args[1] == 2
+    assert kwargs["exclude_token_ids"] == {"t-running"}
+    assert [call.kwargs["kwargs"]["token_id"] for call in apply_async.call_args_list] == ["t-1", "t-2"]
+    assert all(0 <= call.kwargs["countdown"] <= 30 for call in apply_async.call_args_list)
+    schedule_service.mark_run.assert_called_once()
+    assert schedule_service.mark_run.call_args.args[0] == [schedule.id for schedule in due]
+    assert result == {"dispatched": 2, "free_slots": 0}
@@ -0,0 +1,98 @@
+"""
+Тесты блокировки синхронизации токена
+"""
+
+from unittest.mock import MagicMock, patch
+
+import redis
+
+from app.core.settings import settings
+from app.core.sync_lock import ACQUIRE_SCRIPT, RELEASE_SCRIPT, TokenSyncLock
+
+
+class FakeScripts:
+    """Скрипты блокировки поверх словаря (семантика Lua-скриптов)"""
+
+    def __init__(self):
+        self.values = {}
+
+    def __call__(self, source):
+        def run(keys, args):
+            key, owner = keys[0], args[0]
+            current = self.values.get(key)
+            if source == ACQUIRE_SCRIPT:
+                if current in (None, owner):
+                    self.values[key] = owner
+                    return 1
+                return 0
+            if current != owner:
+                return 0
+            if source == RELEASE_SCRIPT:
+                del self.values[key]
+            return 1
+        return run
+
+
+def make_lock():
+    lock = TokenSyncLock(redis_url="redis://localhost:6379/0")
+    scripts = FakeScripts()
+    lock._script = scripts
+    return lock, scripts
+
+
+def test_second_owner_cannot_acquire_until_release():
+    lock, _ = make_lock()
+
+    lease = lock.acquire("token-1", owner="task-a")
+    assert lease is not None
+    assert lock.acquire("token-1", owner="task-b") is None
+
+    lease.release()
+    second = lock.acquire("token-1", owner="task-b")
+    assert second is not None
+    second.release()
+
+
+def test_same_owner_reacquires_for_continuation():
+    lock, _ = make_lock()
+
+    lease = lock.acquire("token-1", owner="root-task")
+    lease.stop_heartbeat()
+
+    continuation = lock.acquire("token-1", owner="root-task")
+    assert continuation is not None
+    continuation.release()
+
+
+def test_release_does_not_remove_foreign_lock():
+    lock, scripts = make_lock()
+
+    lease = lock.acquire("token-1", owner="task-a")
+    lease.stop_heartbeat()
+    # Lease истек и блокировку захватил другой владелец
+    scripts.values["allegro:sync-lock:token-1"] = "task-b"
+    lease.release()
+
+    assert scripts.values["allegro:sync-lock:token-1"] == "task-b"
+
+
+def test_heartbeat_marks_lost_lease():
+    lock, scripts = make_lock()
+
+    with patch.object(settings.sync, "lock_ttl_seconds", 0.1):
+        lease = lock.acquire("token-1", owner="task-a")
+        scripts.values["allegro:sync-lock:token-1"] = "task-b"
+        lease._heartbeat.join(timeout=3)
+
+    assert lease.lost is True
+
+
+def test_acquire_fails_open_when_redis_unavailable():
+    lock = TokenSyncLock(redis_url="redis://localhost:6379/0")
+    lock._script = MagicMock(side_effect=redis.ConnectionError("down"))
+
+    lease = lock.acquire("token-1", owner="task-a")
+
+    assert lease is not None
+    assert lease.lost is False
+    lease.release()
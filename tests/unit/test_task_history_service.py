@@ -0,0 +1,70 @@
+"""
+@file: tests/unit/test_task_history_service.py
+@description: Unit-тесты публикации прогресса задач в TaskHistory
+@dependencies: pytest, unittest.mock, TaskProgressReporter
+"""
+from unittest.mock import MagicMock, patch
+from sqlalchemy.dialects import postgresql
+from app.services.task_history_service import TaskHistoryService, TaskProgressReporter
+
+
+def make_reporter(interval_seconds=5.0):
+    task_history = MagicMock()
+    task_history.update_progress.return_value = True
+    return TaskProgressReporter(task_history, "task-1", interval_seconds=interval_seconds), task_history
+
+
+def test_reporter_throttles_writes():
+    reporter, task_history = make_reporter()
+
+    with patch("app.services.task_history_service.time.monotonic", side_effect=[100.0, 102.0, 104.9, 105.0]):
+        written = [reporter.report(processed, total=1000) for processed in (0, 100, 200, 300)]
+
+    assert written == [True, False, False, True]
+    assert task_history.update_progress.call_count == 2
+
+
+def test_reporter_computes_rate_and_eta_from_first_report():
+    reporter, task_history = make_reporter(interval_seconds=0)
+
+    with patch("app.services.task_history_service.time.monotonic", side_effect=[0.0, 10.0]):
+        # Продолжение с checkpoint: 400 заказов обработаны прошлыми задачами
+        reporter.report(400, total=1000)
+        reporter.report(600, total=1000, sync_history_id="s-1")
+
+    task_id, progress, details = task_history.update_progress.call_args.args
+    assert task_id == "task-1"
+    assert progress == 0.6
+    assert details["orders_per_second"] == 20.0
+    assert details["eta_seconds"] == 20
+    assert details["sync_history_id"] == "s-1"
+
+
+def test_reporter_without_total_has_no_eta():
+    reporter, task_history = make_reporter(interval_seconds=0)
+
+    reporter.report(50)
+
+    _, progress, details = task_history.update_progress.call_args.args
+    assert progress is None
+    assert details["eta_seconds"] is None
+
+
+def test_reporter_swallows_write_errors():
+    reporter, task_history = make_reporter()
+    task_history.update_progress.side_effect = RuntimeError("db down")
+
+    assert reporter.report(1, total=10) is False
+    task_history.db.rollback.assert_called_once()
+
+
+def test_update_progress_is_single_conditional_update():
+    db = MagicMock()
+    db.execute.return_value.rowcount = 1
+
+    assert TaskHistoryService(db).update_progress("task-1", 0.5, {"processed": 5}) is True
+
+    sql = str(db.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith("UPDATE task_history SET")
+    assert "task_history.status IN" in sql
+    db.commit.assert_called_once()
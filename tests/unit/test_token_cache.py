@@ -0,0 +1,88 @@
+"""
+Тесты кеша access token в памяти процесса
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core.settings import settings
+from app.core.token_cache import INVALIDATION_CHANNEL, AccessTokenCache
+
+TOKEN_ID = "11111111-1111-1111-1111-111111111111"
+
+
+@pytest.fixture
+def cache():
+    cache = AccessTokenCache(redis_url="redis://localhost:6379/0")
+    cache._ensure_listener = MagicMock()
+    cache._redis = MagicMock()
+    return cache
+
+
+def valid_token(access_token="tok-1", expires_in=timedelta(hours=1)):
+    return MagicMock(allegro_token=access_token, expires_at=datetime.utcnow() + expires_in)
+
+
+def test_get_or_load_hits_database_once(cache):
+    loader = MagicMock(return_value=valid_token())
+
+    assert cache.get_or_load(TOKEN_ID, "user1", loader) == "tok-1"
+    assert cache.get_or_load(TOKEN_ID, "user1", loader) == "tok-1"
+
+    loader.assert_called_once()
+
+
+def test_token_close_to_expiry_is_not_cached(cache):
+    loader = MagicMock(return_value=valid_token(expires_in=timedelta(seconds=30)))
+
+    with patch.object(settings.allegro, "token_cache_expiry_margin", 60.0):
+        cache.get_or_load(TOKEN_ID, "user1", loader)
+        cache.get_or_load(TOKEN_ID, "user1", loader)
+
+    assert loader.call_count == 2
+
+
+def test_cached_token_is_bound_to_owner(cache):
+    cache.put(TOKEN_ID, "user1", "tok-1", datetime.utcnow() + timedelta(hours=1))
+
+    assert cache.get(TOKEN_ID, "user2") is None
+
+
+def test_invalidate_drops_entry_and_notifies_other_processes(cache):
+    cache.put(TOKEN_ID, "user1", "tok-1", datetime.utcnow() + timedelta(hours=1))
+
+    cache.invalidate(TOKEN_ID)
+
+    assert cache.get(TOKEN_ID, "user1") is None
+    cache._redis.publish.assert_called_once_with(INVALIDATION_CHANNEL, TOKEN_ID)
+
+
+@pytest.mark.asyncio
+async def test_async_invalidate_publishes_off_the_event_loop(cache):
+    cache.put(TOKEN_ID, "user1", "tok-1", datetime.utcnow() + timedelta(hours=1))
+
+    with patch("app.core.token_cache.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+        await cache.invalidate_async(TOKEN_ID)
+
+    to_thread.assert_called_once_with(cache.invalidate, TOKEN_ID)
+    assert cache.get(TOKEN_ID, "user1") is None
+    cache._redis.publish.assert_called_once_with(INVALIDATION_CHANNEL, TOKEN_ID)
+
+
+def test_invalidation_message_drops_entry(cache):
+    cache.put(TOKEN_ID, "user1", "tok-1", datetime.utcnow() + timedelta(hours=1))
+
+    cache._on_invalidation({"type": "message", "data": TOKEN_ID.encode()})
+
+    assert cache.get(TOKEN_ID, "user1") is None
+
+
+def test_rejected_access_token_is_discarded(cache):
+    cache.put(TOKEN_ID, "user1", "tok-1", datetime.utcnow() + timedelta(hours=1))
+
+    cache.discard_access_token("tok-1")
+
+    assert cache.get(TOKEN_ID, "user1") is None